@@ -1,96 +1,54 @@
 import os
+import io
 import json
 import re
 import shutil
-from flask import Flask, request, jsonify
+import zipfile
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+import time
 from flask_cors import CORS
 from dotenv import load_dotenv
 import hashlib
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import jwt
+import contextvars
 
-# LangChain and Gemini Imports (optional)
-try:
-    from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.docstore.document import Document
-    from langchain.chains import create_retrieval_chain
-    from langchain.chains.combine_documents.stuff import create_stuff_documents_chain
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_community.vectorstores import Chroma
-    from langchain_core.prompts import MessagesPlaceholder
-    from langchain_community.tools.tavily_search import TavilySearchResults
-    from langchain.agents import AgentExecutor, create_tool_calling_agent
-    from langchain_core.prompts import PromptTemplate
-    LANGCHAIN_AVAILABLE = True
-except Exception as e:
-    # Graceful degradation for environments without the LLM libs installed.
-    LANGCHAIN_AVAILABLE = False
-    # Provide minimal stubs so the app can start for auth and DB work.
-    class ChatGoogleGenerativeAI:
-        def __init__(*args, **kwargs):
-            pass
-        def invoke(self, prompt):
-            class R: content = '{}';
-            return R()
-
-    class GoogleGenerativeAIEmbeddings:
-        def __init__(*args, **kwargs):
-            pass
-
-    def RecursiveCharacterTextSplitter(*args, **kwargs):
-        class Splitter:
-            def split_documents(self, docs):
-                return docs
-        return Splitter()
-
-    class Document:
-        def __init__(self, page_content=''):
-            self.page_content = page_content
-
-    def create_retrieval_chain(*args, **kwargs):
-        return None
-
-    def create_stuff_documents_chain(*args, **kwargs):
-        return None
-
-    class Chroma:
-        def __init__(*args, **kwargs):
-            pass
-        def persist(*args, **kwargs):
-            pass
-        def add_documents(*args, **kwargs):
-            pass
-        @classmethod
-        def from_documents(cls, *args, **kwargs):
-            return cls()
-
-    class MessagesPlaceholder:
-        def __init__(self, *args, **kwargs):
-            pass
-
-    class TavilySearchResults:
-        def __init__(self, *args, **kwargs):
-            pass
-
-    class AgentExecutor:
-        def __init__(self, *args, **kwargs):
-            pass
-
-    def create_tool_calling_agent(*args, **kwargs):
-        return None
+# LangChain and Gemini imports are deferred: each resolves on first use (see providers.py)
+from providers import registry, resolve
+RecursiveCharacterTextSplitter = registry.lazy_import('langchain_text_splitters', 'RecursiveCharacterTextSplitter')
+Document = registry.lazy_import('langchain_core.documents', 'Document')
+create_retrieval_chain = registry.lazy_import('langchain.chains', 'create_retrieval_chain')
+create_stuff_documents_chain = registry.lazy_import('langchain.chains.combine_documents.stuff', 'create_stuff_documents_chain')
+ChatPromptTemplate = registry.lazy_import('langchain_core.prompts', 'ChatPromptTemplate')
+RunnableLambda = registry.lazy_import('langchain_core.runnables', 'RunnableLambda')
 
 # File parsing imports
-import pypdf
-from docx import Document as DocxDocument
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, text
+DocxDocument = registry.lazy_import('docx', 'Document')
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Index, func, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from auth import PasswordHasher, AuthBusy, VerifiedTokenCache, token_digest
+from vector_pool import VectorStorePool
+from vector_backends import vector_backend_from_env
+from lexical_retrieval import RETRIEVAL_MODES, HybridRetriever, VersionedIndexes, index_from_store
+from resume_chunker import SECTIONS, ResumeChunker
+from llm_gateway import current_user, gateway_from_env, gated_chat_model, gated_embeddings
+from metrics import current_route, metrics_from_env
+from job_queue import JobQueue
+from pdf_extract import PdfTextExtractor, PdfExtractionError
+from uploads import UploadStore, UploadError, PDF_MIMETYPE, DOCX_MIMETYPE
+from response_cache import ResponseCache, MemoryTier, SQLiteTier, make_cache_key
+from structured_output import StructuredOutput, StructuredOutputError, JsonScanner
+from streaming import SSE_HEADERS, sse_event, stream_callback_tokens, iterate_in_context
 
 
 load_dotenv()
 app = Flask(__name__)
+# Werkzeug stops reading a request body past this many bytes and answers 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', str(64 * 1024 * 1024)))
 CORS(app)
 
 vector_store = None
@@ -99,8 +57,25 @@ genai_api_key = os.getenv("GEMINI_API_KEY")
 # --- Database setup (Postgres) ---
 DATABASE_URL = os.getenv('DATABASE_URL') or 'sqlite:///local_dev.db'
 JWT_SECRET = os.getenv('JWT_SECRET') or 'dev_jwt_secret'
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+
+
+def _engine_options():
+    # Pooled connections, checked before use so a restarted database does not fail requests
+    options = {'echo': False, 'future': True, 'pool_pre_ping': True}
+    if ':memory:' not in DATABASE_URL:
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        )
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options())
 SessionLocal = sessionmaker(bind=engine)
+# One session per request thread, closed in teardown; use it from request handlers
+db_session = scoped_session(SessionLocal)
 Base = declarative_base()
 
 
@@ -114,7 +89,84 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
-Base.metadata.create_all(bind=engine)
+class IngestedDoc(Base):
+    # Append-only record of every source ingested for a user (resumes, chat-captured skills)
+    __tablename__ = 'ingested_docs'
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, nullable=False, index=True)
+    source = Column(String, nullable=True)
+    text = Column(Text, nullable=False)
+    hash = Column(String, nullable=True)
+    file_hash = Column(String, nullable=True)
+    feedback = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_ingested_docs_user_hash', 'user_id', 'hash'),
+        Index('ix_ingested_docs_user_file_hash', 'user_id', 'file_hash'),
+    )
+
+
+class IngestJob(Base):
+    # Durable background ingestion job; see job_queue.JobQueue
+    __tablename__ = 'ingest_jobs'
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, index=True)
+    stage = Column(String, nullable=True)
+    source = Column(String, nullable=True)
+    mimetype = Column(String, nullable=True)
+    upload_path = Column(String, nullable=True)
+    text = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)  # claims so far; see job_queue.JobQueue
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProfileDigest(Base):
+    # Rolling per-user profile summary for /api/compare-profile, folded forward one batch
+    # of new ingested_docs at a time; the last analysis is kept until more docs arrive
+    __tablename__ = 'profile_digests'
+    user_id = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False, default='')
+    last_doc_id = Column(Integer, nullable=False, default=0)
+    doc_count = Column(Integer, nullable=False, default=0)
+    analysis = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SavedPlan(Base):
+    # Every saved version of a user's goal plan; the highest version is the current one
+    __tablename__ = 'saved_plans'
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    plan = Column(Text, nullable=False)
+    content_hash = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ux_saved_plans_user_version', 'user_id', 'version', unique=True),
+    )
+
+
+class UserSetting(Base):
+    # Per-user preferences; retrieval_mode picks how chat finds resume context
+    __tablename__ = 'user_settings'
+    user_id = Column(String, primary_key=True)
+    retrieval_mode = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RevokedToken(Base):
+    # Logged-out JWTs, kept until they would have expired anyway
+    __tablename__ = 'revoked_tokens'
+    token_hash = Column(String, primary_key=True)
+    user_id = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 
 # Ensure `email` and `phone` columns exist on older DBs created before they were added to the model.
 def ensure_user_columns():
@@ -139,73 +191,350 @@ def ensure_user_columns():
         # If anything goes wrong (e.g., using sqlite), skip migration
         pass
 
-ensure_user_columns()
 
-# Initialize chat model and embeddings
-chat_model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=genai_api_key)
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=genai_api_key)
+# ingest_jobs tables created before job leases have no attempts column
+def ensure_job_columns():
+    if 'attempts' in {c['name'] for c in inspect(engine).get_columns('ingest_jobs')}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE ingest_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0'))
+
+
+# Per-route and per-stage timings, counters and LLM token counts, served at /metrics;
+# METRICS_ENABLED=0 turns recording into no-ops
+metrics = metrics_from_env(os.environ)
+
+# Every outbound model call passes a gateway: concurrency caps, rate limit, coalescing, backoff
+chat_gateway = gateway_from_env('chat', 'LLM', os.environ)
+embedding_gateway = gateway_from_env('embeddings', 'EMBED', os.environ)
+
+# Chat model, embeddings, search and agent are built on first use; WARM_PROVIDERS=1
+# builds them at import instead (see providers.py and startup_report.py)
+FAKE_LLM = bool(os.getenv('KAREERBOT_FAKE_LLM'))
+CHAT_MODEL = "gemini-1.5-flash"
+
+
+@registry.provider('chat_model')
+def _build_chat_model():
+    if FAKE_LLM:
+        # Offline mode: deterministic local model that streams canned answers
+        from fake_llm import FakeStreamingChatModel
+        model = FakeStreamingChatModel(
+            first_token_delay=float(os.getenv('FAKE_LLM_LATENCY', '0')),
+            token_delay=float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0')),
+        )
+    else:
+        ChatGoogleGenerativeAI = registry.lazy_import('langchain_google_genai', 'ChatGoogleGenerativeAI')
+        # a single attempt per call: retries and their backoff belong to the gateway
+        model = ChatGoogleGenerativeAI(model=CHAT_MODEL, google_api_key=genai_api_key, max_retries=1)
+    return gated_chat_model(model, chat_gateway, callbacks=metrics.llm_callbacks())
+
+
+chat_model = registry.proxy('chat_model')
+
+
+def _model_name():
+    # Known without building the client, so cache hits never pay for its init
+    if FAKE_LLM:
+        return 'FakeStreamingChatModel'
+    return f"models/{CHAT_MODEL}"
+
+
+# Cache for deterministic LLM endpoints; RESPONSE_CACHE_PATH adds an on-disk tier shared by all workers
+_cache_tiers = [MemoryTier(int(os.getenv('RESPONSE_CACHE_SIZE', '1024')))]
+if os.getenv('RESPONSE_CACHE_PATH'):
+    _cache_tiers.append(SQLiteTier(os.getenv('RESPONSE_CACHE_PATH')))
+response_cache = ResponseCache(_cache_tiers, default_ttl=float(os.getenv('RESPONSE_CACHE_TTL', '86400')))
+
+# JSON answers are scanned, repaired and validated locally; only if that fails is the
+# model asked, JSON_FIX_ATTEMPTS times, to fix its own output (see structured_output.py)
+structured = StructuredOutput(fix_attempts=int(os.getenv('JSON_FIX_ATTEMPTS', '1')), timer=metrics.stage)
+
+# Embeddings are cached on disk by chunk text, so repeated chunks never hit the API twice
+EMBEDDING_MODEL = "fake-embedding" if FAKE_LLM else "models/embedding-001"
+
+
+@registry.provider('embeddings')
+def _build_embeddings():
+    # embedding_cache subclasses LangChain's Embeddings, so it is imported here too
+    from embedding_cache import CachedEmbeddings
+    if FAKE_LLM:
+        from fake_llm import FakeEmbeddings
+        base = FakeEmbeddings(latency=float(os.getenv('FAKE_EMBED_LATENCY', '0')))
+    else:
+        GoogleGenerativeAIEmbeddings = registry.lazy_import('langchain_google_genai', 'GoogleGenerativeAIEmbeddings')
+        base = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=genai_api_key)
+    return CachedEmbeddings(
+        gated_embeddings(base, embedding_gateway),
+        path=os.getenv('EMBEDDING_CACHE_PATH') or './embedding_cache.db',
+        namespace=EMBEDDING_MODEL,
+    )
+
+
+embeddings = registry.proxy('embeddings')
+
 
 # Tavily Search Tool Setup
-tavily_api_key = os.getenv("TAVILY_API_KEY")
-search = TavilySearchResults(api_key=tavily_api_key)
-tools = [search]
-
-# Prompt for the tool-calling agent
-agent_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "You are a helpful AI assistant that can use tools."),
-        ("human", "{input}"),
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
-    ]
-)
+@registry.provider('search')
+def _build_search():
+    TavilySearchResults = registry.lazy_import('langchain_community.tools.tavily_search', 'TavilySearchResults')
+    return TavilySearchResults(api_key=os.getenv("TAVILY_API_KEY"))
+
+
+@registry.provider('agent_executor')
+def _build_agent_executor():
+    MessagesPlaceholder = registry.lazy_import('langchain_core.prompts', 'MessagesPlaceholder')
+    AgentExecutor = registry.lazy_import('langchain.agents', 'AgentExecutor')
+    create_tool_calling_agent = registry.lazy_import('langchain.agents', 'create_tool_calling_agent')
+    tools = [registry.get('search')]
+
+    # Prompt for the tool-calling agent
+    agent_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are a helpful AI assistant that can use tools."),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ]
+    )
+
+    # Create a tool-calling agent
+    agent = create_tool_calling_agent(registry.get('chat_model'), tools, agent_prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+
+agent_executor = registry.proxy('agent_executor')
 
-# Create a tool-calling agent
-agent = create_tool_calling_agent(chat_model, tools, agent_prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+# Bounded pool for LLM calls that run beside the request thread (e.g. chat skill extraction)
+llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_WORKERS', '8')), thread_name_prefix='llm')
+
+
+def submit_llm(fn, *args):
+    # Runs on llm_executor in a copy of the caller's context, so the gateway sees the same user
+    return llm_executor.submit(contextvars.copy_context().run, fn, *args)
 
 CHROMA_DB_PATH = "./chroma_db"
+UPLOAD_DIR = "./uploads"
+
+# per-user Chroma directories or shared shards filtered by user_id (VECTOR_BACKEND, see vector_backends.py)
+vector_backend = vector_backend_from_env(os.environ, CHROMA_DB_PATH, lambda: resolve(embeddings), timer=metrics.stage)
+
+
+def user_store_exists(user_id: str):
+    return vector_backend.exists(user_id)
+
+
+# Open per-user stores are shared across requests instead of being reopened on every call.
+vector_pool = VectorStorePool(
+    vector_backend.open,
+    max_size=int(os.getenv('VECTOR_POOL_SIZE', '64')),
+    idle_timeout=float(os.getenv('VECTOR_POOL_IDLE_SECONDS', '600')),
+)
+
+# Per-user BM25 indexes over the same chunks, built from the store's stored text on first
+# use and extended at ingestion, so chat can retrieve without embedding the query. Each is
+# rebuilt when the user's ingested_docs change, which also catches other processes' ingests.
+lexical_indexes = VersionedIndexes(VectorStorePool(
+    lambda user_id: index_from_store(vector_pool.get(user_id), version=ingested_docs_version(user_id)),
+    max_size=int(os.getenv('LEXICAL_POOL_SIZE', '256')),
+    idle_timeout=float(os.getenv('VECTOR_POOL_IDLE_SECONDS', '600')),
+), lambda user_id: ingested_docs_version(user_id))
+chat_retriever = HybridRetriever(lexical_indexes, k=int(os.getenv('RETRIEVAL_K', '4')))
+
+# vector | lexical | hybrid, for users who have not chosen (see /api/retrieval-mode)
+DEFAULT_RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'lexical')
+if DEFAULT_RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    print(f"Warning: unknown RETRIEVAL_MODE {DEFAULT_RETRIEVAL_MODE!r}, using 'lexical'")
+    DEFAULT_RETRIEVAL_MODE = 'lexical'
+
+
+def get_retrieval_mode(user_id: str):
+    with SessionLocal() as db:
+        row = db.get(UserSetting, user_id)
+        return (row.retrieval_mode if row else None) or DEFAULT_RETRIEVAL_MODE
+
+
+def set_retrieval_mode(user_id: str, mode):
+    with SessionLocal() as db:
+        db.merge(UserSetting(user_id=user_id, retrieval_mode=mode, updated_at=datetime.utcnow()))
+        db.commit()
+
+
+def _index_chunks(user_id: str, ids, chunks):
+    # A failed index update only costs a rebuild from the store on the next chat turn
+    try:
+        lexical_indexes.get(user_id).add(ids, [c.page_content for c in chunks], [c.metadata for c in chunks])
+    except Exception as e:
+        print(f"Warning: failed to update lexical index: {e}")
+        lexical_indexes.invalidate(user_id)
 
-def get_pdf_text(pdf_file):
-    reader = pypdf.PdfReader(pdf_file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+
+# Page-parallel PDF extraction with page/size caps, a per-document timeout and a cache by file hash
+pdf_extractor = PdfTextExtractor(
+    max_pages=int(os.getenv('MAX_PDF_PAGES', '50')),
+    max_bytes=int(os.getenv('MAX_PDF_BYTES', str(10 * 1024 * 1024))),
+    timeout=float(os.getenv('PDF_EXTRACT_TIMEOUT', '30')),
+    parallel_min_pages=int(os.getenv('PDF_PARALLEL_MIN_PAGES', '8')),
+    workers=int(os.getenv('PDF_WORKERS', '0')) or None,
+)
+
+
+# Uploads are streamed to uploads/<sha256> under a per-file cap, typed by their magic bytes
+upload_store = UploadStore(UPLOAD_DIR, max_bytes=int(os.getenv('MAX_UPLOAD_BYTES', str(pdf_extractor.max_bytes))))
+
+
+def get_pdf_text(pdf_file, file_hash=None, offload=False):
+    # bytes, a path (memory-mapped by the extractor) or a file object
+    data = pdf_file if isinstance(pdf_file, (bytes, str)) else pdf_file.read()
+    return pdf_extractor.extract(data, file_hash=file_hash, offload=offload)
 
 def get_docx_text(docx_file):
     doc = DocxDocument(docx_file)
-    text = ""
-    for para in doc.paragraphs:
-        text += para.text + "\n"
-    return text
+    return "".join(para.text + "\n" for para in doc.paragraphs)
 
 
-def _ingested_path_for(user_id: str):
-    safe = user_id if user_id else 'default'
-    return f"ingested_docs_{safe}.json"
+def _text_hash(text: str):
+    # Whitespace-insensitive hash so re-extracted copies of the same resume match
+    normalized = ' '.join(text.split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _ingested_to_dict(row):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'source': row.source,
+        'text': row.text,
+        'hash': row.hash,
+        'file_hash': row.file_hash,
+        'feedback': json.loads(row.feedback) if row.feedback else None,
+        'timestamp': row.created_at.isoformat() if row.created_at else None,
+    }
 
 
 def load_ingested_docs(user_id: str = 'default'):
-    path = _ingested_path_for(user_id)
-    if not os.path.exists(path):
-        return []
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    with SessionLocal() as db:
+        rows = db.query(IngestedDoc).filter(IngestedDoc.user_id == user_id).order_by(IngestedDoc.id).all()
+        return [_ingested_to_dict(r) for r in rows]
+
+
+def count_ingested_docs(user_id: str):
+    with SessionLocal() as db:
+        return db.query(func.count(IngestedDoc.id)).filter(IngestedDoc.user_id == user_id).scalar()
+
+
+def ingested_docs_version(user_id: str):
+    # (count, newest id): changes with every ingest or removal; chunks are stored before their row
+    with SessionLocal() as db:
+        count, newest = db.query(func.count(IngestedDoc.id), func.max(IngestedDoc.id)) \
+            .filter(IngestedDoc.user_id == user_id).one()
+    return count, newest
+
+
+def find_ingested_doc(user_id: str, file_hash=None, text_hashes=(), source=None, exclude_source=None):
+    # Indexed lookup by (user_id, file_hash) or (user_id, hash); never scans the user's history
+    with SessionLocal() as db:
+        q = db.query(IngestedDoc).filter(IngestedDoc.user_id == user_id)
+        if source:
+            q = q.filter(IngestedDoc.source == source)
+        if exclude_source:
+            q = q.filter(IngestedDoc.source != exclude_source)
+        if file_hash:
+            row = q.filter(IngestedDoc.file_hash == file_hash).first()
+            if row:
+                return _ingested_to_dict(row)
+        if text_hashes:
+            row = q.filter(IngestedDoc.hash.in_(list(text_hashes))).first()
+            if row:
+                return _ingested_to_dict(row)
+    return None
 
 
-def save_ingested_docs(docs, user_id: str = 'default'):
-    path = _ingested_path_for(user_id)
-    try:
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(docs, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Failed to save ingested docs for {user_id}: {e}")
+def add_ingested_doc(user_id: str, source, text, hash=None, file_hash=None, feedback=None, timestamp=None):
+    with SessionLocal() as db:
+        row = IngestedDoc(
+            user_id=user_id,
+            source=source,
+            text=text,
+            hash=hash,
+            file_hash=file_hash,
+            feedback=json.dumps(feedback, ensure_ascii=False) if feedback is not None else None,
+            created_at=timestamp or datetime.utcnow(),
+        )
+        db.add(row)
+        db.commit()
+        return row.id
+
+
+def add_ingested_docs(user_id: str, records):
+    # Bulk insert in one transaction; records are dicts of add_ingested_doc's keyword arguments
+    with SessionLocal() as db:
+        rows = [IngestedDoc(
+            user_id=user_id,
+            source=r.get('source'),
+            text=r['text'],
+            hash=r.get('hash'),
+            file_hash=r.get('file_hash'),
+            created_at=datetime.utcnow(),
+        ) for r in records]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+
+
+def update_ingested_doc(doc_id, **fields):
+    if 'feedback' in fields and fields['feedback'] is not None:
+        fields['feedback'] = json.dumps(fields['feedback'], ensure_ascii=False)
+    with SessionLocal() as db:
+        db.query(IngestedDoc).filter(IngestedDoc.id == doc_id).update(fields)
+        db.commit()
+
+
+def migrate_ingested_json_files(directory='.'):
+    # One-shot import of the legacy ingested_docs_<user>.json files; each file is renamed once imported.
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('ingested_docs_') and name.endswith('.json')):
+            continue
+        user_id = name[len('ingested_docs_'):-len('.json')]
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                docs = json.load(f)
+            for d in docs:
+                text_value = d.get('text', '')
+                doc_hash = d.get('hash') or (_text_hash(text_value) if d.get('source') == 'chat-skill' else None)
+                if doc_hash and find_ingested_doc(user_id, text_hashes={doc_hash}):
+                    continue
+                try:
+                    ts = datetime.fromisoformat(d['timestamp']) if d.get('timestamp') else None
+                except ValueError:
+                    ts = None
+                add_ingested_doc(user_id, d.get('source'), text_value, hash=doc_hash,
+                                 file_hash=d.get('file_hash'), feedback=d.get('feedback'), timestamp=ts)
+            os.replace(path, path + '.migrated')
+            print(f"Migrated {len(docs)} ingested docs for {user_id}")
+        except Exception as e:
+            print(f"Failed to migrate ingested docs from {path}: {e}")
 
 
-def get_user_id_from_request(req):
+
+def _verify_token(token):
+    # jwt.InvalidTokenError for a bad token, None for a revoked one; a DB error propagates
+    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    with SessionLocal() as db:
+        if db.get(RevokedToken, token_digest(token)) is not None:
+            return None
+    return str(payload.get('user_id')), payload.get('exp') or float('inf')
+
+
+# Verified tokens are remembered, so hot endpoints skip jwt.decode and the revocation lookup
+token_cache = VerifiedTokenCache(
+    _verify_token,
+    max_entries=int(os.getenv('TOKEN_CACHE_SIZE', '10000')),
+    max_age=float(os.getenv('TOKEN_CACHE_SECONDS', '60')),
+)
+
+
+def _bearer_token(req):
     # Prefer Authorization Bearer <token>
     auth = None
     if req.headers and 'Authorization' in req.headers:
@@ -213,29 +542,35 @@ def get_user_id_from_request(req):
     elif req.args and 'authorization' in req.args:
         auth = req.args.get('authorization')
     if auth and auth.startswith('Bearer '):
-        token = auth.split(' ', 1)[1]
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            return str(payload.get('user_id'))
-        except Exception:
-            return None
+        return auth.split(' ', 1)[1]
     return None
 
 
-@app.route('/api/save-plan', methods=['POST'])
-def save_plan():
-    data = request.json or {}
-    user_id = get_user_id_from_request(request) or data.get('user_id') or request.args.get('user_id') or 'default'
-    plan = data.get('plan')
-    if not plan:
-        return jsonify({'error': 'plan is required'}), 400
-    path = f'saved_plan_{user_id}.json'
-    try:
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump({'plan': plan, 'saved_at': datetime.utcnow().isoformat()}, f, ensure_ascii=False, indent=2)
-        return jsonify({'status': 'ok', 'path': path})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+def get_user_id_from_request(req):
+    token = _bearer_token(req)
+    if token:
+        return token_cache.user_id(token)
+    return None
+
+
+# Hashing runs on its own bounded pool; PASSWORD_HASH_METHOD sets the work factor
+password_hasher = PasswordHasher(
+    method=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'),
+    workers=int(os.getenv('AUTH_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    max_pending=int(os.getenv('AUTH_MAX_PENDING', '64')),
+    timeout=float(os.getenv('AUTH_TIMEOUT', '5')),
+)
+
+
+@app.teardown_appcontext
+def _remove_db_session(exc=None):
+    db_session.remove()
+
+
+def _find_user_login(contact):
+    # One indexed lookup that loads only what login needs, not the whole row
+    column = User.email if '@' in contact else User.phone
+    return db_session().query(User.id, User.password_hash).filter(column == contact).first()
 
 
 @app.route('/api/register', methods=['POST'])
@@ -247,20 +582,24 @@ def register():
     username = data.get('username')
     if not contact or not password:
         return jsonify({'error': 'contact (email or phone) and password required'}), 400
-    db = SessionLocal()
+    db = db_session()
     # determine if contact is email or phone
     is_email = '@' in contact
-    if is_email:
-        existing = db.query(User).filter(User.email == contact).first()
-    else:
-        existing = db.query(User).filter(User.phone == contact).first()
-    if existing:
+    if _find_user_login(contact):
         return jsonify({'error': 'user already exists'}), 400
+    try:
+        password_hash = password_hasher.hash(password)
+    except AuthBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     # create user
-    user = User(username=username or None, email=contact if is_email else None, phone=contact if not is_email else None, password_hash=generate_password_hash(password))
+    user = User(username=username or None, email=contact if is_email else None, phone=contact if not is_email else None, password_hash=password_hash)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # lost a race with a concurrent registration for the same contact
+        db.rollback()
+        return jsonify({'error': 'user already exists'}), 400
     # create a token
     token = jwt.encode({'user_id': user.id, 'exp': datetime.utcnow() + timedelta(days=30)}, JWT_SECRET, algorithm='HS256')
     return jsonify({'status': 'ok', 'user_id': user.id, 'token': token})
@@ -274,43 +613,345 @@ def login():
     password = data.get('password')
     if not contact or not password:
         return jsonify({'error': 'contact and password required'}), 400
-    db = SessionLocal()
-    is_email = '@' in contact
-    if is_email:
-        user = db.query(User).filter(User.email == contact).first()
-    else:
-        user = db.query(User).filter(User.phone == contact).first()
+    user = _find_user_login(contact)
     if not user:
         return jsonify({'error': 'user does not exist'}), 404
-    if not check_password_hash(user.password_hash, password):
+    try:
+        valid = password_hasher.verify(user.password_hash, password)
+    except AuthBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    if not valid:
         return jsonify({'error': 'invalid credentials'}), 401
     token = jwt.encode({'user_id': user.id, 'exp': datetime.utcnow() + timedelta(days=30)}, JWT_SECRET, algorithm='HS256')
     return jsonify({'status': 'ok', 'user_id': user.id, 'token': token})
 
 
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    token = _bearer_token(request)
+    if not token:
+        return jsonify({'error': 'Bearer token required'}), 401
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        # expired or already unusable: nothing to revoke
+        return jsonify({'status': 'ok'})
+    db = db_session()
+    now = datetime.utcnow()
+    expires_at = datetime.utcfromtimestamp(payload['exp']) if payload.get('exp') else now + timedelta(days=30)
+    db.merge(RevokedToken(token_hash=token_digest(token), user_id=str(payload.get('user_id')), expires_at=expires_at))
+    # revocations of tokens that have expired since are no longer needed
+    db.query(RevokedToken).filter(RevokedToken.expires_at < now).delete()
+    db.commit()
+    token_cache.revoke(token)
+    return jsonify({'status': 'ok'})
+
+
+class PlanConflict(Exception):
+    def __init__(self, current):
+        super().__init__('plan was changed by another save')
+        self.current = current
+
+
+# Current plans are read through a small in-process cache; a save here refreshes it at once,
+# saves on other nodes show up after PLAN_CACHE_TTL seconds
+plan_cache = MemoryTier(int(os.getenv('PLAN_CACHE_SIZE', '1024')))
+PLAN_CACHE_TTL = float(os.getenv('PLAN_CACHE_TTL', '30'))
+# Versions kept per user; older ones are pruned on save (0 keeps all)
+PLAN_HISTORY_LIMIT = int(os.getenv('PLAN_HISTORY_LIMIT', '50'))
+# unconditional saves that lose the race for a version number retry this many times
+PLAN_SAVE_RETRIES = 8
+
+
+def _plan_to_dict(row, include_plan=True):
+    result = {
+        'version': row.version,
+        'etag': f"{row.version}-{row.content_hash[:16]}",
+        'saved_at': row.created_at.isoformat() if row.created_at else None,
+    }
+    if include_plan:
+        result['plan'] = json.loads(row.plan)
+    return result
+
+
+def _current_plan_row(db, user_id: str):
+    return (db.query(SavedPlan).filter(SavedPlan.user_id == user_id)
+            .order_by(SavedPlan.version.desc()).first())
+
+
+def load_current_plan_uncached(user_id: str):
+    with SessionLocal() as db:
+        row = _current_plan_row(db, user_id)
+        return _plan_to_dict(row) if row else None
+
+
+def load_current_plan(user_id: str):
+    # -> {'version', 'etag', 'saved_at', 'plan'} or None
+    cached = plan_cache.get(user_id)
+    if cached is not None:
+        return cached[1]
+    current = load_current_plan_uncached(user_id)
+    plan_cache.set(user_id, current, time.time() + PLAN_CACHE_TTL)
+    return current
+
+
+def save_plan_version(user_id: str, plan, if_match=None, saved_at=None):
+    # if_match(etag) -> bool, checked against the current version; PlanConflict when it fails
+    body = json.dumps(plan, ensure_ascii=False)
+    content_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    for _ in range(PLAN_SAVE_RETRIES):
+        with SessionLocal() as db:
+            row = _current_plan_row(db, user_id)
+            current = _plan_to_dict(row) if row else None
+            if if_match is not None and not if_match(current['etag'] if current else None):
+                raise PlanConflict(current)
+            if row is not None and row.content_hash == content_hash:
+                # saving the same plan again is not a new version
+                return current
+            version = (row.version if row else 0) + 1
+            new_row = SavedPlan(user_id=user_id, version=version, plan=body, content_hash=content_hash,
+                                created_at=saved_at or datetime.utcnow())
+            try:
+                db.add(new_row)
+                if PLAN_HISTORY_LIMIT:
+                    db.query(SavedPlan).filter(SavedPlan.user_id == user_id,
+                                               SavedPlan.version <= version - PLAN_HISTORY_LIMIT) \
+                        .delete(synchronize_session=False)
+                db.commit()
+            except IntegrityError:
+                # another save took this version number first
+                db.rollback()
+                if if_match is not None:
+                    raise PlanConflict(load_current_plan_uncached(user_id))
+                continue
+            saved = _plan_to_dict(new_row)
+        plan_cache.set(user_id, saved, time.time() + PLAN_CACHE_TTL)
+        return saved
+    raise PlanConflict(load_current_plan_uncached(user_id))
+
+
+def migrate_saved_plan_files(directory='.'):
+    # One-shot import of the legacy saved_plan_<user>.json files as version 1; each file is renamed once imported.
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('saved_plan_') and name.endswith('.json')):
+            continue
+        user_id = name[len('saved_plan_'):-len('.json')]
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('plan') and load_current_plan_uncached(user_id) is None:
+                try:
+                    saved_at = datetime.fromisoformat(data['saved_at']) if data.get('saved_at') else None
+                except ValueError:
+                    saved_at = None
+                save_plan_version(user_id, data['plan'], saved_at=saved_at)
+            os.replace(path, path + '.migrated')
+            print(f"Migrated saved plan for {user_id}")
+        except Exception as e:
+            print(f"Failed to migrate saved plan from {path}: {e}")
+
+
+def _plan_response(body, etag=None, status=200):
+    response = jsonify(body) if body is not None else Response(status=status)
+    response.status_code = status
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+@app.route('/api/save-plan', methods=['POST'])
+def save_plan():
+    # If-Match: <etag from load-plan> makes the save conditional; a stale etag gets 412
+    # with the current version in the body. Without the header the save always applies.
+    data = request.json or {}
+    user_id = get_user_id_from_request(request) or data.get('user_id') or request.args.get('user_id') or 'default'
+    plan = data.get('plan')
+    if not plan:
+        return jsonify({'error': 'plan is required'}), 400
+    if_match = None
+    if request.if_match:
+        conditions = request.if_match
+        if_match = lambda etag: etag is not None and (conditions.star_tag or conditions.contains(etag))
+    try:
+        saved = save_plan_version(user_id, plan, if_match=if_match)
+    except PlanConflict as e:
+        current = e.current
+        body = {'error': 'plan has changed since it was loaded',
+                'version': current['version'] if current else None, 'etag': current['etag'] if current else None}
+        return _plan_response(body, current['etag'] if current else None, 412)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return _plan_response({'status': 'ok', 'version': saved['version'], 'etag': saved['etag'],
+                           'saved_at': saved['saved_at']}, saved['etag'])
+
+
 @app.route('/api/load-plan', methods=['GET'])
 def load_plan():
+    # ?version=N loads an older version; If-None-Match with the current etag gets 304
     user_id = get_user_id_from_request(request) or request.args.get('user_id') or 'default'
-    path = f'saved_plan_{user_id}.json'
-    if not os.path.exists(path):
-        return jsonify({'plan': None})
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return jsonify(data)
+        if request.args.get('version'):
+            with SessionLocal() as db:
+                row = db.query(SavedPlan).filter(SavedPlan.user_id == user_id,
+                                                 SavedPlan.version == int(request.args['version'])).first()
+                current = _plan_to_dict(row) if row else None
+            if current is None:
+                return jsonify({'error': 'no such plan version'}), 404
+        else:
+            current = load_current_plan(user_id)
+    except ValueError:
+        return jsonify({'error': 'version must be an integer'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    if current is None:
+        return jsonify({'plan': None})
+    if request.if_none_match.contains(current['etag']):
+        return _plan_response(None, current['etag'], 304)
+    return _plan_response(current, current['etag'])
+
+
+@app.route('/api/plan-history', methods=['GET'])
+def plan_history():
+    user_id = get_user_id_from_request(request) or request.args.get('user_id') or 'default'
+    with SessionLocal() as db:
+        rows = (db.query(SavedPlan).filter(SavedPlan.user_id == user_id)
+                .order_by(SavedPlan.version.desc()).all())
+        versions = [_plan_to_dict(row, include_plan=False) for row in rows]
+    return jsonify({'user_id': user_id, 'versions': versions})
+
+
+# Token budgets for the profile digest (estimated at ~4 characters per token)
+PROFILE_DIGEST_TOKENS = int(os.getenv('PROFILE_DIGEST_TOKENS', '1500'))
+PROFILE_PROMPT_TOKENS = int(os.getenv('PROFILE_PROMPT_TOKENS', '6000'))
+# Attempts when another request folds the same user's digest at the same time
+PROFILE_DIGEST_RETRIES = 3
+
+
+def _estimate_tokens(text: str):
+    return len(text) // 4 + 1
+
+
+def _truncate_to_tokens(text: str, budget: int):
+    return text if _estimate_tokens(text) <= budget else text[:budget * 4]
+
+
+def _fold_into_digest(summary: str, texts):
+    # Small profiles are kept verbatim; once the digest outgrows its budget the model
+    # rewrites it, reading only the previous digest plus the new documents
+    combined = '\n\n'.join([summary] + texts if summary else texts)
+    if _estimate_tokens(combined) <= PROFILE_DIGEST_TOKENS:
+        return combined
+    new_data = _truncate_to_tokens('\n\n'.join(texts), PROFILE_PROMPT_TOKENS - PROFILE_DIGEST_TOKENS)
+    prompt = f"""
+You maintain a concise career profile of a user. Update the current profile with the new information below.
+Keep every skill, role, employer, project, education entry and date that matters for career planning; drop repetition.
+Respond with the updated profile as plain text of at most {PROFILE_DIGEST_TOKENS * 3 // 4} words.
+
+Current profile:
+{summary or '(empty)'}
+
+New information:
+{new_data}
+"""
+    return _truncate_to_tokens(chat_model.invoke(prompt).content.strip(), PROFILE_DIGEST_TOKENS)
+
+
+def _digest_to_dict(row):
+    return {
+        'summary': row.summary,
+        'last_doc_id': row.last_doc_id,
+        'doc_count': row.doc_count,
+        'analysis': json.loads(row.analysis) if row.analysis else None,
+    }
+
+
+def _fold_docs(summary: str, new_docs):
+    # Fold in batches that each fit the prompt budget next to the digest
+    batch, batch_tokens = [], 0
+    room = PROFILE_PROMPT_TOKENS - PROFILE_DIGEST_TOKENS
+    for doc_id, text in new_docs:
+        text = _truncate_to_tokens(text or '', room)
+        tokens = _estimate_tokens(text)
+        if batch and batch_tokens + tokens > room:
+            summary = _fold_into_digest(summary, batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    return _fold_into_digest(summary, batch)
+
+
+def update_profile_digest(user_id: str):
+    # -> digest dict covering every ingested doc; None if the user has none.
+    # No session is held across the model calls: read, close, fold, then write only if no
+    # other caller moved the digest meanwhile (otherwise start over from theirs).
+    for _ in range(PROFILE_DIGEST_RETRIES):
+        with SessionLocal() as db:
+            row = db.get(ProfileDigest, user_id)
+            current = _digest_to_dict(row) if row else {'summary': '', 'last_doc_id': 0, 'doc_count': 0,
+                                                        'analysis': None}
+            new_docs = (db.query(IngestedDoc.id, IngestedDoc.text)
+                        .filter(IngestedDoc.user_id == user_id, IngestedDoc.id > current['last_doc_id'])
+                        .order_by(IngestedDoc.id).all())
+        if not new_docs:
+            return current if current['doc_count'] else None
+
+        summary = _fold_docs(current['summary'], new_docs)
+        values = {'summary': summary, 'last_doc_id': new_docs[-1][0],
+                  'doc_count': current['doc_count'] + len(new_docs), 'analysis': None, 'updated_at': datetime.utcnow()}
+        with SessionLocal() as db:
+            try:
+                if row is None:
+                    db.add(ProfileDigest(user_id=user_id, **values))
+                    written = 1
+                else:
+                    written = db.query(ProfileDigest) \
+                        .filter(ProfileDigest.user_id == user_id, ProfileDigest.last_doc_id == current['last_doc_id']) \
+                        .update(values, synchronize_session=False)
+                db.commit()
+            except IntegrityError:
+                # another first-time caller inserted the row
+                db.rollback()
+                continue
+        if written:
+            values.pop('updated_at')
+            return values
+    raise RuntimeError('profile digest kept changing; try again')
+
+
+def _save_profile_analysis(user_id: str, last_doc_id: int, analysis):
+    # Only cache against the digest it was computed from; a newer fold wins
+    with SessionLocal() as db:
+        db.query(ProfileDigest).filter(ProfileDigest.user_id == user_id, ProfileDigest.last_doc_id == last_doc_id) \
+            .update({'analysis': json.dumps(analysis, ensure_ascii=False)})
+        db.commit()
+
+
+PROFILE_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'required': ['summary'],
+    'properties': {
+        'summary': {'type': 'string'},
+        'gaps': {'type': 'array', 'items': {'type': 'object'}},
+        'recommended_next_steps': {'type': 'array', 'items': {'type': 'object'}},
+    },
+}
 
 
 @app.route('/api/compare-profile', methods=['GET'])
 def compare_profile():
     user_id = get_user_id_from_request(request) or request.args.get('user_id') or 'default'
-    ingested = load_ingested_docs(user_id)
-    if not ingested:
+    try:
+        digest = update_profile_digest(user_id)
+    except Exception as e:
+        return jsonify({'analysis': {'error': str(e)}, 'ingested_count': count_ingested_docs(user_id)})
+    if digest is None:
         return jsonify({'error': 'no ingested docs for user', 'suggestion': 'Upload resume or skills first'}), 404
 
-    # Combine the texts into a single prompt for analysis
-    combined = '\n\n'.join([d.get('text', '') for d in ingested])
+    # Unchanged profile: serve the analysis computed for it
+    if digest['analysis']:
+        return jsonify({'analysis': digest['analysis'], 'ingested_count': digest['doc_count']})
+
     prompt = f"""
 You are a career analyst. Given the user's combined profile and captured skills below, produce a JSON object with:
 - summary: one-paragraph summary
@@ -318,130 +959,677 @@ You are a career analyst. Given the user's combined profile and captured skills
 - recommended_next_steps: 10-12 granular micro-steps (title, description, keywords, actions)
 
 User data:
-{combined}
+{digest['summary']}
 """
 
     try:
-        ai_resp = chat_model.invoke(prompt).content
-        # try to extract JSON
-        jm = re.search(r'\{.*\}', ai_resp, re.DOTALL)
-        if jm:
-            analysis = json.loads(jm.group(0))
-        else:
-            analysis = {'raw': ai_resp}
+        analysis = structured.generate('compare-profile', chat_model, prompt, PROFILE_ANALYSIS_SCHEMA)
+        _save_profile_analysis(user_id, digest['last_doc_id'], analysis)
+    except StructuredOutputError as e:
+        analysis = {'raw': e.raw}
     except Exception as e:
         analysis = {'error': str(e)}
 
-    return jsonify({'analysis': analysis, 'ingested_count': len(ingested)})
+    return jsonify({'analysis': analysis, 'ingested_count': digest['doc_count']})
+
+
+class IngestError(Exception):
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+RESUME_MIMETYPES = (PDF_MIMETYPE, DOCX_MIMETYPE)
+INGEST_STAGES = ('parse', 'chunk', 'embed', 'persist', 'feedback')
+
+
+def _duplicate_result(existing):
+    feedback = existing.get('feedback')
+    if feedback is None:
+        # First ingestion stored the vectors but never got feedback; only the LLM call is repeated.
+        feedback = get_resume_feedback(existing['user_id'], existing.get('text', ''))
+        update_ingested_doc(existing['id'], feedback=feedback)
+    return {"feedback": feedback, "resume_text": existing.get('text', ''), "note": "duplicate"}
+
+
+# Bump a prompt's version whenever its text changes so cached answers are not reused
+RESUME_FEEDBACK_PROMPT_VERSION = 'resume-feedback-v1'
+RESUME_FEEDBACK_SCHEMA = {
+    'type': 'object',
+    'required': ['strengths', 'improvements'],
+    'properties': {
+        'strengths': {'type': 'array', 'items': {'type': 'string'}},
+        'improvements': {'type': 'array', 'items': {'type': 'string'}},
+    },
+}
+
+
+def get_resume_feedback(user_id: str, resume_text: str):
+    # scoped to the user: feedback on one user's resume is never served to another
+    key = make_cache_key(RESUME_FEEDBACK_PROMPT_VERSION, _model_name(), scope=user_id, resume_text=resume_text)
+    return response_cache.get_or_compute('resume-feedback', key, lambda: _generate_resume_feedback(resume_text))
+
+
+def _generate_resume_feedback(resume_text: str):
+    initial_prompt = f"""
+        You are an experienced HR recruiter and career coach.
+        Review the following resume text and provide feedback.
+        Instructions:
+        - Identify exactly 3 key strengths (skills, experiences, or achievements).
+        - Identify exactly 3 areas for improvement (clarity, formatting, missing skills, etc).
+        - Be concise and use simple language that a fresher can understand.
+        - You MUST ONLY respond with a valid JSON object. Do not include any other text, greetings, or explanations.
+        Output format:
+        {{
+            "strengths": ["point 1", "point 2", "point 3"],
+            "improvements": ["point 1", "point 2", "point 3"]
+        }}
+        Resume:
+        {resume_text}
+    """
+    return structured.generate('resume-feedback', chat_model, initial_prompt, RESUME_FEEDBACK_SCHEMA)
+
+
+def parse_resume_file(source, mimetype: str, file_hash=None, offload=False):
+    # source: the stored upload's path, or raw bytes
+    if mimetype == PDF_MIMETYPE:
+        return get_pdf_text(source, file_hash=file_hash, offload=offload)
+    if mimetype == DOCX_MIMETYPE:
+        return get_docx_text(source if isinstance(source, str) else io.BytesIO(source))
+    raise IngestError("Unsupported file type", 400)
+
+
+# sections: resume_chunker.py, whole entries per chunk with section metadata; recursive: the old
+# 1000-character splitter with 200 characters of overlap
+RESUME_CHUNKER = os.getenv('RESUME_CHUNKER', 'sections')
+resume_chunker = ResumeChunker(max_tokens=int(os.getenv('CHUNK_MAX_TOKENS', '256')),
+                               overlap_tokens=int(os.getenv('CHUNK_OVERLAP_TOKENS', '16')))
+
+
+def _chunk_resume(resume_text: str, source=None):
+    metadata = {'source': source} if source else {}
+    if RESUME_CHUNKER == 'recursive':
+        docs = [Document(page_content=resume_text, metadata=metadata)]
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        return text_splitter.split_documents(docs)
+    return resume_chunker.chunk(resume_text, metadata)
+
+
+def _persist_chunks(user_id: str, chunks):
+    # The user's store is borrowed from the shared handle pool; one add per call
+    try:
+        user_vs = vector_pool.get(user_id)
+        try:
+            ids = user_vs.add_documents(chunks)
+            user_vs.persist()
+        except Exception as e:
+            print(f"Warning: failed to append to user vector store: {e}")
+            # fallback: recreate
+            vector_pool.invalidate(user_id)
+            lexical_indexes.invalidate(user_id)
+            user_vs = vector_backend.rebuild(user_id, chunks)
+            user_vs.persist()
+            vector_pool.put(user_id, user_vs)
+        else:
+            _index_chunks(user_id, ids, chunks)
+    except Exception as e:
+        print(f"Error handling user vector store: {e}")
+        raise IngestError(str(e))
+
+
+def ingest_resume(user_id: str, source='text-input', upload=None, resume_text='', set_stage=None):
+    # parse -> chunk -> embed -> persist -> feedback, shared by /api/process-resume and the job workers
+    # upload: a StoredUpload from upload_store
+    set_stage = set_stage or (lambda stage: None)
+    file_hash = None
+
+    if upload is not None:
+        # Content-addressed short circuit: an identical upload skips parsing, embedding and the LLM.
+        file_hash = upload.sha256
+        existing = find_ingested_doc(user_id, file_hash=file_hash)
+        if existing:
+            return _duplicate_result(existing)
+        set_stage('parse')
+        try:
+            with metrics.stage('parse'):
+                resume_text = parse_resume_file(upload.path, upload.mimetype, file_hash)
+        except IngestError:
+            raise
+        except PdfExtractionError as e:
+            raise IngestError(str(e), e.status)
+        except Exception as e:
+            raise IngestError(f"Error processing file: {str(e)}")
+
+    if not resume_text:
+        raise IngestError("No resume file or text provided.", 400)
+
+    # deduplicate by normalized text hash before any embedding work
+    sha = _text_hash(resume_text)
+    legacy_sha = hashlib.sha256(resume_text.encode('utf-8')).hexdigest()
+    existing = find_ingested_doc(user_id, text_hashes={sha, legacy_sha}, exclude_source='chat-skill')
+    if existing:
+        if file_hash and not existing.get('file_hash'):
+            update_ingested_doc(existing['id'], file_hash=file_hash)
+        return _duplicate_result(existing)
+
+    set_stage('chunk')
+    with metrics.stage('chunk'):
+        chunks = _chunk_resume(resume_text)
+
+    # Embed up front so the stage is visible; the store's add below is served from the embedding cache.
+    set_stage('embed')
+    with metrics.stage('embed'):
+        embeddings.embed_documents([c.page_content for c in chunks])
+
+    set_stage('persist')
+    with metrics.stage('persist'):
+        _persist_chunks(user_id, chunks)
+
+    # Record the document as soon as its vectors are stored, so a failed feedback call
+    # followed by a retry does not embed the same resume twice.
+    doc_id = add_ingested_doc(user_id, source, resume_text, hash=sha, file_hash=file_hash)
+
+    set_stage('feedback')
+    with metrics.stage('feedback'):
+        feedback = get_resume_feedback(user_id, resume_text)
+    update_ingested_doc(doc_id, feedback=feedback)
+
+    # Include the raw extracted resume text so the frontend can display/store it
+    return {"feedback": feedback, "resume_text": resume_text}
+
+
+def _run_ingest_job(job, set_stage):
+    upload = None
+    if job.get('upload_path'):
+        upload = upload_store.load(job['upload_path'], filename=job.get('source'))
+    token = current_user.set(job['user_id'])
+    route_token = current_route.set('ingest-job')
+    try:
+        return ingest_resume(job['user_id'], source=job.get('source') or 'text-input', upload=upload,
+                             resume_text=job.get('text') or '', set_stage=set_stage)
+    finally:
+        current_route.reset(route_token)
+        current_user.reset(token)
+
+
+# Background ingestion: INGEST_WORKERS threads in this process; set it to 0 and run
+# ingest_worker.py to process jobs outside the Flask workers.
+# A job whose worker has not heartbeated for JOB_LEASE_SECONDS is retried, up to JOB_MAX_ATTEMPTS claims.
+ingest_jobs = JobQueue(SessionLocal, IngestJob, _run_ingest_job,
+                       max_workers=int(os.getenv('INGEST_WORKERS', '2')), stages=INGEST_STAGES,
+                       lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '300')),
+                       max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')))
+
+
+@registry.provider('schema')
+def _prepare_database():
+    # Tables, column upgrades and the legacy JSON migration run once, on the first request
+    Base.metadata.create_all(bind=engine)
+    ensure_user_columns()
+    ensure_job_columns()
+    migrate_ingested_json_files()
+    migrate_saved_plan_files()
+    # jobs left queued by a previous process can only be found once the schema exists
+    ingest_jobs.resume_pending()
+    return True
+
+
+@app.before_request
+def _ensure_schema():
+    registry.get('schema')
+
+
+@app.before_request
+def _start_request_metrics():
+    if metrics.enabled:
+        # the URL rule, not the path, keeps the route label bounded
+        g.metrics_start = time.perf_counter()
+        g.metrics_route_token = current_route.set(request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+@app.after_request
+def _record_request_metrics(response):
+    # for streamed responses this is the time to the first byte, not to the end of the stream
+    start = g.get('metrics_start')
+    if start is not None:
+        metrics.observe('http_request_seconds', time.perf_counter() - start,
+                        route=current_route.get(), method=request.method, status=response.status_code)
+    return response
+
+
+@app.errorhandler(413)
+def _request_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({"error": f"Request is larger than {limit} MB"}), 413
+
+
+@app.before_request
+def _bind_llm_user():
+    # per-user LLM concurrency is keyed by the authenticated user, if any
+    g.llm_user_token = current_user.set(get_user_id_from_request(request))
+
+
+@app.teardown_request
+def _unbind_llm_user(exc=None):
+    token = g.pop('llm_user_token', None)
+    if token is not None:
+        current_user.reset(token)
+    token = g.pop('metrics_route_token', None)
+    if token is not None:
+        current_route.reset(token)
+
+
+def _wants_async(payload):
+    flag = request.args.get('async') or request.form.get('async') or payload.get('async')
+    return str(flag).lower() in ('1', 'true', 'yes')
+
 
 @app.route("/api/process-resume", methods=["POST"])
 def process_resume():
-    global vector_store
-
-    # Append mode: if vector_store exists, we will add new documents to it.
-    # Load existing ingested_docs to append this new source as well.
+    # Append mode: new sources are added to the user's existing vector store.
     # determine user id from form/json/args
+    payload = request.get_json(silent=True) or {}
     user_id = get_user_id_from_request(request) or (
         request.form.get('user_id') if request.form and 'user_id' in request.form else (
-            request.json.get('user_id') if request.json and 'user_id' in request.json else request.args.get('user_id', 'default')
+            payload.get('user_id') if 'user_id' in payload else request.args.get('user_id', 'default')
         )
     )
 
-    ingested_docs = load_ingested_docs(user_id)
-    
+    upload = None
+    source = 'text-input'
     resume_text = ""
-    
+
     if 'file' in request.files and request.files['file'].filename != '':
         file = request.files['file']
+        source = file.filename
         try:
-            if file.mimetype == "application/pdf":
-                resume_text = get_pdf_text(file)
-            elif file.mimetype == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                resume_text = get_docx_text(file)
-            else:
-                return jsonify({"error": "Unsupported file type"}), 400
-        except Exception as e:
-            return jsonify({"error": f"Error processing file: {str(e)}"}), 500
-    
-    elif request.json and 'text' in request.json:
-        resume_text = request.json.get('text')
-    
-    if not resume_text:
+            upload = upload_store.save(file.stream, filename=file.filename)
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+        if upload.mimetype not in RESUME_MIMETYPES:
+            upload_store.discard(upload)
+            return jsonify({"error": "Unsupported file type"}), 400
+    elif 'text' in payload:
+        resume_text = payload.get('text')
+
+    if upload is None and not resume_text:
         return jsonify({"error": "No resume file or text provided."}), 400
 
+    # ?async=1 queues the work and answers immediately with a job id to poll
+    if _wants_async(payload):
+        job_id = ingest_jobs.enqueue(
+            user_id=user_id,
+            source=source,
+            mimetype=upload.mimetype if upload else None,
+            upload_path=upload.path if upload else None,
+            text=resume_text or None,
+        )
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/ingest-jobs/{job_id}"}), 202
+
     try:
-        docs = [Document(page_content=resume_text)]
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(docs)
+        return jsonify(ingest_resume(user_id, source=source, upload=upload, resume_text=resume_text))
+    except IngestError as e:
+        if e.status >= 500:
+            print(f"Error in process_resume: {e}")
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        print(f"Error in process_resume: {e}")
+        return jsonify({"error": str(e)}), 500
+
 
-        # Use a per-user chroma directory
-        user_db_dir = os.path.join(CHROMA_DB_PATH, user_id)
-        os.makedirs(user_db_dir, exist_ok=True)
+@app.route("/api/ingest-jobs/<job_id>", methods=["GET"])
+def ingest_job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    requester = get_user_id_from_request(request)
+    if not job or (requester and requester != job['user_id']):
+        return jsonify({"error": "job not found"}), 404
+    return jsonify({
+        "job_id": job['id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": job['progress'],
+        "result": job['result'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+    })
+
+
+# Bulk ingestion: parse in parallel, embed every new chunk in one batch, write the user's
+# store once, then stream each file's feedback as it completes.
+BULK_MAX_FILES = int(os.getenv('BULK_MAX_FILES', '100'))
+parse_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PARSE_WORKERS', str(min(4, os.cpu_count() or 1)))),
+                                    thread_name_prefix='parse')
+
+
+def _store_upload(stream, source):
+    # -> (source, mimetype, StoredUpload | None, error | None); unusable files are not kept
+    try:
+        upload = upload_store.save(stream, filename=source)
+    except UploadError as e:
+        return source, None, None, str(e)
+    if upload.mimetype not in RESUME_MIMETYPES:
+        upload_store.discard(upload)
+        return source, None, None, 'Unsupported file type'
+    return source, upload.mimetype, upload, None
+
+
+def _zip_members(archive):
+    return [info for info in archive.infolist()
+            if not (info.is_dir() or info.filename.startswith('__MACOSX/')
+                    or os.path.basename(info.filename).startswith('.'))]
+
+
+def _expand_zip(members, archive):
+    items = []
+    for info in members:
+        name = info.filename
+        if info.file_size > upload_store.max_bytes:
+            # judged by the declared size, before anything is decompressed
+            items.append((name, None, None, 'File is too large'))
+            continue
+        # members are decompressed block by block straight into the store, under the same cap
+        with archive.open(info) as member:
+            items.append(_store_upload(member, name))
+    return items
+
+
+def _discard_new_uploads(items):
+    # files this request added to the store; copies that existed before may be in use elsewhere
+    for _, _, stored, _ in items:
+        if stored is not None and stored.is_new:
+            upload_store.discard(stored)
+
+
+def _expand_uploads(uploads, max_files=None):
+    # -> [(source, mimetype, StoredUpload | None, error | None)], zip archives flattened.
+    # IngestError 413 as soon as the files would pass max_files, before anything more is
+    # written; what this request already stored is removed again.
+    max_files = max_files or BULK_MAX_FILES
+    items = []
+
+    def make_room(count):
+        if len(items) + count > max_files:
+            raise IngestError(f"At most {max_files} files per request", 413)
+
+    try:
+        for upload in uploads:
+            if not upload.filename:
+                continue
+            head = upload.stream.read(2)
+            upload.stream.seek(0)
+            if head != b'PK':
+                make_room(1)
+                items.append(_store_upload(upload.stream, upload.filename))
+                continue
+            try:
+                # archives are only spooled to an anonymous temp file, never stored
+                with upload_store.spool(upload.stream, max_bytes=app.config['MAX_CONTENT_LENGTH']) as spooled:
+                    with zipfile.ZipFile(spooled) as archive:
+                        if 'word/document.xml' not in archive.namelist():
+                            # counted from the central directory, before any member is extracted
+                            members = _zip_members(archive)
+                            make_room(len(members))
+                            items.extend(_expand_zip(members, archive))
+                            continue
+                    # a .docx is a zip container too; it is stored whole
+                    make_room(1)
+                    spooled.seek(0)
+                    items.append(_store_upload(spooled, upload.filename))
+            except UploadError as e:
+                make_room(1)
+                items.append((upload.filename, None, None, str(e)))
+            except zipfile.BadZipFile:
+                make_room(1)
+                items.append((upload.filename, None, None, 'Invalid zip archive'))
+    except BaseException:
+        _discard_new_uploads(items)
+        raise
+    return items
+
+
+def _bulk_parse(user_id, source, upload):
+    file_hash = upload.sha256
+    existing = find_ingested_doc(user_id, file_hash=file_hash)
+    if existing:
+        return {'existing': existing}
+    try:
+        with metrics.stage('parse'):
+            text = parse_resume_file(upload.path, upload.mimetype, file_hash, offload=True)
+    except IngestError:
+        raise
+    except PdfExtractionError as e:
+        raise IngestError(str(e), e.status)
+    except Exception as e:
+        raise IngestError(f"Error processing file: {str(e)}")
+    if not text or not text.strip():
+        raise IngestError("No text could be extracted from the file.", 422)
+    return {'text': text, 'file_hash': file_hash}
+
+
+def _bulk_feedback(user_id, doc_id, text):
+    feedback = get_resume_feedback(user_id, text)
+    update_ingested_doc(doc_id, feedback=feedback)
+    return feedback
+
+
+def bulk_ingest(user_id: str, items):
+    # Generator of per-file result dicts, in completion order
+    counts = {'ok': 0, 'duplicate': 0, 'error': 0}
+
+    def emit(index, source, status, **fields):
+        counts[status] += 1
+        return dict(index=index, source=source, status=status, **fields)
+
+    pending = []  # (index, source, text, sha, file_hash) for new documents
+    seen_hashes = {}
+    futures = {}
+    for index, (source, mimetype, upload, error) in enumerate(items):
+        if error:
+            yield emit(index, source, 'error', error=error)
+        elif mimetype not in RESUME_MIMETYPES:
+            yield emit(index, source, 'error', error='Unsupported file type')
+        else:
+            futures[parse_executor.submit(contextvars.copy_context().run, _bulk_parse,
+                                          user_id, source, upload)] = (index, source)
+
+    duplicates = []
+    for future in as_completed(futures):
+        index, source = futures[future]
         try:
-            # load existing user store if present
-            if os.path.exists(user_db_dir) and os.listdir(user_db_dir):
-                user_vs = Chroma(persist_directory=user_db_dir, embedding_function=embeddings)
-                try:
-                    user_vs.add_documents(chunks)
-                    user_vs.persist()
-                except Exception as e:
-                    print(f"Warning: failed to append to user vector store: {e}")
-                    # fallback: recreate
-                    user_vs = Chroma.from_documents(documents=chunks, embedding=embeddings, persist_directory=user_db_dir)
-                    user_vs.persist()
-            else:
-                user_vs = Chroma.from_documents(documents=chunks, embedding=embeddings, persist_directory=user_db_dir)
-                user_vs.persist()
+            parsed = future.result()
+        except IngestError as e:
+            yield emit(index, source, 'error', error=str(e))
+            continue
+        existing = parsed.get('existing')
+        if existing is None:
+            sha = _text_hash(parsed['text'])
+            if sha in seen_hashes:
+                yield emit(index, source, 'duplicate', note=f"same text as {seen_hashes[sha]}")
+                continue
+            existing = find_ingested_doc(user_id, text_hashes={sha}, exclude_source='chat-skill')
+            if existing is None:
+                seen_hashes[sha] = source
+                pending.append((index, source, parsed['text'], sha, parsed['file_hash']))
+                continue
+        if existing.get('feedback') is not None:
+            result = _duplicate_result(existing)
+            yield emit(index, source, 'duplicate', feedback=result['feedback'], resume_text=result['resume_text'])
+        else:
+            duplicates.append((index, source, existing))
+
+    feedback_futures = {}
+    if pending:
+        chunks = []
+        with metrics.stage('chunk'):
+            for index, source, text, sha, file_hash in pending:
+                chunks.extend(_chunk_resume(text, source=source))
+        try:
+            # one batched embedding call for every new chunk, then a single write to the user's store
+            with metrics.stage('embed'):
+                embeddings.embed_documents([c.page_content for c in chunks])
+            with metrics.stage('persist'):
+                _persist_chunks(user_id, chunks)
+            doc_ids = add_ingested_docs(user_id, [
+                {'source': source, 'text': text, 'hash': sha, 'file_hash': file_hash}
+                for index, source, text, sha, file_hash in pending
+            ])
+        except Exception as e:
+            print(f"Error in bulk ingestion: {e}")
+            for index, source, *_ in pending:
+                yield emit(index, source, 'error', error=str(e))
+            doc_ids = []
+        for doc_id, (index, source, text, *_) in zip(doc_ids, pending):
+            feedback_futures[submit_llm(_bulk_feedback, user_id, doc_id, text)] = (index, source, text, 'ok')
+    for index, source, existing in duplicates:
+        feedback_futures[submit_llm(_bulk_feedback, user_id, existing['id'], existing['text'])] = \
+            (index, source, existing['text'], 'duplicate')
+
+    for future in as_completed(feedback_futures):
+        index, source, text, status = feedback_futures[future]
+        try:
+            yield emit(index, source, status, feedback=future.result(), resume_text=text)
+        except Exception as e:
+            # the document is stored; like the single endpoint, feedback is retried on re-upload
+            yield emit(index, source, 'error', error=f"Feedback failed: {e}", stored=status == 'ok')
+
+    yield {'done': True, 'total': len(items), **counts}
+
+
+@app.route("/api/process-resumes", methods=["POST"])
+def process_resumes():
+    # Many resumes per request (multipart `files`, repeated, and/or .zip archives).
+    # Streams one JSON object per line as each file finishes, then a summary line.
+    user_id = get_user_id_from_request(request) or request.form.get('user_id') or request.args.get('user_id', 'default')
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    if not uploads:
+        return jsonify({"error": "No resume files provided."}), 400
+    if sum(1 for upload in uploads if upload.filename) > BULK_MAX_FILES:
+        return jsonify({"error": f"At most {BULK_MAX_FILES} files per request"}), 413
+    try:
+        items = _expand_uploads(uploads)
+    except IngestError as e:
+        return jsonify({"error": str(e)}), e.status
+    if not items:
+        return jsonify({"error": "No resume files provided."}), 400
+
+    def generate():
+        for result in bulk_ingest(user_id, items):
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(iterate_in_context(generate())), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+SKILLS_SCHEMA = {'type': 'array', 'items': {'type': 'string'}}
+
+
+def _capture_chat_skills(user_id: str, message: str, user_vs):
+    # If the user message contains skills or self-declared skills, ask the model to extract
+    # a short list of skills/keywords and persist them to the user's store.
+    skill_prompt = f"Extract skills or technologies mentioned in this user message as a JSON array of strings. Message: {message}"
+    try:
+        extracted_skills = structured.generate('chat-skills', chat_model, skill_prompt, SKILLS_SCHEMA)
+    except StructuredOutputError:
+        # fallback regex for common tokens
+        possible = re.findall(r"\b(Python|JavaScript|React|Node|SQL|Docker|Kubernetes|AWS|Azure|Java|C#|Git|TypeScript)\b", message, re.IGNORECASE)
+        extracted_skills = list({s for s in possible})
+
+    if extracted_skills:
+        skill_text = ' '.join(extracted_skills)
+        skill_doc = Document(page_content=f"Skills: {skill_text}", metadata={'section': 'skills', 'source': 'chat-skill'})
+        try:
+            ids = user_vs.add_documents([skill_doc])
+            user_vs.persist()
+            _index_chunks(user_id, ids, [skill_doc])
         except Exception as e:
-            print(f"Error handling user vector store: {e}")
-            return jsonify({"error": str(e)}), 500
-
-        # deduplicate by hash
-        sha = hashlib.sha256(resume_text.encode('utf-8')).hexdigest()
-        existing_hashes = {d.get('hash') for d in ingested_docs if d.get('hash')}
-        if sha in existing_hashes:
-            # Already ingested; return success but indicate duplicate
-            return jsonify({"feedback": feedback, "resume_text": resume_text, "note": "duplicate"})
-
-        ingested_docs.append({
-            'source': request.files['file'].filename if 'file' in request.files and request.files['file'].filename else 'text-input',
-            'text': resume_text,
-            'hash': sha,
-            'timestamp': datetime.utcnow().isoformat()
-        })
-        save_ingested_docs(ingested_docs, user_id)
-
-        initial_prompt = f"""
-            You are an experienced HR recruiter and career coach.
-            Review the following resume text and provide feedback.
-            Instructions:
-            - Identify exactly 3 key strengths (skills, experiences, or achievements).
-            - Identify exactly 3 areas for improvement (clarity, formatting, missing skills, etc).
-            - Be concise and use simple language that a fresher can understand.
-            - You MUST ONLY respond with a valid JSON object. Do not include any other text, greetings, or explanations.
-            Output format:
-            {{
-                "strengths": ["point 1", "point 2", "point 3"],
-                "improvements": ["point 1", "point 2", "point 3"]
-            }}
-            Resume:
-            {resume_text}
-        """
-        response = chat_model.invoke(initial_prompt).content
+            print(f"Warning: failed to add skill doc to user Chroma: {e}")
+
+        skill_hash = _text_hash(skill_text)
+        if not find_ingested_doc(user_id, text_hashes={skill_hash}, source='chat-skill'):
+            add_ingested_doc(user_id, 'chat-skill', skill_text, hash=skill_hash)
+
+    return extracted_skills
+
+
+def _retrieve(user_id: str, user_vs, query, section=None):
+    with metrics.stage('retrieve'):
+        return chat_retriever.retrieve(user_id, user_vs, query, get_retrieval_mode(user_id),
+                                       where={'section': section} if section else None)
+
+
+def _section_error(data):
+    # chat requests may pass "section" to answer from one part of the resume only
+    section = data.get('section')
+    if section and section not in SECTIONS:
+        return f"Unknown section '{section}'. Expected one of: {', '.join(SECTIONS)}"
+    return None
+
+
+def _build_retrieval_chain(user_id: str, user_vs, section=None):
+    prompt_template = ChatPromptTemplate.from_template("""
+        You are a helpful and professional resume assistant and career coach.
+        Answer the user's question. If the question is about the provided resume, use the context.
+        If the question is a general career or skill question, use your broader knowledge.
         
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        if json_match:
-            json_string = json_match.group(0)
-            feedback = json.loads(json_string)
-        else:
-            raise ValueError("Could not find a valid JSON object in the AI's response.")
+        Context:
+        {context}
+        
+        Question: {input}
+    """)
 
-        # Include the raw extracted resume text so the frontend can display/store it
-        return jsonify({"feedback": feedback, "resume_text": resume_text})
+    document_chain = create_stuff_documents_chain(llm=resolve(chat_model), prompt=prompt_template)
+    # a plain runnable is handed the chain's whole input dict
+    retriever = RunnableLambda(lambda inputs: _retrieve(user_id, user_vs, inputs['input'], section))
+    return create_retrieval_chain(retriever=retriever, combine_docs_chain=document_chain)
+
+
+def _skills_note(skill_future):
+    # Only mention captured skills if extraction already finished; never hold the reply for it.
+    if not skill_future.done():
+        skill_future.add_done_callback(_log_skill_errors)
+        return ''
+    try:
+        extracted_skills = skill_future.result()
+    except Exception as skill_e:
+        print(f"Skill extraction error: {skill_e}")
+        return ''
+    if not extracted_skills:
+        return ''
+    return "\n\n(PS: I captured these skills you mentioned: " + ', '.join(extracted_skills) + ")"
+
+
+def _log_skill_errors(future):
+    if future.exception() is not None:
+        print(f"Skill extraction error: {future.exception()}")
+
+
+def _user_store_or_none(user_id):
+    try:
+        if user_store_exists(user_id):
+            return vector_pool.get(user_id)
+    except Exception:
+        pass
+    return None
+
+
+def _chat_user_store(data):
+    # determine user id for per-user vector store
+    user_id = get_user_id_from_request(request) or data.get('user_id') or request.args.get('user_id') or 'default'
+    return user_id, _user_store_or_none(user_id)
+
+
+@app.route('/api/retrieval-mode', methods=['GET', 'POST'])
+def retrieval_mode():
+    payload = request.get_json(silent=True) or {}
+    user_id = get_user_id_from_request(request) or payload.get('user_id') or request.args.get('user_id') or 'default'
+    if request.method == 'POST':
+        mode = payload.get('mode')
+        if mode not in RETRIEVAL_MODES:
+            return jsonify({"error": f"mode must be one of: {', '.join(RETRIEVAL_MODES)}"}), 400
+        set_retrieval_mode(user_id, mode)
+    return jsonify({"user_id": user_id, "mode": get_retrieval_mode(user_id), "modes": list(RETRIEVAL_MODES)})
 
-    except Exception as e:
-        print(f"Error in process_resume: {e}")
-        return jsonify({"error": str(e)}), 500
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
@@ -449,77 +1637,124 @@ def chat():
     message = data.get("message")
     if not message:
         return jsonify({"error": "Message is required"}), 400
+    section_error = _section_error(data)
+    if section_error:
+        return jsonify({"error": section_error}), 400
 
-    # determine user id for per-user vector store
-    user_id = get_user_id_from_request(request) or data.get('user_id') or request.args.get('user_id') or 'default'
-    user_db_dir = os.path.join(CHROMA_DB_PATH, user_id)
-    try:
-        if os.path.exists(user_db_dir) and os.listdir(user_db_dir):
-            user_vs = Chroma(persist_directory=user_db_dir, embedding_function=embeddings)
-        else:
-            return jsonify({"error": "Please upload your resume first."}), 400
-    except Exception:
+    user_id, user_vs = _chat_user_store(data)
+    if user_vs is None:
         return jsonify({"error": "Please upload your resume first."}), 400
 
     try:
-        prompt_template = ChatPromptTemplate.from_template("""
-            You are a helpful and professional resume assistant and career coach.
-            Answer the user's question. If the question is about the provided resume, use the context.
-            If the question is a general career or skill question, use your broader knowledge.
-            
-            Context:
-            {context}
-            
-            Question: {input}
-        """)
+        # Skill extraction only depends on the message, so it runs beside the RAG answer
+        # instead of after it, and is left to finish persisting in the background.
+        skill_future = submit_llm(_capture_chat_skills, user_id, message, user_vs)
 
-        document_chain = create_stuff_documents_chain(llm=chat_model, prompt=prompt_template)
-        retrieval_chain = create_retrieval_chain(retriever=user_vs.as_retriever(), combine_docs_chain=document_chain)
-        result = retrieval_chain.invoke({"input": message})
-        reply_text = result['answer']
+        retrieval_chain = _build_retrieval_chain(user_id, user_vs, data.get('section'))
+        # retrieval plus generation; the model call alone is llm_call_seconds
+        with metrics.stage('answer'):
+            result = retrieval_chain.invoke({"input": message})
+        reply_text = result['answer'] + _skills_note(skill_future)
 
-        # --- Skill extraction step: if user message potentially contains skills or self-declared skills,
-        # ask the model to extract a short list of skills/keywords and persist them to the user's store.
-        try:
-            skill_prompt = f"Extract skills or technologies mentioned in this user message as a JSON array of strings. Message: {message}"
-            skill_resp = chat_model.invoke(skill_prompt).content
-            json_match = re.search(r'\[.*\]', skill_resp, re.DOTALL)
-            extracted_skills = []
-            if json_match:
-                try:
-                    extracted_skills = json.loads(json_match.group(0))
-                except Exception:
-                    extracted_skills = []
-            else:
-                # fallback regex for common tokens
-                possible = re.findall(r"\b(Python|JavaScript|React|Node|SQL|Docker|Kubernetes|AWS|Azure|Java|C#|Git|TypeScript)\b", message, re.IGNORECASE)
-                extracted_skills = list({s for s in possible})
+        return jsonify({"reply": reply_text})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            if extracted_skills:
-                skill_text = ' '.join(extracted_skills)
-                skill_doc = Document(page_content=f"Skills: {skill_text}")
-                try:
-                    user_vs.add_documents([skill_doc])
-                    user_vs.persist()
-                except Exception as e:
-                    print(f"Warning: failed to add skill doc to user Chroma: {e}")
 
-                ingested = load_ingested_docs(user_id)
-                if not any(d.get('text') == skill_text for d in ingested):
-                    ingested.append({'source': 'chat-skill', 'text': skill_text, 'timestamp': datetime.utcnow().isoformat()})
-                    save_ingested_docs(ingested, user_id)
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    # SSE variant of /api/chat: `data: {"token": ...}` events as the answer is generated,
+    # then one `event: done` carrying the full reply.
+    data = request.json
+    message = data.get("message")
+    if not message:
+        return jsonify({"error": "Message is required"}), 400
+    section_error = _section_error(data)
+    if section_error:
+        return jsonify({"error": section_error}), 400
+
+    user_id, user_vs = _chat_user_store(data)
+    if user_vs is None:
+        return jsonify({"error": "Please upload your resume first."}), 400
 
-                reply_text = reply_text + "\n\n(PS: I captured these skills you mentioned: " + ', '.join(extracted_skills) + ")"
+    skill_future = submit_llm(_capture_chat_skills, user_id, message, user_vs)
 
-        except Exception as skill_e:
-            print(f"Skill extraction error: {skill_e}")
+    def generate():
+        parts = []
+        try:
+            retrieval_chain = _build_retrieval_chain(user_id, user_vs, data.get('section'))
+            for chunk in retrieval_chain.stream({"input": message}):
+                token = chunk.get('answer')
+                if token:
+                    parts.append(token)
+                    yield sse_event({'token': token})
+        except Exception as e:
+            yield sse_event({'error': str(e)}, event='error')
+            return
+        note = _skills_note(skill_future)
+        if note:
+            yield sse_event({'token': note})
+        yield sse_event({'reply': ''.join(parts) + note}, event='done')
 
-        return jsonify({"reply": reply_text})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return Response(stream_with_context(iterate_in_context(generate())), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 
 # --- ENDPOINT 3: Agent Goal Planning (ENHANCED) ---
+AGENT_PLAN_PROMPT_VERSION = 'agent-plan-v1'
+AGENT_PLAN_SCHEMA = {
+    'type': 'object',
+    'required': ['plan'],
+    'properties': {
+        'goal': {'type': 'string'},
+        'plan': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['step'],
+                'properties': {
+                    'step': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'keywords': {'type': 'array', 'items': {'type': 'string'}},
+                    'actions': {'type': 'array', 'items': {'type': 'string'}},
+                },
+            },
+        },
+    },
+}
+
+
+def _agent_plan_prompt(goal):
+    return f"""
+        You are an expert AI agent that helps users create actionable plans to achieve their goals.
+        
+        Instructions:
+        - Take the user's goal and break it down into 10-12 granular, sequential micro-steps the user can follow.
+        - For each micro-step provide:
+          * step title (short),
+          * description (one short sentence),
+          * keywords (3-6 keywords or tools to learn or use),
+          * exact actions (2-4 very specific tasks the user should do next).
+        - The tone should be motivating, concrete, and beginner-friendly.
+        - IMPORTANT: The output MUST be strict JSON and you MUST ONLY respond with the JSON object.
+        
+        Output format:
+        {{
+            "goal": "{goal}",
+            "plan": [
+                {{"step": "title", "description": "short", "keywords": ["k1","k2"], "actions": ["do x","do y"]}},
+                ... (10-12 items)
+            ]
+        }}
+
+        User's Goal: {goal}
+    """
+
+
+def _generate_plan(goal):
+    return structured.generate('agent-plan', chat_model, _agent_plan_prompt(goal), AGENT_PLAN_SCHEMA)
+
+
 # --- ENDPOINT 3: Agent Goal Planning ---
 @app.route("/api/agent-plan", methods=["POST"])
 def agent_plan():
@@ -530,93 +1765,149 @@ def agent_plan():
         return jsonify({"error": "Goal is required"}), 400
 
     try:
-        agent_prompt = f"""
-            You are an expert AI agent that helps users create actionable plans to achieve their goals.
-            
-            Instructions:
-            - Take the user's goal and break it down into 10-12 granular, sequential micro-steps the user can follow.
-            - For each micro-step provide:
-              * step title (short),
-              * description (one short sentence),
-              * keywords (3-6 keywords or tools to learn or use),
-              * exact actions (2-4 very specific tasks the user should do next).
-            - The tone should be motivating, concrete, and beginner-friendly.
-            - IMPORTANT: The output MUST be strict JSON and you MUST ONLY respond with the JSON object.
-            
-            Output format:
-            {{
-                "goal": "{goal}",
-                "plan": [
-                    {{"step": "title", "description": "short", "keywords": ["k1","k2"], "actions": ["do x","do y"]}},
-                    ... (10-12 items)
-                ]
-            }}
-
-            User's Goal: {goal}
-        """
-
-        response = chat_model.invoke(agent_prompt).content
-        
-        # --- FIX: Two-step robust JSON extraction and cleanup ---
-        
-        # 1. Regex search for the raw JSON block
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        
-        if json_match:
-            json_string = json_match.group(0)
-            
-            # 2. Add an extra layer of defense: fix common JSON structural errors before parsing
-            # This is done by replacing problematic newlines/tabs and escaping quotes inside the string.
-            # For simplicity, we'll try to find and repair internal quotes that break the format.
-            try:
-                plan = json.loads(json_string)
-            except json.JSONDecodeError:
-                # If standard parse fails, try a manual, safer replacement (often fixes the delimiter issue)
-                # This complex replacement logic is best placed in a robust helper, but for this context:
-                safe_json_string = json_string.replace('": "', '": "').replace('", "', '", "')
-                plan = json.loads(safe_json_string)
-            
-        else:
-            # If no JSON block is found, raise an error
-            raise ValueError("Could not find a valid JSON object in the AI's response.")
-        
+        # Popular goals repeat across users, so plans are cached by normalized goal
+        key = make_cache_key(AGENT_PLAN_PROMPT_VERSION, _model_name(), goal=goal)
+        plan = response_cache.get_or_compute('agent-plan', key, lambda: _generate_plan(goal))
         return jsonify({"plan": plan})
     
     except Exception as e:
         print(f"Error in agent_plan: {e}")
         return jsonify({"error": str(e)}), 500
 
+
+@app.route("/api/agent-plan/stream", methods=["POST"])
+def agent_plan_stream():
+    # SSE variant of /api/agent-plan: raw tokens while the plan is written, then the parsed plan.
+    data = request.json
+    goal = data.get("goal")
+
+    if not goal:
+        return jsonify({"error": "Goal is required"}), 400
+
+    key = make_cache_key(AGENT_PLAN_PROMPT_VERSION, _model_name(), goal=goal)
+
+    def generate():
+        plan = response_cache.get('agent-plan', key)
+        if plan is not None:
+            yield sse_event({'plan': plan}, event='done')
+            return
+        parts = []
+        scanner = JsonScanner('{')
+        try:
+            for chunk in chat_model.stream(_agent_plan_prompt(goal)):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield sse_event({'token': chunk.content})
+                    # stop reading once the plan object is complete; trailing prose is not worth waiting for
+                    if any(structured.is_valid(value, AGENT_PLAN_SCHEMA) for value in scanner.feed(chunk.content)):
+                        break
+            plan = structured.recover('agent-plan', ''.join(parts), AGENT_PLAN_SCHEMA, chat_model)
+            response_cache.set(key, plan)
+        except Exception as e:
+            print(f"Error in agent_plan: {e}")
+            yield sse_event({'error': str(e)}, event='error')
+            return
+        yield sse_event({'plan': plan}, event='done')
+
+    return Response(stream_with_context(iterate_in_context(generate())), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+def _agent_query_input(data):
+    chat_history = data.get("chat_history", [])
+    persona = data.get("persona", "a professional career coach")
+
+    # 🔹 Convert chat history to LangChain-style messages
+    history_messages = []
+    for msg in chat_history:
+        if msg["sender"] == "user":
+            history_messages.append(("human", msg["text"]))
+        else:
+            history_messages.append(("ai", msg["text"]))
+
+    return {
+        "input": data.get("query"),
+        "chat_history": history_messages,
+        "persona": persona
+    }
+
+
 @app.route("/api/agent-query", methods=["POST"])
 def agent_query():
     data = request.json
     query = data.get("query")
-    chat_history = data.get("chat_history", [])
-    persona = data.get("persona", "a professional career coach")
 
     if not query:
         return jsonify({"error": "Query is required"}), 400
 
     try:
-        # 🔹 Convert chat history to LangChain-style messages
-        history_messages = []
-        for msg in chat_history:
-            if msg["sender"] == "user":
-                history_messages.append(("human", msg["text"]))
-            else:
-                history_messages.append(("ai", msg["text"]))
-
-        response = agent_executor.invoke({
-            "input": query,
-            "chat_history": history_messages,
-            "persona": persona
-        })
+        response = agent_executor.invoke(_agent_query_input(data))
         return jsonify({"reply": response.get("output", "No response generated.")})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/agent-query/stream", methods=["POST"])
+def agent_query_stream():
+    # SSE variant of /api/agent-query. The agent's own .stream() yields whole steps, so tokens
+    # are taken from the LLM callbacks while the executor runs on a worker thread.
+    data = request.json
+    query = data.get("query")
+
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+
+    try:
+        agent_input = _agent_query_input(data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        run = lambda callbacks: agent_executor.invoke(agent_input, config={"callbacks": callbacks})
+        for kind, value in stream_callback_tokens(run):
+            if kind == 'token':
+                yield sse_event({'token': value})
+            elif kind == 'error':
+                yield sse_event({'error': str(value)}, event='error')
+            else:
+                yield sse_event({'reply': value.get("output", "No response generated.")}, event='done')
+
+    return Response(stream_with_context(iterate_in_context(generate())), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
 # --- ENDPOINT 5: Success Prediction Model (NEW FEATURE) ---
+PREDICT_SUCCESS_PROMPT_VERSION = 'predict-success-v1'
+PREDICTION_SCHEMA = {
+    'type': 'object',
+    'required': ['success_score', 'justification'],
+    'properties': {
+        'success_score': {'type': 'number', 'minimum': 0, 'maximum': 100},
+        'justification': {'type': 'string'},
+    },
+}
+
+
+def _prediction_prompt(resume_text, goal):
+    # NOTE: This prompt tells the AI to act as a prediction model.
+    return f"""
+        You are a professional career analyst and data scientist.
+        Your task is to analyze the provided resume against the target career goal and predict the likelihood of success.
+
+        Instructions: 
+        - Provide a success score as a percentage (from 0 to 100).
+        - Write a detailed justification (3-4 sentences) for the score, explaining key strengths and the biggest gaps.
+        - You MUST ONLY respond with a valid JSON object.
+
+        Output format: {{ "success_score": 75, "justification": "Based on the resume, the user has strong skills in X and Y... However, there is a gap in Z." }}
+        Resume: {resume_text}
+        Career Goal: {goal}
+    """
+
+
+def _generate_prediction(resume_text, goal):
+    return structured.generate('predict-success', chat_model, _prediction_prompt(resume_text, goal), PREDICTION_SCHEMA)
+
+
 @app.route("/api/predict-success", methods=["POST"])
 def predict_success():
     data = request.json
@@ -626,36 +1917,79 @@ def predict_success():
     if not resume_text or not goal:
         return jsonify({"error": "Resume and goal are required."}), 400
 
+    user_id = get_user_id_from_request(request) or data.get('user_id') or request.args.get('user_id') or 'default'
+
     try:
-        # NOTE: This prompt tells the AI to act as a prediction model.
-        prediction_prompt = f"""
-            You are a professional career analyst and data scientist.
-            Your task is to analyze the provided resume against the target career goal and predict the likelihood of success.
-
-            Instructions: 
-            - Provide a success score as a percentage (from 0 to 100).
-            - Write a detailed justification (3-4 sentences) for the score, explaining key strengths and the biggest gaps.
-            - You MUST ONLY respond with a valid JSON object.
-
-            Output format: {{ "success_score": 75, "justification": "Based on the resume, the user has strong skills in X and Y... However, there is a gap in Z." }}
-            Resume: {resume_text}
-            Career Goal: {goal}
-        """
-
-        response = chat_model.invoke(prediction_prompt).content
-        
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        if json_match:
-            prediction = json.loads(json_match.group(0))
-        else:
-            raise ValueError("Could not find a valid JSON object in the AI's response.")
-            
+        key = make_cache_key(PREDICT_SUCCESS_PROMPT_VERSION, _model_name(), scope=user_id,
+                             resume_text=resume_text, goal=goal)
+        prediction = response_cache.get_or_compute(
+            'predict-success', key, lambda: _generate_prediction(resume_text, goal)
+        )
         return jsonify({"prediction": prediction})
 
     except Exception as e:
         print(f"Error in predict_success: {e}")
         return jsonify({"error": str(e)}), 500
-    
+
+
+@app.route("/api/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "responses": response_cache.stats(),
+        "embeddings": embeddings.stats() if registry.is_ready('embeddings') else None,
+        "vector_pool": vector_pool.stats(),
+        "vector_backend": vector_backend.stats(),
+        "uploads": upload_store.stats(),
+        "tokens": token_cache.stats(),
+        "llm": {"chat": chat_gateway.stats(), "embeddings": embedding_gateway.stats()},
+        "structured_output": structured.stats(),
+        "retrieval": dict(chat_retriever.stats(), indexes=lexical_indexes.stats()),
+    })
+
+
+metrics.describe('http_request_seconds', 'Request latency by route, method and status')
+metrics.describe('stage_seconds', 'Time spent in each hot-path stage, by route')
+metrics.describe('llm_call_seconds', 'Chat model call latency, by route')
+metrics.describe('llm_tokens_total', 'LLM tokens reported by the provider, by route and kind')
+metrics.describe('llm_errors_total', 'Chat model calls that failed, by route')
+metrics.describe('llm_streams_stopped_total', 'Streamed chat model calls closed early by the caller, by route')
+# counters= lists the fields that only grow; everything else is exported as a gauge
+CACHE_COUNTERS = ('hits', 'misses', '*_hits', 'evictions', 'expirations')
+GATEWAY_COUNTERS = ('calls', 'acquired', 'coalesced', 'retries', 'failures', 'throttled')
+metrics.register_stats('vector_pool', vector_pool.stats, counters=CACHE_COUNTERS)
+metrics.register_stats('vector_backend', vector_backend.stats)
+metrics.register_stats('response_cache', response_cache.stats, counters=CACHE_COUNTERS)
+metrics.register_stats('embedding_cache', lambda: embeddings.stats() if registry.is_ready('embeddings') else None,
+                       counters=CACHE_COUNTERS)
+metrics.register_stats('pdf', pdf_extractor.stats,
+                       counters=('cache_hits', 'extracted', 'parallel', 'rejected', 'timeouts'))
+metrics.register_stats('uploads', upload_store.stats,
+                       counters=('stored', 'deduplicated', 'rejected', 'discarded', 'bytes'))
+metrics.register_stats('auth_tokens', token_cache.stats, counters=('hits', 'misses', 'invalid', 'revoked'))
+metrics.register_stats('password_hasher', password_hasher.stats,
+                       counters=('hashed', 'verified', 'rejected_busy', 'timeouts'))
+metrics.register_stats('llm_chat', chat_gateway.stats, counters=GATEWAY_COUNTERS)
+metrics.register_stats('llm_embeddings', embedding_gateway.stats, counters=GATEWAY_COUNTERS)
+metrics.register_stats('structured_output', structured.stats,
+                       counters=('parsed', 'repaired', 'fixed', 'failed', 'fix_calls'))
+metrics.register_stats('retrieval', chat_retriever.stats,
+                       counters=('vector', 'lexical', 'hybrid', 'small_store', 'lexical_fallbacks', 'embedding_calls',
+                                 'embedding_calls_avoided'))
+metrics.register_stats('lexical_indexes', lexical_indexes.stats, counters=CACHE_COUNTERS + ('rebuilds',))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled (METRICS_ENABLED=0)"}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# WARM_PROVIDERS=1 builds every provider at import; a comma-separated list warms just those
+_warm = os.getenv('WARM_PROVIDERS', '')
+if _warm:
+    registry.warm(None if _warm.strip() in ('1', 'all') else [n.strip() for n in _warm.split(',') if n.strip()])
+
 if __name__ == '__main__':
     if not os.path.exists(CHROMA_DB_PATH):
         os.makedirs(CHROMA_DB_PATH)
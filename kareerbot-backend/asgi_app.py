@@ -0,0 +1,300 @@
+# asgi_app.py
+# Async serving mode. The LLM-bound endpoints are served by Starlette handlers that await
+# the model (ainvoke/astream), so a single process holds hundreds of in-flight requests on
+# one event loop instead of one OS thread each. Every other route falls through to the
+# Flask app, mounted as WSGI, so the HTTP API is unchanged.
+#
+#   WEB_CONCURRENCY=4 uvicorn asgi_app:asgi --port 5000      # uvicorn reads its --workers from it
+#   KAREERBOT_FAKE_LLM=1 uvicorn asgi_app:asgi --port 5000   # offline, see fake_llm.py
+
+import contextlib
+import os
+import time
+from types import SimpleNamespace
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as kb
+from llm_gateway import current_user
+from metrics import current_route
+from streaming import SSE_HEADERS, sse_event, astream_callback_tokens
+from structured_output import JsonScanner
+
+
+async def _json_body(request):
+    try:
+        data = await request.json()
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def _token_user(request):
+    # _bearer_token only needs .headers and .args. A cached token is a dict lookup; verifying
+    # one (jwt.decode and the revocation query) runs in the thread pool, off the event loop
+    token = kb._bearer_token(SimpleNamespace(headers=request.headers, args=request.query_params))
+    if not token:
+        return None
+    user_id = kb.token_cache.cached_user_id(token)
+    if user_id is None:
+        user_id = await run_in_threadpool(kb.token_cache.user_id, token)
+    return user_id
+
+
+def _user_id(request, data):
+    # request.state.token_user was resolved once by _route
+    return request.state.token_user or data.get('user_id') or request.query_params.get('user_id') or 'default'
+
+
+def _error(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def _sse(generator):
+    return StreamingResponse(generator, media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def _chat_user_store(request, data):
+    user_id = _user_id(request, data)
+    # opening a Chroma store touches disk; keep it off the event loop
+    return user_id, await run_in_threadpool(kb._user_store_or_none, user_id)
+
+
+async def chat(request):
+    data = await _json_body(request)
+    message = data.get("message")
+    if not message:
+        return _error("Message is required", 400)
+    section_error = kb._section_error(data)
+    if section_error:
+        return _error(section_error, 400)
+
+    user_id, user_vs = await _chat_user_store(request, data)
+    if user_vs is None:
+        return _error("Please upload your resume first.", 400)
+
+    try:
+        skill_future = kb.submit_llm(kb._capture_chat_skills, user_id, message, user_vs)
+        result = await kb._build_retrieval_chain(user_id, user_vs, data.get('section')).ainvoke({"input": message})
+        return JSONResponse({"reply": result['answer'] + kb._skills_note(skill_future)})
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def chat_stream(request):
+    data = await _json_body(request)
+    message = data.get("message")
+    if not message:
+        return _error("Message is required", 400)
+    section_error = kb._section_error(data)
+    if section_error:
+        return _error(section_error, 400)
+
+    user_id, user_vs = await _chat_user_store(request, data)
+    if user_vs is None:
+        return _error("Please upload your resume first.", 400)
+
+    skill_future = kb.submit_llm(kb._capture_chat_skills, user_id, message, user_vs)
+
+    async def generate():
+        parts = []
+        try:
+            retrieval_chain = kb._build_retrieval_chain(user_id, user_vs, data.get('section'))
+            async for chunk in retrieval_chain.astream({"input": message}):
+                token = chunk.get('answer')
+                if token:
+                    parts.append(token)
+                    yield sse_event({'token': token})
+        except Exception as e:
+            yield sse_event({'error': str(e)}, event='error')
+            return
+        note = kb._skills_note(skill_future)
+        if note:
+            yield sse_event({'token': note})
+        yield sse_event({'reply': ''.join(parts) + note}, event='done')
+
+    return _sse(generate())
+
+
+async def agent_plan(request):
+    data = await _json_body(request)
+    goal = data.get("goal")
+    if not goal:
+        return _error("Goal is required", 400)
+
+    async def compute():
+        return await kb.structured.agenerate('agent-plan', kb.chat_model, kb._agent_plan_prompt(goal),
+                                             kb.AGENT_PLAN_SCHEMA)
+
+    try:
+        key = kb.make_cache_key(kb.AGENT_PLAN_PROMPT_VERSION, kb._model_name(), goal=goal)
+        plan = await kb.response_cache.aget_or_compute('agent-plan', key, compute)
+        return JSONResponse({"plan": plan})
+    except Exception as e:
+        print(f"Error in agent_plan: {e}")
+        return _error(str(e), 500)
+
+
+async def agent_plan_stream(request):
+    data = await _json_body(request)
+    goal = data.get("goal")
+    if not goal:
+        return _error("Goal is required", 400)
+
+    key = kb.make_cache_key(kb.AGENT_PLAN_PROMPT_VERSION, kb._model_name(), goal=goal)
+
+    async def generate():
+        plan = kb.response_cache.get('agent-plan', key)
+        if plan is not None:
+            yield sse_event({'plan': plan}, event='done')
+            return
+        parts = []
+        scanner = JsonScanner('{')
+        try:
+            async for chunk in kb.chat_model.astream(kb._agent_plan_prompt(goal)):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield sse_event({'token': chunk.content})
+                    if any(kb.structured.is_valid(value, kb.AGENT_PLAN_SCHEMA) for value in scanner.feed(chunk.content)):
+                        break
+            plan = await kb.structured.arecover('agent-plan', ''.join(parts), kb.AGENT_PLAN_SCHEMA, kb.chat_model)
+            kb.response_cache.set(key, plan)
+        except Exception as e:
+            print(f"Error in agent_plan: {e}")
+            yield sse_event({'error': str(e)}, event='error')
+            return
+        yield sse_event({'plan': plan}, event='done')
+
+    return _sse(generate())
+
+
+async def agent_query(request):
+    data = await _json_body(request)
+    if not data.get("query"):
+        return _error("Query is required", 400)
+
+    try:
+        response = await kb.agent_executor.ainvoke(kb._agent_query_input(data))
+        return JSONResponse({"reply": response.get("output", "No response generated.")})
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def agent_query_stream(request):
+    data = await _json_body(request)
+    if not data.get("query"):
+        return _error("Query is required", 400)
+
+    try:
+        agent_input = kb._agent_query_input(data)
+    except Exception as e:
+        return _error(str(e), 500)
+
+    async def generate():
+        arun = lambda callbacks: kb.agent_executor.ainvoke(agent_input, config={"callbacks": callbacks})
+        async for kind, value in astream_callback_tokens(arun):
+            if kind == 'token':
+                yield sse_event({'token': value})
+            elif kind == 'error':
+                yield sse_event({'error': str(value)}, event='error')
+            else:
+                yield sse_event({'reply': value.get("output", "No response generated.")}, event='done')
+
+    return _sse(generate())
+
+
+async def predict_success(request):
+    data = await _json_body(request)
+    resume_text = data.get("resumeText")
+    goal = data.get("goal")
+    if not resume_text or not goal:
+        return _error("Resume and goal are required.", 400)
+
+    async def compute():
+        return await kb.structured.agenerate('predict-success', kb.chat_model,
+                                             kb._prediction_prompt(resume_text, goal), kb.PREDICTION_SCHEMA)
+
+    try:
+        key = kb.make_cache_key(kb.PREDICT_SUCCESS_PROMPT_VERSION, kb._model_name(), scope=_user_id(request, data),
+                                resume_text=resume_text, goal=goal)
+        prediction = await kb.response_cache.aget_or_compute('predict-success', key, compute)
+        return JSONResponse({"prediction": prediction})
+    except Exception as e:
+        print(f"Error in predict_success: {e}")
+        return _error(str(e), 500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    # The async routes never pass through Flask's before_request, so prepare the schema here
+    await run_in_threadpool(kb.registry.get, 'schema')
+    yield
+
+
+async def _iterate_bound(iterator, user_id, route):
+    # A StreamingResponse body runs after the handler has returned and its bindings are
+    # reset, so the stream binds the caller and route again around its own iteration
+    # (the async counterpart of Flask's stream_with_context)
+    token = current_user.set(user_id)
+    route_token = current_route.set(route)
+    try:
+        async for item in iterator:
+            yield item
+    finally:
+        # a stream closed from another task cannot reset vars it did not set
+        with contextlib.suppress(ValueError):
+            current_route.reset(route_token)
+            current_user.reset(token)
+
+
+def _route(path, handler):
+    # Same permissive CORS as flask_cors on the Flask routes; binds the caller for the LLM
+    # gateway and the route for metrics
+    async def wrapped(request):
+        if request.method == 'OPTIONS':
+            response = JSONResponse(None)
+            response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
+            response.headers['Access-Control-Allow-Headers'] = request.headers.get('access-control-request-headers', '*')
+        else:
+            start = time.perf_counter()
+            user_id = request.state.token_user = await _token_user(request)
+            token = current_user.set(user_id)
+            route_token = current_route.set(path)
+            try:
+                response = await handler(request)
+                kb.metrics.observe('http_request_seconds', time.perf_counter() - start,
+                                   route=path, method=request.method, status=response.status_code)
+            finally:
+                current_route.reset(route_token)
+                current_user.reset(token)
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _iterate_bound(response.body_iterator, user_id, path)
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+    return wrapped
+
+
+ASYNC_ROUTES = {
+    "/api/chat": chat,
+    "/api/chat/stream": chat_stream,
+    "/api/agent-plan": agent_plan,
+    "/api/agent-plan/stream": agent_plan_stream,
+    "/api/agent-query": agent_query,
+    "/api/agent-query/stream": agent_query_stream,
+    "/api/predict-success": predict_success,
+}
+
+asgi = Starlette(
+    routes=[Route(path, _route(path, handler), methods=["POST", "OPTIONS"]) for path, handler in ASYNC_ROUTES.items()]
+    + [Mount("/", app=WsgiToAsgi(kb.app))],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(asgi, host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', '5000')))
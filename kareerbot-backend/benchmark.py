@@ -0,0 +1,303 @@
+# benchmark.py
+# Offline load benchmark for the Flask backend.
+#
+# Swaps Gemini for the deterministic fakes in fake_llm.py (KAREERBOT_FAKE_LLM=1), runs
+# the app against throwaway databases in a temp directory and drives every route with
+# concurrent clients, reporting p50/p95/p99 latency, throughput and memory per route.
+#
+#   python benchmark.py --requests 200 --concurrency 16 --llm-latency 0.2
+#   python benchmark.py --json after.json --compare before.json --max-regression 0.2
+#   python benchmark.py --routes login --duration 30 --concurrency 32   # sustained login throughput
+#   python benchmark.py --asgi --routes chat,agent-plan --concurrency 300 --llm-latency 1
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import percentile
+
+ROUTES = ['register', 'login', 'process-resume', 'chat', 'compare-profile', 'agent-plan', 'predict-success']
+
+GOALS = ['become a data scientist', 'become a frontend developer', 'get a cloud engineering job',
+         'move into product management', 'become a machine learning engineer']
+SKILLS = ['Python', 'SQL', 'React', 'Docker', 'AWS', 'Kubernetes', 'Java', 'TypeScript', 'Git', 'Azure']
+
+
+def sample_resume(i):
+    skills = ', '.join(SKILLS[(i + k) % len(SKILLS)] for k in range(4))
+    return (
+        f"Candidate {i}\nSummary\nSoftware engineer with {2 + i % 8} years of experience.\n"
+        f"Experience\n- Built data pipelines and APIs at Company {i % 13}\n- Led a team of {1 + i % 5} engineers\n"
+        f"Skills\n{skills}\nEducation\nB.Tech in Computer Science, {2010 + i % 12}\n"
+    )
+
+
+def min_window_rps(finished, start, wall, window=1.0):
+    # Throughput of the slowest full one-second window: a stall shows up here, not in the mean
+    windows = int(wall // window)
+    if windows < 2:
+        return None
+    counts = [0] * windows
+    for t in finished:
+        i = int((t - start) // window)
+        if i < windows:
+            counts[i] += 1
+    return min(counts) / window
+
+
+def configure_environment(args, workdir):
+    # Must run before `import app`: the app reads these at import time
+    os.environ['KAREERBOT_FAKE_LLM'] = '1'
+    os.environ['FAKE_LLM_LATENCY'] = str(args.llm_latency)
+    os.environ['FAKE_LLM_TOKEN_DELAY'] = str(args.token_delay)
+    os.environ['FAKE_EMBED_LATENCY'] = str(args.embed_latency)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['EMBEDDING_CACHE_PATH'] = os.path.join(workdir, 'embedding_cache.db')
+    # the search tool validates that a key is present; no route in the benchmark calls it
+    os.environ.setdefault('TAVILY_API_KEY', 'offline-benchmark')
+    if args.cold_cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    if args.hash_method:
+        os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+    # relative paths (chroma_db/, uploads/) land in the temp dir
+    os.chdir(workdir)
+
+
+class AsgiResponse:
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self._response = response
+
+    def get_json(self):
+        return self._response.json()
+
+
+class AsgiClient:
+    # Test-client look-alike for the ASGI app: every benchmark thread submits to one event
+    # loop, so the app sees `concurrency` requests in flight on a single loop, as under uvicorn
+    def __init__(self, asgi):
+        import httpx
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        transport = httpx.ASGITransport(app=asgi)
+        self._client = httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None)
+
+    def _send(self, method, path, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(self._client.request(method, path, **kwargs), self._loop)
+        return AsgiResponse(future.result())
+
+    def get(self, path, headers=None):
+        return self._send('GET', path, headers=headers)
+
+    def post(self, path, json=None, headers=None):
+        return self._send('POST', path, json=json, headers=headers)
+
+
+class Bench:
+    def __init__(self, app_module, args):
+        self.app = app_module.app
+        self.args = args
+        self._local = threading.local()
+        self.users = []  # (contact, password, token, user_id)
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+        self._asgi_client = None
+        if args.asgi:
+            import asgi_app
+            app_module.registry.get('schema')
+            self._asgi_client = AsgiClient(asgi_app.asgi)
+
+    def client(self):
+        if self._asgi_client:
+            return self._asgi_client
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def next_id(self):
+        with self._counter_lock:
+            self._counter += 1
+            return self._counter
+
+    def setup(self):
+        # Users with a resume on file, shared by the login/chat/profile scenarios
+        c = self.client()
+        for i in range(self.args.users):
+            contact, password = f'bench{i}@example.com', 'bench-password'
+            r = c.post('/api/register', json={'contact': contact, 'password': password})
+            token = r.get_json()['token']
+            user_id = str(r.get_json()['user_id'])
+            c.post('/api/process-resume', json={'text': sample_resume(i)}, headers={'Authorization': f'Bearer {token}'})
+            self.users.append((contact, password, token, user_id))
+
+    def user(self, n):
+        return self.users[n % len(self.users)]
+
+    def request(self, route, n):
+        c = self.client()
+        contact, password, token, _ = self.user(n)
+        auth = {'Authorization': f'Bearer {token}'}
+        if route == 'register':
+            i = self.next_id()
+            return c.post('/api/register', json={'contact': f'new{i}-{time.time_ns()}@example.com', 'password': 'pw'})
+        if route == 'login':
+            return c.post('/api/login', json={'contact': contact, 'password': password})
+        if route == 'process-resume':
+            # unique text per request: the full parse/chunk/embed/feedback path, never the dedupe shortcut
+            i = self.next_id()
+            return c.post('/api/process-resume', json={'text': sample_resume(10_000 + i) + f'\nRef {i}'}, headers=auth)
+        if route == 'chat':
+            return c.post('/api/chat', json={'message': f'How can I improve my {SKILLS[n % len(SKILLS)]} experience?'}, headers=auth)
+        if route == 'compare-profile':
+            return c.get('/api/compare-profile', headers=auth)
+        if route == 'agent-plan':
+            return c.post('/api/agent-plan', json={'goal': GOALS[n % len(GOALS)]}, headers=auth)
+        if route == 'predict-success':
+            return c.post('/api/predict-success', json={'resumeText': sample_resume(n % 50), 'goal': GOALS[n % len(GOALS)]}, headers=auth)
+        raise ValueError(f'unknown route {route}')
+
+    def run_route(self, route):
+        latencies = []
+        finished = []
+        errors = 0
+        lock = threading.Lock()
+
+        def one(n):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                status = self.request(route, n).status_code
+            except Exception:
+                status = 599
+            end = time.perf_counter()
+            with lock:
+                latencies.append(end - start)
+                finished.append(end)
+                if status >= 400:
+                    errors += 1
+
+        def until_deadline(worker, deadline):
+            # --duration: each client loops until the deadline instead of taking a fixed share
+            n = worker
+            while time.perf_counter() < deadline:
+                one(n)
+                n += self.args.concurrency
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if self.args.tracemalloc:
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            if self.args.duration:
+                deadline = wall_start + self.args.duration
+                list(pool.map(lambda w: until_deadline(w, deadline), range(self.args.concurrency)))
+            else:
+                list(pool.map(one, range(self.args.requests)))
+        wall = time.perf_counter() - wall_start
+        peak = None
+        if self.args.tracemalloc:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'throughput_rps': len(latencies) / wall if wall else 0.0,
+            'min_window_rps': min_window_rps(finished, wall_start, wall),
+            'max_rss_mb': rss_after / 1024.0,
+            'rss_growth_mb': (rss_after - rss_before) / 1024.0,
+            'traced_peak_mb': (peak / (1024.0 * 1024.0)) if peak is not None else None,
+        }
+
+
+def print_report(results):
+    header = (f"{'route':<18}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+              f"{'min req/s':>11}{'rss MB':>9}")
+    print(header)
+    print('-' * len(header))
+    for route, r in results.items():
+        min_rps = f"{r['min_window_rps']:>11.1f}" if r.get('min_window_rps') is not None else f"{'-':>11}"
+        print(f"{route:<18}{r['requests']:>6}{r['errors']:>6}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>10.1f}{min_rps}{r['max_rss_mb']:>9.1f}")
+
+
+def compare(results, baseline_path, max_regression):
+    # Non-zero exit when any route's p95 regressed past the allowed ratio
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['routes']
+    failed = []
+    for route, r in results.items():
+        base = baseline.get(route)
+        if not base or not base['p95_ms']:
+            continue
+        change = (r['p95_ms'] - base['p95_ms']) / base['p95_ms']
+        print(f"{route:<18} p95 {base['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms ({change:+.0%})")
+        if change > max_regression:
+            failed.append(route)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline backend benchmark with fake Gemini model and embeddings.')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma-separated subset of: ' + ', '.join(ROUTES))
+    parser.add_argument('--requests', type=int, default=100, help='requests per route')
+    parser.add_argument('--duration', type=float, default=0.0,
+                        help='run each route for this many seconds instead of --requests (sustained load)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=20, help='pre-registered users with a resume on file')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='fake model time to first token (s)')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='fake model delay per token (s)')
+    parser.add_argument('--embed-latency', type=float, default=0.02, help='fake embedding round trip (s)')
+    parser.add_argument('--cold-cache', action='store_true', help='disable the in-memory LLM response cache')
+    parser.add_argument('--asgi', action='store_true', help='drive asgi_app (async LLM routes) instead of the Flask app')
+    parser.add_argument('--hash-method', help='PASSWORD_HASH_METHOD for the run, e.g. pbkdf2:sha256:600000')
+    parser.add_argument('--tracemalloc', action='store_true', help='record Python heap peak per route (slower)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --json run')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='allowed p95 increase vs baseline')
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    # resolve output paths before the benchmark moves into its temp directory
+    args.json = os.path.abspath(args.json) if args.json else None
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix='kareerbot-bench-')
+    configure_environment(args, workdir)
+    import app as app_module
+
+    bench = Bench(app_module, args)
+    bench.setup()
+    results = {route: bench.run_route(route) for route in routes}
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'routes': results}, f, indent=2)
+    if args.compare:
+        failed = compare(results, args.compare, args.max_regression)
+        if failed:
+            print(f"p95 regression over {args.max_regression:.0%} in: {', '.join(failed)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
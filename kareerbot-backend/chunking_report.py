@@ -0,0 +1,207 @@
+# chunking_report.py
+# Compares the section-aware resume chunker (resume_chunker.py) with the old
+# RecursiveCharacterTextSplitter(1000, 200) on a generated corpus of sample resumes.
+#
+# Every resume is built from known facts: each experience and project bullet names a
+# system that appears nowhere else in the resume. For a sample of bullets the report asks
+# a question about that system and retrieves the top k chunks with BM25, the default chat
+# retrieval mode (the offline fake embeddings are random, so a vector hit rate would mean
+# nothing here). It reports
+#
+#   chunks / tokens   how many chunks and tokens get embedded and stored per resume
+#   inflation         embedded tokens over resume tokens; overlap pushes this above 1
+#   cut bullets       bullets that no single chunk holds whole
+#   hit@k             questions whose bullet comes back whole in the top k
+#   grounded@k        ... in a chunk that also names the employer or project it belongs to
+#
+#   python chunking_report.py
+#   python chunking_report.py --resumes 200 --k 1,2,4 --max-tokens 256 --json report.json
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Vandelay', 'Stark Industries', 'Wayne Enterprises',
+             'Soylent', 'Tyrell', 'Cyberdyne', 'Wonka', 'Aperture', 'Massive Dynamic', 'Pied Piper', 'Dunder Mifflin']
+TITLES = ['Software Engineer', 'Senior Software Engineer', 'Data Engineer', 'Backend Developer', 'Platform Engineer',
+          'Machine Learning Engineer', 'Frontend Developer', 'Site Reliability Engineer', 'Tech Lead']
+TECH = ['Kafka', 'Spark', 'Airflow', 'Redis', 'PostgreSQL', 'Kubernetes', 'Terraform', 'React', 'GraphQL', 'gRPC',
+        'Snowflake', 'dbt', 'Elasticsearch', 'RabbitMQ', 'Flink', 'TensorFlow', 'PyTorch', 'Django', 'FastAPI', 'Go']
+SYSTEM_PARTS = (['ledger', 'billing', 'search', 'routing', 'pricing', 'inventory', 'checkout', 'ranking', 'fraud',
+                 'ingest', 'catalog', 'payout', 'alerting', 'booking', 'matching', 'telemetry'],
+                ['atlas', 'orion', 'falcon', 'harbor', 'summit', 'cobalt', 'juniper', 'meridian', 'quartz', 'sierra',
+                 'tundra', 'zephyr', 'beacon', 'cascade', 'ember', 'lumen'])
+BULLETS = [
+    "Reduced p99 latency of the {system} service by {n}% by moving hot reads to {tech}",
+    "Rebuilt the {system} pipeline on {tech}, cutting nightly batch time from {h} hours to {m} minutes",
+    "Designed the {system} API used by {n} internal teams, with {tech} for schema evolution",
+    "Migrated the {system} platform to {tech} with zero downtime across {n} regions",
+    "Led a team of {k} engineers that launched {system}, a {tech}-based service handling {n}k requests per second",
+    "Cut cloud spend of the {system} cluster by ${n}k per year through {tech} autoscaling",
+]
+HEADERS = {
+    'summary': ['Summary', 'PROFESSIONAL SUMMARY', 'Profile:'],
+    'experience': ['Experience', 'WORK EXPERIENCE', 'Professional Experience:', '## Experience'],
+    'projects': ['Projects', 'PERSONAL PROJECTS', 'Key Projects:'],
+    'skills': ['Skills', 'TECHNICAL SKILLS', 'Core Competencies'],
+    'education': ['Education', 'EDUCATION'],
+    'certifications': ['Certifications', 'CERTIFICATIONS'],
+}
+
+
+def _wrap(line, width=90):
+    # PDF extraction leaves long bullets hard-wrapped with an indent
+    if len(line) <= width:
+        return line
+    cut = line.rfind(' ', 0, width)
+    return line[:cut] + '\n  ' + line[cut + 1:].lower()
+
+
+def generate_resume(i, rng):
+    # -> (text, [(bullet text, owner)]) where owner is the employer or project the bullet belongs to
+    systems = [f"{a}-{b}" for a in SYSTEM_PARTS[0] for b in SYSTEM_PARTS[1]]
+    rng.shuffle(systems)
+    bullet_char = rng.choice(['•', '-', '*'])
+    style = rng.randrange(3)
+    facts = []
+    lines = [f"Candidate {i}", f"candidate{i}@example.com | +1 555 {1000 + i}", '']
+
+    def header(section):
+        options = HEADERS[section]
+        lines.append(options[style % len(options)])
+
+    def bullet(owner):
+        text = rng.choice(BULLETS).format(system=systems.pop(), tech=rng.choice(TECH), n=rng.randint(10, 90),
+                                          h=rng.randint(3, 9), m=rng.randint(5, 50), k=rng.randint(3, 12))
+        facts.append((text, owner))
+        lines.append(_wrap(f"{bullet_char} {text}") if rng.random() < 0.5 else f"{bullet_char} {text}")
+
+    header('summary')
+    lines.append(f"{rng.choice(TITLES)} with {rng.randint(3, 15)} years of experience building "
+                 f"{rng.choice(TECH)} and {rng.choice(TECH)} systems for high-traffic consumer products. "
+                 f"Known for pragmatic architecture, mentoring and measurable impact on reliability and cost.")
+    lines.append('')
+    header('experience')
+    for company in rng.sample(COMPANIES, rng.randint(3, 6)):
+        start = rng.randint(2008, 2020)
+        lines.append(f"{rng.choice(TITLES)}, {company} ({start}-{start + rng.randint(1, 4)})")
+        for _ in range(rng.randint(3, 6)):
+            bullet(company)
+    lines.append('')
+    header('projects')
+    for p in range(rng.randint(2, 4)):
+        name = f"Project {systems.pop().title()}"
+        lines.append(f"{name} | {rng.choice(TECH)}, {rng.choice(TECH)}")
+        for _ in range(rng.randint(1, 3)):
+            bullet(name)
+    lines.append('')
+    header('skills')
+    lines.append(', '.join(rng.sample(TECH, 10)))
+    lines.append('')
+    header('education')
+    lines.append(f"B.Tech in Computer Science, University {i % 23}, {rng.randint(2005, 2018)}")
+    lines.append('')
+    header('certifications')
+    for cert in rng.sample(['AWS Solutions Architect', 'CKA', 'GCP Data Engineer', 'Azure Developer',
+                            'Terraform Associate'], 2):
+        lines.append(f"{bullet_char} {cert}")
+    return '\n'.join(lines), facts
+
+
+def question(fact):
+    system = re.search(r"[a-z]+-[a-z]+", fact).group(0)
+    return f"What did I do on {system}?"
+
+
+def _flat(text):
+    return ' '.join(text.replace('\n', ' ').split()).lower()
+
+
+def recursive_chunks(text):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(text)
+
+
+def section_chunks(chunker):
+    return lambda text: [chunk for chunk, _ in chunker.split_text(text)]
+
+
+def evaluate(name, split, corpus, ks, questions_per_resume, rng):
+    from lexical_retrieval import BM25Index
+    from resume_chunker import count_tokens
+
+    totals = {'chunks': 0, 'chunk_tokens': 0, 'resume_tokens': 0, 'bullets': 0, 'cut': 0, 'questions': 0}
+    hits = {k: 0 for k in ks}
+    grounded = {k: 0 for k in ks}
+    for text, facts in corpus:
+        chunks = split(text)
+        flat_chunks = [_flat(chunk) for chunk in chunks]
+        index = BM25Index()
+        index.add([str(i) for i in range(len(chunks))], chunks)
+        totals['chunks'] += len(chunks)
+        totals['chunk_tokens'] += sum(count_tokens(chunk) for chunk in chunks)
+        totals['resume_tokens'] += count_tokens(text)
+        for fact, _ in facts:
+            totals['bullets'] += 1
+            totals['cut'] += not any(_flat(fact) in chunk for chunk in flat_chunks)
+        for fact, owner in rng.sample(facts, min(questions_per_resume, len(facts))):
+            ranked = [flat_chunks[int(doc_id)] for _, doc_id, _, _ in index.search(question(fact), max(ks))]
+            totals['questions'] += 1
+            for k in ks:
+                whole = [chunk for chunk in ranked[:k] if _flat(fact) in chunk]
+                hits[k] += bool(whole)
+                grounded[k] += any(owner.lower() in chunk for chunk in whole)
+    n = len(corpus)
+    return {
+        'splitter': name,
+        'chunks_per_resume': totals['chunks'] / n,
+        'tokens_per_chunk': totals['chunk_tokens'] / max(1, totals['chunks']),
+        'embedded_tokens_per_resume': totals['chunk_tokens'] / n,
+        'inflation': totals['chunk_tokens'] / max(1, totals['resume_tokens']),
+        'cut_bullets': totals['cut'] / max(1, totals['bullets']),
+        'hit_at_k': {k: hits[k] / max(1, totals['questions']) for k in ks},
+        'grounded_at_k': {k: grounded[k] / max(1, totals['questions']) for k in ks},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resume chunker vs recursive splitter report')
+    parser.add_argument('--resumes', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=5, help='questions per resume')
+    parser.add_argument('--k', default='1,2,' + os.getenv('RETRIEVAL_K', '4'), help='comma-separated top-k values')
+    parser.add_argument('--max-tokens', type=int, default=256)
+    parser.add_argument('--overlap-tokens', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from resume_chunker import ResumeChunker
+
+    ks = sorted({int(k) for k in args.k.split(',') if k.strip()})
+    corpus_rng = random.Random(args.seed)
+    corpus = [generate_resume(i, corpus_rng) for i in range(args.resumes)]
+    chunker = ResumeChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+    results = [evaluate(name, split, corpus, ks, args.questions, random.Random(args.seed))
+               for name, split in [('recursive-1000/200', recursive_chunks),
+                                   (f'sections-{args.max_tokens}', section_chunks(chunker))]]
+
+    print(f"{args.resumes} resumes, {args.questions} questions each, BM25 retrieval\n")
+    print(f"{'splitter':<20}{'chunks':>8}{'tok/chunk':>11}{'tokens':>9}{'inflation':>11}{'cut':>8}"
+          + ''.join(f"{f'hit@{k}':>9}{f'grnd@{k}':>9}" for k in ks))
+    print('-' * (67 + 18 * len(ks)))
+    for r in results:
+        print(f"{r['splitter']:<20}{r['chunks_per_resume']:>8.1f}{r['tokens_per_chunk']:>11.0f}"
+              f"{r['embedded_tokens_per_resume']:>9.0f}{r['inflation']:>11.2f}{r['cut_bullets']:>8.1%}"
+              + ''.join(f"{r['hit_at_k'][k]:>9.1%}{r['grounded_at_k'][k]:>9.1%}" for k in ks))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# embedding_cache.py
+# Content-addressed embedding cache shared across users.
+#
+# Vectors are stored in a local SQLite table keyed by a hash of the model name,
+# the embedding kind (document/query) and the chunk text, so a chunk that was
+# embedded once never costs another API call, whoever uploads it.
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+
+try:
+    from langchain_core.embeddings import Embeddings as _EmbeddingsBase
+except Exception:
+    _EmbeddingsBase = object
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(_EmbeddingsBase):
+    def __init__(self, embeddings, path='./embedding_cache.db', namespace='default'):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embedding_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' dim INTEGER NOT NULL,'
+            ' vector BLOB NOT NULL)'
+        )
+        self._conn.commit()
+        # counted once here and then kept up to date by _store, so stats() (read on every
+        # /metrics scrape) never scans the table; rows added by other processes show up
+        # after a restart
+        self._size = self._conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, kind, text):
+        h = hashlib.sha256()
+        h.update(f'{self.namespace}\0{kind}\0'.encode('utf-8'))
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array('f')
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+        return found
+
+    def _store(self, items):
+        rows = [(key, len(vec), array('f', vec).tobytes()) for key, vec in items]
+        with self._lock:
+            # keys are content hashes, so an existing row already holds this vector
+            cursor = self._conn.executemany('INSERT OR IGNORE INTO embedding_cache (key, dim, vector) VALUES (?, ?, ?)', rows)
+            self._conn.commit()
+            self._size += max(0, cursor.rowcount)
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys = [self._key('doc', t) for t in texts]
+        cached = self._lookup(set(keys))
+
+        # Batch every distinct miss into a single upstream call
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self._count(len(texts) - len(missing), len(missing))
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update((key, list(vec)) for key, vec in fresh)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self._key('query', text)
+        cached = self._lookup([key])
+        if key in cached:
+            self._count(1, 0)
+            return cached[key]
+        self._count(0, 1)
+        vector = list(self.embeddings.embed_query(text))
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self):
+        with self._lock:
+            size, hits, misses = self._size, self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'entries': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,135 @@
+# fake_llm.py
+# Deterministic local stand-ins for the Gemini chat model and embeddings, for offline
+# development, streaming checks and benchmarks. Enable them in the app with
+# KAREERBOT_FAKE_LLM=1 (latency: FAKE_LLM_LATENCY, FAKE_LLM_TOKEN_DELAY, FAKE_EMBED_LATENCY).
+#
+# Responses are canned per prompt type (resume feedback, skill extraction, plans, ...)
+# and streamed word by word with a configurable latency.
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _prompt_text(messages):
+    return '\n'.join(m.content if isinstance(m.content, str) else json.dumps(m.content) for m in messages)
+
+
+def canned_response(prompt: str):
+    # Pick an answer shaped like what each route's prompt asks for
+    seed = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16)
+    if 'Extract skills or technologies' in prompt:
+        found = re.findall(r"\b(Python|JavaScript|React|Node|SQL|Docker|Kubernetes|AWS|Azure|Java|Git|TypeScript)\b",
+                           prompt.split('Message:', 1)[-1], re.IGNORECASE)
+        return json.dumps(sorted(set(found)))
+    if 'HR recruiter' in prompt:
+        return json.dumps({
+            'strengths': ['Clear project descriptions', 'Relevant technical skills', 'Consistent formatting'],
+            'improvements': ['Quantify achievements', 'Add a short summary', 'List certifications'],
+        })
+    if 'success score' in prompt:
+        return json.dumps({'success_score': 40 + seed % 50, 'justification': 'The resume shows relevant skills but lacks depth in a few key areas.'})
+    if 'actionable plans' in prompt:
+        goal = re.search(r"User's Goal:\s*(.*)", prompt)
+        steps = [{'step': f'Step {i + 1}', 'description': 'Work on the next skill.', 'keywords': ['practice', 'project'],
+                  'actions': ['Read the docs', 'Build a small project']} for i in range(10)]
+        return json.dumps({'goal': goal.group(1).strip() if goal else '', 'plan': steps})
+    if 'career analyst' in prompt:
+        return json.dumps({'summary': 'A developer profile with a solid base.', 'gaps': [], 'recommended_next_steps': []})
+    if 'JSON' in prompt and '{' in prompt:
+        return '{}'
+    return 'Based on your resume, focus on strengthening your most relevant skills and highlighting measurable results.'
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return 'fake-streaming-chat'
+
+    def bind_tools(self, tools, **kwargs):
+        # Never calls tools; lets the model back a tool-calling agent
+        return self
+
+    def _tokens(self, messages):
+        text = canned_response(_prompt_text(messages))
+        return re.findall(r'\S+\s*|\s+', text)
+
+    @staticmethod
+    def _usage(messages, tokens):
+        # rough counts in the shape Gemini reports, so token metrics have something to show offline
+        input_tokens = len(_prompt_text(messages)) // 4 + 1
+        return {'input_tokens': input_tokens, 'output_tokens': len(tokens), 'total_tokens': input_tokens + len(tokens)}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(
+            message=AIMessage(content=''.join(tokens), usage_metadata=self._usage(messages, tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(
+            message=AIMessage(content=''.join(tokens), usage_metadata=self._usage(messages, tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_delay)
+        tokens = self._tokens(messages)
+        for i, token in enumerate(tokens):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            # usage rides on the last chunk, as with Gemini
+            usage = self._usage(messages, tokens) if i == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_delay)
+        tokens = self._tokens(messages)
+        for i, token in enumerate(tokens):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            # usage rides on the last chunk, as with Gemini
+            usage = self._usage(messages, tokens) if i == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddings(Embeddings):
+    # Unit vectors seeded by the text hash: identical text always maps to the same vector
+    def __init__(self, size=768, latency=0.0):
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text):
+        rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+        vec = [rng.gauss(0.0, 1.0) for _ in range(self.size)]
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts):
+        # one simulated round trip per batch, like the real API
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._vector(text)
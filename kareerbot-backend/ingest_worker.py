@@ -0,0 +1,37 @@
+# ingest_worker.py
+# Standalone resume-ingestion worker. Run as many of these as needed, independently of
+# the Flask request workers; start the web app with INGEST_WORKERS=0 to leave all
+# background jobs to them.
+
+import argparse
+import os
+import threading
+
+# This process only claims jobs through run_forever below
+os.environ['INGEST_WORKERS'] = '0'
+
+import app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process queued resume ingestion jobs.')
+    parser.add_argument('--threads', type=int, default=2, help='jobs processed concurrently by this worker')
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds to sleep when the queue is empty')
+    args = parser.parse_args()
+
+    # no requests arrive here to trigger the schema provider
+    app.registry.get('schema')
+
+    threads = [
+        threading.Thread(target=app.ingest_jobs.run_forever, kwargs={'poll_interval': args.poll}, daemon=True)
+        for _ in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    print(f"Ingest worker started with {args.threads} threads")
+    for t in threads:
+        t.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+# job_queue.py
+# Durable background job queue backed by a table in the app's database.
+#
+# Jobs are rows; a worker claims one with a conditional UPDATE (queued -> running), so
+# any number of in-process pools and standalone worker processes can share the table
+# without running the same job twice.
+#
+# A claim is a lease: the worker heartbeats updated_at while the job runs, and a running
+# job whose updated_at is older than lease_seconds belonged to a worker that died. Such
+# jobs are queued again, up to max_attempts claims, and then marked failed, so a client
+# polling the job always sees it finish.
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+
+class JobQueue:
+    def __init__(self, session_factory, model, handler, max_workers=2, stages=(), lease_seconds=300.0,
+                 max_attempts=3):
+        # handler(job_dict, set_stage) -> JSON-serialisable result; raising marks the job failed
+        self._session_factory = session_factory
+        self._model = model
+        self._handler = handler
+        self.stages = list(stages)
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jobs') if max_workers else None
+        self._reaper = None
+
+    def enqueue(self, **fields):
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        with self._session_factory() as db:
+            db.add(self._model(id=job_id, status='queued', created_at=now, updated_at=now, **fields))
+            db.commit()
+        if self._executor:
+            self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id):
+        with self._session_factory() as db:
+            job = db.get(self._model, job_id)
+            return self._to_dict(job) if job else None
+
+    def _to_dict(self, job):
+        data = {c.name: getattr(job, c.name) for c in job.__table__.columns}
+        for key in ('created_at', 'updated_at'):
+            if data.get(key):
+                data[key] = data[key].isoformat()
+        if data.get('result'):
+            data['result'] = json.loads(data['result'])
+        stage = data.get('stage')
+        if data['status'] == 'done':
+            data['progress'] = 1.0
+        elif stage in self.stages:
+            data['progress'] = self.stages.index(stage) / len(self.stages)
+        else:
+            data['progress'] = 0.0
+        return data
+
+    def _update(self, job_id, attempt=None, **fields):
+        # attempt: only while this claim still holds the job, so a worker whose lease was
+        # taken over cannot overwrite the new attempt's state
+        fields['updated_at'] = datetime.utcnow()
+        with self._session_factory() as db:
+            query = db.query(self._model).filter(self._model.id == job_id)
+            if attempt is not None:
+                query = query.filter(self._model.status == 'running', self._model.attempts == attempt)
+            updated = query.update(fields)
+            db.commit()
+            return updated == 1
+
+    def _claim(self, job_id):
+        with self._session_factory() as db:
+            claimed = db.query(self._model).filter(
+                self._model.id == job_id, self._model.status == 'queued'
+            ).update({'status': 'running', 'updated_at': datetime.utcnow(),
+                      'attempts': func.coalesce(self._model.attempts, 0) + 1}, synchronize_session=False)
+            db.commit()
+            return claimed == 1
+
+    def _run(self, job_id):
+        if self._claim(job_id):
+            self._run_claimed(job_id)
+
+    def reclaim_expired(self):
+        # Running jobs whose lease ran out go back to the queue, or fail once out of attempts;
+        # -> ids queued again
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        requeued = []
+        with self._session_factory() as db:
+            rows = db.query(self._model.id, self._model.attempts).filter(
+                self._model.status == 'running', self._model.updated_at < cutoff).all()
+            for job_id, attempts in rows:
+                # conditional on the lease still being expired, so only one process handles it
+                if (attempts or 0) >= self.max_attempts:
+                    fields = {'status': 'failed', 'updated_at': datetime.utcnow(),
+                              'error': f"Worker stopped responding ({attempts} attempts)"}
+                else:
+                    fields = {'status': 'queued', 'updated_at': datetime.utcnow()}
+                changed = db.query(self._model).filter(
+                    self._model.id == job_id, self._model.status == 'running', self._model.updated_at < cutoff
+                ).update(fields, synchronize_session=False)
+                if changed and fields['status'] == 'queued':
+                    requeued.append(job_id)
+                elif changed:
+                    print(f"Job {job_id} failed: {fields['error']}")
+            db.commit()
+        return requeued
+
+    def pending_ids(self, limit=100):
+        with self._session_factory() as db:
+            rows = db.query(self._model.id).filter(self._model.status == 'queued') \
+                .order_by(self._model.created_at).limit(limit).all()
+            return [r[0] for r in rows]
+
+    def resume_pending(self):
+        # Hand jobs left queued (or abandoned mid-run) by a previous process to this process's
+        # pool, and keep checking for expired leases while it runs
+        if not self._executor:
+            return 0
+        self.reclaim_expired()
+        ids = self.pending_ids()
+        for job_id in ids:
+            self._executor.submit(self._run, job_id)
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_forever, name='jobs-reaper', daemon=True)
+            self._reaper.start()
+        return len(ids)
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.lease_seconds / 2)
+            try:
+                for job_id in self.reclaim_expired():
+                    self._executor.submit(self._run, job_id)
+            except Exception as e:
+                print(f"Job lease check failed: {e}")
+
+    def run_forever(self, poll_interval=1.0, max_backoff=30.0):
+        # Standalone worker loop: claim queued jobs one at a time, scaling with process count.
+        # A failed poll (the database restarting, a lost connection) is logged and retried
+        # with exponential backoff; the loop itself never exits.
+        failures = 0
+        while True:
+            try:
+                ran = self._poll_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(max_backoff, poll_interval * 2 ** failures)
+                print(f"Job worker poll failed ({failures} in a row), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+            if not ran:
+                time.sleep(poll_interval)
+
+    def _poll_once(self):
+        ran = False
+        self.reclaim_expired()
+        for job_id in self.pending_ids(limit=10):
+            if self._claim(job_id):
+                self._run_claimed(job_id)
+                ran = True
+        return ran
+
+    def _heartbeat(self, job_id, attempt, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            if not self._update(job_id, attempt=attempt):
+                return
+
+    def _run_claimed(self, job_id):
+        job = self.get(job_id)
+        attempt = job['attempts']
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, attempt, stop), daemon=True).start()
+        try:
+            result = self._handler(job, lambda stage: self._update(job_id, attempt=attempt, stage=stage))
+            self._update(job_id, attempt=attempt, status='done', result=json.dumps(result, ensure_ascii=False))
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._update(job_id, attempt=attempt, status='failed', error=str(e))
+        finally:
+            stop.set()
@@ -0,0 +1,202 @@
+# lexical_retrieval.py
+# Local retrieval for resume chat that needs no query embedding.
+#
+# Each user gets an in-memory BM25 index over the chunks in their vector store, built
+# from the store's own documents (a local read, no API call) and extended as new chunks
+# are ingested. An index also records the version of the user's data it was built from;
+# VersionedIndexes rebuilds it once that moves, e.g. after an ingest by another process.
+# HybridRetriever picks, per call, between
+#
+#   vector   - the store's similarity search (one embedding call per query)
+#   lexical  - BM25 only; falls back to vector search when no query term occurs at all
+#   hybrid   - BM25 and vector rankings merged by reciprocal rank fusion
+#
+# Resume stores are small: when a store holds no more chunks than a query returns,
+# lexical and hybrid hand back every chunk without searching.
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+RETRIEVAL_MODES = ('vector', 'lexical', 'hybrid')
+
+# keeps skills such as c++, c#, node.js and ci/cd whole
+_TERM = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[./][a-z0-9+#]+)*")
+_STOPWORDS = frozenset(
+    'a about an and any are as at be but by can could describe do does explain for from give has have how i '
+    'if in into is it its know me my of on or our please should show so tell than that the their them then '
+    'there these this to was we what when where which who why will with would you your'.split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TERM.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _matches(metadata, where):
+    return not where or all(metadata.get(field) == value for field, value in where.items())
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75, version=None):
+        self.k1 = k1
+        self.b = b
+        self.version = version
+        self._docs = []                     # (id, text, metadata)
+        self._ids = set()
+        self._lengths = []
+        self._postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, ids, texts, metadatas=None):
+        metadatas = metadatas or [None] * len(texts)
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._ids or not text:
+                    continue
+                index = len(self._docs)
+                terms = Counter(tokenize(text))
+                for term, tf in terms.items():
+                    self._postings[term].append((index, tf))
+                length = sum(terms.values())
+                self._docs.append((doc_id, text, metadata or {}))
+                self._ids.add(doc_id)
+                self._lengths.append(length)
+                self._total_length += length
+
+    def search(self, query, k=4, where=None):
+        # -> [(score, id, text, metadata)], best first; only documents sharing a term with the query
+        # and, given where={field: value}, whose metadata matches it
+        with self._lock:
+            n = len(self._docs)
+            if not n:
+                return []
+            avg_length = self._total_length / n or 1.0
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for index, tf in postings:
+                    if where and not _matches(self._docs[index][2], where):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[index] / avg_length)
+                    scores[index] += idf * tf * (self.k1 + 1) / (tf + norm)
+            best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            return [(score,) + self._docs[index] for index, score in best]
+
+    def documents(self, where=None):
+        with self._lock:
+            return [doc for doc in self._docs if _matches(doc[2], where)]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    # rankings: lists of keys, best first -> keys ordered by summed 1 / (k + rank)
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda key: -scores[key])
+
+
+def index_from_store(store, version=None):
+    # Chroma keeps every chunk's text next to its vector; reading them back embeds nothing.
+    # version is read before the store, so a write racing the read only triggers a rebuild
+    data = store.get(include=['documents', 'metadatas'])
+    index = BM25Index(version=version)
+    index.add(data['ids'], data['documents'], data.get('metadatas'))
+    return index
+
+
+class VersionedIndexes:
+    # pool: VectorStorePool of BM25 indexes; version(user_id) -> the current version of the
+    # user's data. A pooled index built from an older version is dropped and rebuilt.
+    def __init__(self, pool, version):
+        self.pool = pool
+        self.version = version
+        self.rebuilds = 0
+
+    def get(self, user_id):
+        current = self.version(user_id)
+        index = self.pool.get(user_id)
+        if index.version != current:
+            self.pool.invalidate(user_id)
+            self.rebuilds += 1
+            index = self.pool.get(user_id)
+        return index
+
+    def invalidate(self, user_id):
+        self.pool.invalidate(user_id)
+
+    def stats(self):
+        return dict(self.pool.stats(), rebuilds=self.rebuilds)
+
+
+class HybridRetriever:
+    def __init__(self, indexes, k=4, rrf_k=60):
+        # indexes: pool with get(user_id) -> BM25Index for that user's store
+        self.indexes = indexes
+        self.k = k
+        self.rrf_k = rrf_k
+        self._lock = threading.Lock()
+        self._stats = {'vector': 0, 'lexical': 0, 'hybrid': 0, 'small_store': 0, 'lexical_fallbacks': 0,
+                       'embedding_calls': 0}
+
+    def _count(self, *fields):
+        with self._lock:
+            for field in fields:
+                self._stats[field] += 1
+
+    def _vector_search(self, store, query, k, where=None):
+        self._count('embedding_calls')
+        if where:
+            return store.similarity_search(query, k=k, filter=where)
+        return store.similarity_search(query, k=k)
+
+    def retrieve(self, user_id, store, query, mode='lexical', where=None):
+        # where={'section': 'skills'} limits every mode to chunks with that metadata
+        from langchain_core.documents import Document
+
+        if mode == 'vector':
+            self._count('vector')
+            return self._vector_search(store, query, self.k, where)
+
+        index = self.indexes.get(user_id)
+        chunks = index.documents(where) if where or len(index) <= self.k else None
+        if chunks is not None and len(chunks) <= self.k:
+            # every chunk fits the prompt; there is nothing to rank
+            self._count(mode, 'small_store')
+            return [Document(page_content=text, metadata=metadata) for _, text, metadata in chunks]
+
+        if mode == 'lexical':
+            hits = index.search(query, self.k, where)
+            if not hits:
+                self._count('lexical', 'lexical_fallbacks')
+                return self._vector_search(store, query, self.k, where)
+            self._count('lexical')
+            return [Document(page_content=text, metadata=metadata) for _, _, text, metadata in hits]
+
+        self._count('hybrid')
+        candidates = self.k * 2
+        lexical = index.search(query, candidates, where)
+        vector = self._vector_search(store, query, candidates, where)
+        # chunks are matched across the two rankings by their text
+        by_text = {doc.page_content: doc for doc in vector}
+        for _, _, text, metadata in lexical:
+            by_text.setdefault(text, Document(page_content=text, metadata=metadata))
+        fused = reciprocal_rank_fusion([[text for _, _, text, _ in lexical], [doc.page_content for doc in vector]],
+                                       k=self.rrf_k)
+        return [by_text[text] for text in fused[:self.k]]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats['vector'] + stats['lexical'] + stats['hybrid']
+        stats['embedding_calls_avoided'] = calls - stats['embedding_calls']
+        return stats
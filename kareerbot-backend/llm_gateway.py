@@ -0,0 +1,451 @@
+# llm_gateway.py
+# Outbound gateway for model calls: every Gemini generation and embedding request goes
+# through one of these before leaving the process.
+#
+#   - a global cap and a per-user cap on concurrent calls (the user comes from the
+#     `current_user` context variable, set per request)
+#   - a token-bucket rate limit on call starts
+#   - single-flight coalescing: identical calls already in flight share one result
+#   - retries with exponential backoff and jitter on rate-limit / transient errors
+#
+# Sync and async callers share the same limits: waiting threads block on an Event,
+# waiting coroutines await a future, so the ASGI app never parks a thread in the queue.
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+
+current_user = contextvars.ContextVar('llm_user', default=None)
+
+RETRYABLE_ERRORS = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'DeadlineExceeded',
+                    'InternalServerError', 'TimeoutError', 'ReadTimeout', 'ConnectTimeout', 'ConnectionError'}
+
+
+def is_retryable(error):
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    return code in (429, 500, 502, 503, 504)
+
+
+class _ThreadWaiter:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+
+
+class _AsyncWaiter:
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self.future = self._loop.create_future()
+
+    def wake(self):
+        self._loop.call_soon_threadsafe(self._set)
+
+    def _set(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _Slots:
+    # Counting semaphore that hands a released slot straight to the oldest waiter,
+    # whether that waiter is a thread or a coroutine
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, waiter):
+        # True: slot taken now. False: waiter queued and will be woken holding the slot.
+        with self._lock:
+            if self.in_use < self.limit:
+                self.in_use += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def cancel(self, waiter):
+        # True if the waiter was still queued; False means it was already handed a slot
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+            else:
+                self.in_use -= 1
+                return
+        waiter.wake()
+
+    def waiting(self):
+        return len(self._waiters)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token now or in the future; returns how long to wait before using it
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class LLMGateway:
+    def __init__(self, name, max_concurrency=16, per_user_concurrency=4, rate_per_sec=0.0, burst=None,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.name = name
+        self.per_user_concurrency = per_user_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._global = _Slots(max_concurrency)
+        self._users = {}  # user_id -> [_Slots, callers holding or waiting], dropped when idle
+        self._bucket = TokenBucket(rate_per_sec, burst if burst is not None else max(1.0, rate_per_sec))
+        self._inflight = {}  # coalescing key -> Future
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=1000)
+        self._stats = {'calls': 0, 'acquired': 0, 'coalesced': 0, 'retries': 0, 'failures': 0, 'throttled': 0,
+                       'wait_total_s': 0.0, 'wait_max_s': 0.0}
+
+    # --- slots -----------------------------------------------------------------------
+
+    def _user_slots(self, user_id):
+        if not user_id or not self.per_user_concurrency:
+            return None
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = self._users[user_id] = [_Slots(self.per_user_concurrency), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _forget_user(self, user_id):
+        with self._lock:
+            entry = self._users[user_id]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._users[user_id]
+
+    def _release(self, user_slots, user_id):
+        self._global.release()
+        if user_slots is not None:
+            user_slots.release()
+            self._forget_user(user_id)
+
+    def _acquire(self):
+        # Per-user slot first, then the global one, always in that order
+        user_id = current_user.get()
+        user_slots = self._user_slots(user_id)
+        start = time.monotonic()
+        for slots in filter(None, (user_slots, self._global)):
+            waiter = _ThreadWaiter()
+            if not slots.try_acquire(waiter):
+                waiter.wait()
+        delay = self._bucket.reserve()
+        if delay:
+            self._count('throttled')
+            time.sleep(delay)
+        self._record_wait(time.monotonic() - start)
+        return user_slots, user_id
+
+    async def _aacquire(self):
+        user_id = current_user.get()
+        user_slots = self._user_slots(user_id)
+        start = time.monotonic()
+        held = []
+        try:
+            for slots in filter(None, (user_slots, self._global)):
+                waiter = _AsyncWaiter()
+                if not slots.try_acquire(waiter):
+                    try:
+                        await waiter.future
+                    except asyncio.CancelledError:
+                        if not slots.cancel(waiter):
+                            slots.release()
+                        raise
+                held.append(slots)
+            delay = self._bucket.reserve()
+            if delay:
+                self._count('throttled')
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            for slots in held:
+                slots.release()
+            if user_slots is not None:
+                self._forget_user(user_id)
+            raise
+        self._record_wait(time.monotonic() - start)
+        return user_slots, user_id
+
+    # --- calls -----------------------------------------------------------------------
+
+    def _backoff(self, attempt):
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def _should_retry(self, error, attempt):
+        if attempt >= self.max_retries or not is_retryable(error):
+            self._count('failures')
+            return False
+        self._count('retries')
+        return True
+
+    def _run(self, fn):
+        attempt = 0
+        while True:
+            user_slots, user_id = self._acquire()
+            try:
+                self._count('calls')
+                return fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self._release(user_slots, user_id)
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def _arun(self, afn):
+        attempt = 0
+        while True:
+            user_slots, user_id = await self._aacquire()
+            try:
+                self._count('calls')
+                return await afn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self._release(user_slots, user_id)
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _join(self, key):
+        # -> (future, leader): the leader runs the call, everyone else waits on its future
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def call(self, fn, key=None):
+        if key is None:
+            return self._run(fn)
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = self._run(fn)
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def acall(self, afn, key=None):
+        if key is None:
+            return await self._arun(afn)
+        future, leader = self._join(key)
+        if not leader:
+            # shielded: a follower that is cancelled must not cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await self._arun(afn)
+        except BaseException as e:
+            self._finish(key, future, error=e if isinstance(e, Exception) else RuntimeError('leader cancelled'))
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stream_slot(self):
+        # Held for the whole of a streamed response; streams are never coalesced or retried
+        return _StreamSlot(self)
+
+    # --- metrics ---------------------------------------------------------------------
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self._waits.append(seconds)
+            self._stats['acquired'] += 1
+            self._stats['wait_total_s'] += seconds
+            self._stats['wait_max_s'] = max(self._stats['wait_max_s'], seconds)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._waits)
+            user_waiting = sum(slots.waiting() for slots, _ in self._users.values())
+        wait_total = stats.pop('wait_total_s')
+        stats.update({
+            'in_flight': self._global.in_use,
+            'max_concurrency': self._global.limit,
+            'queue_depth': self._global.waiting() + user_waiting,
+            'active_users': len(self._users),
+            'wait_p50_ms': waits[len(waits) // 2] * 1000 if waits else 0.0,
+            'wait_p95_ms': waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            'wait_max_ms': stats.pop('wait_max_s') * 1000,
+            'wait_avg_ms': wait_total / stats['acquired'] * 1000 if stats['acquired'] else 0.0,
+        })
+        return stats
+
+
+class _StreamSlot:
+    def __init__(self, gateway):
+        self._gateway = gateway
+        self._held = None
+
+    def __enter__(self):
+        self._held = self._gateway._acquire()
+        self._gateway._count('calls')
+        return self
+
+    def __exit__(self, *exc):
+        self._gateway._release(*self._held)
+
+    async def __aenter__(self):
+        self._held = await self._gateway._aacquire()
+        self._gateway._count('calls')
+        return self
+
+    async def __aexit__(self, *exc):
+        self._gateway._release(*self._held)
+
+
+def call_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _messages_key(messages, stop, kwargs):
+    return call_key([(m.type, m.content) for m in messages], stop, kwargs)
+
+
+@lru_cache(maxsize=None)
+def _gateway_classes():
+    # LangChain wrappers, defined on first use so importing this module stays cheap
+    from typing import Any
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    class GatewayChatModel(BaseChatModel):
+        inner: Any
+        gateway: Any
+
+        @property
+        def _llm_type(self):
+            return f"gateway-{self.inner._llm_type}"
+
+        def bind_tools(self, tools, **kwargs):
+            # let the wrapped model format the tools, then bind them to the gated wrapper
+            bound = self.inner.bind_tools(tools, **kwargs)
+            if bound is self.inner:
+                return self
+            return self.bind(**bound.kwargs)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            return self.gateway.call(
+                lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                key=_messages_key(messages, stop, kwargs),
+            )
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            return await self.gateway.acall(
+                lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                key=_messages_key(messages, stop, kwargs),
+            )
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            with self.gateway.stream_slot():
+                yield from self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            async with self.gateway.stream_slot():
+                async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    yield chunk
+
+    class GatewayEmbeddings(Embeddings):
+        def __init__(self, inner, gateway):
+            self.inner = inner
+            self.gateway = gateway
+
+        def embed_documents(self, texts):
+            return self.gateway.call(lambda: self.inner.embed_documents(texts), key=call_key('documents', texts))
+
+        def embed_query(self, text):
+            return self.gateway.call(lambda: self.inner.embed_query(text), key=call_key('query', text))
+
+        async def aembed_documents(self, texts):
+            return await self.gateway.acall(lambda: self.inner.aembed_documents(texts), key=call_key('documents', texts))
+
+        async def aembed_query(self, text):
+            return await self.gateway.acall(lambda: self.inner.aembed_query(text), key=call_key('query', text))
+
+    return GatewayChatModel, GatewayEmbeddings
+
+
+def gated_chat_model(model, gateway, callbacks=None):
+    return _gateway_classes()[0](inner=model, gateway=gateway, callbacks=callbacks or None)
+
+
+def gated_embeddings(embeddings, gateway):
+    return _gateway_classes()[1](embeddings, gateway)
+
+
+def gateway_from_env(name, prefix, environ):
+    # e.g. LLM_MAX_CONCURRENCY, LLM_USER_CONCURRENCY, LLM_RATE_PER_SEC, LLM_BURST, LLM_MAX_RETRIES
+    def number(key, default):
+        return float(environ.get(f'{prefix}_{key}', default))
+    burst = environ.get(f'{prefix}_BURST')
+    return LLMGateway(
+        name,
+        max_concurrency=int(number('MAX_CONCURRENCY', 16)),
+        per_user_concurrency=int(number('USER_CONCURRENCY', 4)),
+        rate_per_sec=number('RATE_PER_SEC', 0),
+        burst=float(burst) if burst else None,
+        max_retries=int(number('MAX_RETRIES', 3)),
+        backoff_base=number('BACKOFF_BASE', 0.5),
+        backoff_max=number('BACKOFF_MAX', 8),
+    )
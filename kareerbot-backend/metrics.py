@@ -0,0 +1,275 @@
+# metrics.py
+# In-process metrics for the hot paths: request latency per route, per-stage timers
+# (parse, chunk, embed, persist, Chroma open, LLM call, JSON extraction), counters and
+# LLM token counts, rendered in the Prometheus text format for /metrics.
+#
+# The route travels in the `current_route` context variable, so a stage timer deep in a
+# helper is charged to the endpoint that called it (background LLM threads copy the
+# context, see submit_llm). With METRICS_ENABLED=0 stage() hands back one shared no-op
+# context manager and observe()/inc() return at once, so instrumented code costs a
+# function call and an attribute check.
+
+import asyncio
+import bisect
+import contextvars
+import fnmatch
+import functools
+import math
+import re
+import threading
+import time
+from functools import lru_cache
+
+current_route = contextvars.ContextVar('metrics_route', default='-')
+
+# seconds; LLM calls can take tens of seconds, hence the long tail
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)  # one per bucket plus +Inf, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+
+class _StageTimer:
+    __slots__ = ('_metrics', '_stage', '_route', '_start')
+
+    def __init__(self, metrics, stage, route):
+        self._metrics = metrics
+        self._stage = stage
+        self._route = route
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        route = self._route or current_route.get()
+        self._metrics.observe('stage_seconds', time.perf_counter() - self._start, route=route, stage=self._stage)
+        if exc_type is not None:
+            self._metrics.inc('stage_errors_total', route=route, stage=self._stage)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=True, namespace='kareerbot', buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}  # (name, sorted label items) -> _Histogram
+        self._counters = {}    # (name, sorted label items) -> float
+        self._help = {}
+        self._collectors = []  # (prefix, stats function), read at scrape time
+        self._lock = threading.Lock()
+
+    # --- recording ---------------------------------------------------------------------
+
+    def stage(self, stage, route=None):
+        if not self.enabled:
+            return _NOOP
+        return _StageTimer(self, stage, route)
+
+    def timed(self, stage):
+        # Decorator form of stage(); the enabled check happens per call
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _StageTimer(self, stage, None):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_usage(self, usage, route=None):
+        # usage is LangChain's usage_metadata: input_tokens / output_tokens / total_tokens
+        route = route or current_route.get()
+        for kind in ('input', 'output'):
+            count = usage.get(f'{kind}_tokens')
+            if count:
+                self.inc('llm_tokens_total', count, route=route, kind=kind)
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def register_stats(self, prefix, stats, counters=()):
+        # Expose an existing stats() dict as gauges, e.g. register_stats('vector_pool', pool.stats).
+        # counters names the keys that only ever grow (hits, retries, ...; fnmatch patterns
+        # such as '*_hits' allowed, matched at any depth): those are exported as counters
+        # named <name>_total, so rate() and increase() handle process restarts
+        self._collectors.append((prefix, stats, tuple(counters)))
+
+    def llm_callbacks(self):
+        # Callback handlers to attach to a chat model: call latency and token usage per route
+        if not self.enabled:
+            return []
+        return [_usage_handler_class()(self)]
+
+    # --- exposition --------------------------------------------------------------------
+
+    def _name(self, name):
+        return f"{self.namespace}_{name}"
+
+    def render(self):
+        with self._lock:
+            histograms = sorted((k, (list(h.counts), h.sum, h.count)) for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {self._name(name)} {self._help[name]}")
+                lines.append(f"# TYPE {self._name(name)} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, 'counter')
+            lines.append(f"{self._name(name)}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{self._name(name)}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self._name(name)}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self._name(name)}_count{_labels(labels)} {count}")
+
+        for prefix, stats, counter_keys in self._collectors:
+            try:
+                values = stats() or {}
+            except Exception as e:
+                print(f"Warning: metrics collector {prefix} failed: {e}")
+                continue
+            for name, key, value in _flatten(prefix, values):
+                if any(fnmatch.fnmatchcase(key, pattern) for pattern in counter_keys):
+                    name = f"{name}_total"
+                    declare(name, 'counter')
+                else:
+                    declare(name, 'gauge')
+                lines.append(f"{self._name(name)} {_number(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def percentile(sorted_values, pct):
+    # nearest-rank percentile of an already sorted list; shared by the benchmark scripts
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _labels(items):
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_INVALID_NAME = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _flatten(prefix, stats):
+    # Numeric leaves of a nested stats dict as (prefix_key_subkey, leaf key, value)
+    for key, value in stats.items():
+        name = _INVALID_NAME.sub('_', f"{prefix}_{key}")
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, bool):
+            yield name, key, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, key, value
+
+
+@lru_cache(maxsize=None)
+def _usage_handler_class():
+    # Defined on first use so importing this module does not import LangChain
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.outputs import LLMResult
+
+    class LLMUsageHandler(BaseCallbackHandler):
+        # inline, so the handler sees the caller's context (and route) in async runs too
+        run_inline = True
+
+        def __init__(self, metrics):
+            self.metrics = metrics
+            self._starts = {}  # run_id -> (start, route)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = (time.perf_counter(), current_route.get())
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start, route = self._starts.pop(run_id, (None, current_route.get()))
+            if start is not None:
+                self.metrics.observe('llm_call_seconds', time.perf_counter() - start, route=route)
+            # a coalesced call reports the shared response's usage to every caller
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                    if usage:
+                        self.metrics.record_usage(usage, route=route)
+
+        def on_llm_error(self, error, *, run_id, response=None, **kwargs):
+            if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+                # The caller closed a stream early (the plan endpoints stop at the first
+                # complete JSON) or its request was cancelled: not a model failure. Usage is
+                # recorded when the chunks received so far carry it; Gemini only sends it last.
+                self.metrics.inc('llm_streams_stopped_total', route=self._starts.get(run_id, (None, current_route.get()))[1])
+                self.on_llm_end(response or LLMResult(generations=[]), run_id=run_id)
+                return
+            _, route = self._starts.pop(run_id, (None, current_route.get()))
+            self.metrics.inc('llm_errors_total', route=route)
+
+    return LLMUsageHandler
+
+
+def metrics_from_env(environ):
+    enabled = environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off')
+    return Metrics(enabled=enabled)
@@ -0,0 +1,93 @@
+# migrate_vectors.py
+# Merges the per-user Chroma directories (chroma_db/<user_id>) into the shared, sharded
+# collections used by VECTOR_BACKEND=shared (see vector_backends.py).
+#
+# Stored vectors are copied as they are, so nothing is re-embedded and no API key is
+# needed. Chunk ids are prefixed with the user id and written with upsert, so an
+# interrupted run can simply be repeated. Source directories are kept unless
+# --delete-source is given, and then only once the user's chunk count in the shard
+# matches. Stop the app first: Chroma does not expect two processes writing one store.
+#
+#   python migrate_vectors.py --dry-run
+#   python migrate_vectors.py --shards 32
+#   python migrate_vectors.py --users alice,bob --delete-source
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+from vector_backends import USER_FIELD, PerUserChromaBackend, SharedChromaBackend
+
+BATCH_SIZE = 1000  # under Chroma's max batch for one upsert
+
+
+def migrate_user(source_dir, user_id, target, delete_source=False, dry_run=False):
+    # -> number of chunks copied
+    from langchain_community.vectorstores import Chroma
+
+    data = Chroma(persist_directory=source_dir).get(include=['documents', 'metadatas', 'embeddings'])
+    count = len(data['ids'])
+    if dry_run or not count:
+        return count
+
+    collection = target.shard_store(target.shard_for(user_id))._collection
+    for start in range(0, count, BATCH_SIZE):
+        end = start + BATCH_SIZE
+        collection.upsert(
+            ids=[f"{user_id}:{chunk_id}" for chunk_id in data['ids'][start:end]],
+            embeddings=data['embeddings'][start:end],
+            documents=data['documents'][start:end],
+            metadatas=[{**(m or {}), USER_FIELD: user_id} for m in data['metadatas'][start:end]],
+        )
+
+    if delete_source:
+        copied = collection.get(where={USER_FIELD: user_id}, include=[])
+        if len(copied['ids']) < count:
+            raise RuntimeError(f"shard holds {len(copied['ids'])} of {count} chunks, keeping {source_dir}")
+        shutil.rmtree(source_dir)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge per-user Chroma directories into the shared backend')
+    parser.add_argument('--root', default='./chroma_db', help='Chroma root holding the per-user directories')
+    parser.add_argument('--shards', type=int, default=int(os.getenv('VECTOR_SHARDS', '16')),
+                        help='shard count for a new shared layout (an existing layout keeps its own)')
+    parser.add_argument('--users', help='comma-separated user ids; default every per-user directory')
+    parser.add_argument('--delete-source', action='store_true', help='remove each directory once it is copied')
+    parser.add_argument('--dry-run', action='store_true', help='only count the chunks that would be copied')
+    args = parser.parse_args(argv)
+
+    source = PerUserChromaBackend(args.root, embedding_function=None)
+    target = SharedChromaBackend(args.root, embedding_function=None, shards=args.shards)
+    users = [u.strip() for u in args.users.split(',') if u.strip()] if args.users else source.users()
+    print(f"{len(users)} user directories -> {target.root} ({target.shards} shards)"
+          + (' [dry run]' if args.dry_run else ''))
+
+    start = time.perf_counter()
+    total = failed = 0
+    for user_id in users:
+        source_dir = os.path.join(args.root, user_id)
+        if not source.exists(user_id):
+            print(f"  {user_id}: no directory, skipped")
+            continue
+        try:
+            count = migrate_user(source_dir, user_id, target, delete_source=args.delete_source, dry_run=args.dry_run)
+        except Exception as e:
+            failed += 1
+            print(f"  {user_id}: failed: {e}")
+            continue
+        total += count
+        print(f"  {user_id}: {count} chunks -> shard {target.shard_for(user_id)}")
+
+    print(f"{total} chunks from {len(users) - failed} users in {time.perf_counter() - start:.1f}s"
+          + (f", {failed} failed" if failed else ''))
+    if not args.dry_run and not failed:
+        print("Set VECTOR_BACKEND=shared (or leave it on auto) and restart the app.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
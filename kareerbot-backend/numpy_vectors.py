@@ -0,0 +1,299 @@
+# numpy_vectors.py
+# Exact-search vector store for small per-user corpora (VECTOR_BACKEND=numpy).
+#
+# A resume is a handful of chunks, so an approximate index buys nothing. Each user's
+# embeddings are one contiguous float32 array in vectors.npy, normalised at write time and
+# memory-mapped on open; chunk ids, text and metadata sit beside it in chunks.jsonl. A
+# query is a single matrix-vector product (cosine similarity, since every row is unit
+# length) followed by a partial sort for the top k.
+#
+# Writes rewrite both files, which is cheap at resume sizes, as a new generation
+# (vectors.<n>.npy, chunks.<n>.jsonl) and then switch the CURRENT pointer file to it. A file
+# that is memory-mapped is never replaced or truncated, which Windows refuses, and readers
+# holding the old arrays keep a consistent snapshot. Older generations are deleted once
+# nothing maps them any more. Search cost grows linearly with the chunk count; see
+# vector_benchmark.py for where Chroma starts to win.
+#
+# Several handles, in one process or several (web workers, ingest_worker.py), may share a
+# directory: a write holds the directory's LOCK file, reloads the CURRENT generation and
+# applies its change to that, so no writer drops rows another one added. Reads switch to a
+# newer generation when CURRENT has moved.
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'LOCK'
+VECTORS_FILE = 'vectors.npy'  # generation 0: stores written before generations existed
+CHUNKS_FILE = 'chunks.jsonl'
+_GENERATION_FILE = re.compile(r'^(?:vectors(?:\.(\d+))?\.npy|chunks(?:\.(\d+))?\.jsonl)$')
+
+
+def _files(generation):
+    if not generation:
+        return VECTORS_FILE, CHUNKS_FILE
+    return f'vectors.{generation}.npy', f'chunks.{generation}.jsonl'
+
+
+def _current_generation(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+@contextlib.contextmanager
+def _directory_lock(directory):
+    # exclusive across processes; held only around a write
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10s; keep waiting like flock does
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def store_exists(directory):
+    return os.path.exists(os.path.join(directory, CURRENT_FILE)) or \
+        os.path.exists(os.path.join(directory, VECTORS_FILE))
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _matches(metadata, where):
+    # the Chroma where subset the app uses: {field: value} and {'$and': [...]}
+    if not where:
+        return True
+    if '$and' in where:
+        return all(_matches(metadata, clause) for clause in where['$and'])
+    return all(metadata.get(field) == value for field, value in where.items())
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, directory, embedding_function=None):
+        self.directory = directory
+        self._embedding = embedding_function
+        self._lock = threading.Lock()
+        self._vectors = None  # (n, dim) float32 memmap, or None while empty
+        self._rows = []       # {'id', 'text', 'metadata'} per vector row
+        self._generation = None  # not loaded yet; _refresh() loads whatever CURRENT names
+        self._refresh()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        generation = _current_generation(self.directory)
+        vectors_file, chunks_file = _files(generation)
+        # generation 0 may have no files (an empty store); a generation CURRENT names always
+        # has both, so a missing one was removed under us and raises FileNotFoundError before
+        # any state changes
+        required = bool(generation)
+        vectors = None
+        if required or os.path.exists(self._path(vectors_file)):
+            vectors = np.load(self._path(vectors_file), mmap_mode='r')
+        rows = []
+        if required or os.path.exists(self._path(chunks_file)):
+            with open(self._path(chunks_file), 'r', encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        # generation 0 wrote vectors first, so a crash between its two writes left extra vectors
+        n = min(len(rows), len(vectors) if vectors is not None else 0)
+        self._rows = rows[:n]
+        self._vectors = vectors[:n] if n else None
+        self._generation = generation
+
+    def _refresh(self):
+        # caller holds self._lock (or is __init__); picks up a generation written through
+        # another handle. Writers call it under the directory lock, where no generation can
+        # disappear.
+        for attempt in range(3):
+            if _current_generation(self.directory) == self._generation:
+                return
+            try:
+                self._load()
+                return
+            except FileNotFoundError:
+                # that generation was superseded and removed while we opened it
+                if attempt == 2:
+                    raise
+
+    def _write(self, vectors, rows):
+        # our own mapping of the old generation goes first, so it can be deleted below
+        self._vectors = None
+        if not rows:
+            if os.path.exists(self._path(CURRENT_FILE)):
+                os.remove(self._path(CURRENT_FILE))
+            self._rows, self._generation = [], 0
+            self._remove_stale(keep=None)
+            return
+        # callers hold the directory lock and have just reloaded, so this is the newest
+        generation = self._generation + 1
+        vectors_file, chunks_file = _files(generation)
+        with open(self._path(vectors_file), 'wb') as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(self._path(chunks_file), 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        # both files are complete before the pointer moves; CURRENT itself is never mapped
+        tmp = self._path(CURRENT_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(str(generation))
+        os.replace(tmp, self._path(CURRENT_FILE))
+        self._vectors = np.load(self._path(vectors_file), mmap_mode='r')
+        self._rows = rows
+        self._generation = generation
+        self._remove_stale(keep=generation)
+
+    def _remove_stale(self, keep):
+        # Files still mapped by a reader cannot be deleted on Windows; the next write retries
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            match = _GENERATION_FILE.match(name)
+            if match is None or int(match.group(1) or match.group(2) or 0) == keep:
+                continue
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        # embed before taking the lock; only the file swap is serialised
+        vectors = _normalize(np.asarray(self._embedding.embed_documents(texts), dtype=np.float32))
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [None] * len(texts)
+        with self._lock, _directory_lock(self.directory):
+            self._refresh()
+            if self._vectors is not None:
+                if self._vectors.shape[1] != vectors.shape[1]:
+                    raise ValueError(f"embedding size {vectors.shape[1]} does not match the stored "
+                                     f"{self._vectors.shape[1]} in {self.directory}")
+                vectors = np.concatenate([self._vectors, vectors])
+            rows = self._rows + [{'id': doc_id, 'text': text, 'metadata': metadata or {}}
+                                 for doc_id, text, metadata in zip(ids, texts, metadatas)]
+            self._write(vectors, rows)
+        return ids
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        with self._lock:
+            self._refresh()
+            vectors, rows = self._vectors, self._rows
+        if vectors is None or k <= 0:
+            return []
+        if filter:
+            selected = np.array([i for i, row in enumerate(rows) if _matches(row['metadata'], filter)], dtype=np.intp)
+            if not len(selected):
+                return []
+            scores = vectors[selected] @ _normalize(np.asarray(embedding, dtype=np.float32))
+        else:
+            selected = None
+            scores = vectors @ _normalize(np.asarray(embedding, dtype=np.float32))
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        else:
+            top = np.argsort(-scores)
+        results = []
+        for i in top:
+            row = rows[selected[i] if selected is not None else i]
+            results.append((Document(page_content=row['text'], metadata=dict(row['metadata'])), float(scores[i])))
+        return results
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        # scores are cosine similarities, higher is closer (Chroma returns distances)
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None, **kwargs):
+        # same shape as Chroma's get(), so index_from_store() and the migration tool can read it
+        include = ['documents', 'metadatas'] if include is None else include
+        with self._lock:
+            self._refresh()
+            vectors, rows = self._vectors, self._rows
+        wanted = set(ids) if ids else None
+        picked = [i for i, row in enumerate(rows)
+                  if (wanted is None or row['id'] in wanted) and _matches(row['metadata'], where)]
+        picked = picked[offset or 0:][:limit] if limit else picked[offset or 0:]
+        result = {'ids': [rows[i]['id'] for i in picked]}
+        if 'documents' in include:
+            result['documents'] = [rows[i]['text'] for i in picked]
+        if 'metadatas' in include:
+            result['metadatas'] = [dict(rows[i]['metadata']) for i in picked]
+        if 'embeddings' in include:
+            result['embeddings'] = np.array(vectors[picked]) if picked else np.empty((0, 0), dtype=np.float32)
+        return result
+
+    def delete(self, ids=None, **kwargs):
+        # no ids removes everything
+        with self._lock, _directory_lock(self.directory):
+            self._refresh()
+            if ids is None:
+                keep = []
+            else:
+                drop = set(ids)
+                keep = [i for i, row in enumerate(self._rows) if row['id'] not in drop]
+            if len(keep) == len(self._rows):
+                return
+            vectors = self._vectors[keep] if keep else None
+            self._write(vectors, [self._rows[i] for i in keep])
+
+    def persist(self):
+        # every write is already on disk; kept so callers can treat all backends alike
+        pass
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=None, **kwargs):
+        if directory is None:
+            raise ValueError("NumpyVectorStore needs a directory")
+        store = cls(directory, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
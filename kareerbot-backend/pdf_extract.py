@@ -0,0 +1,220 @@
+# pdf_extract.py
+# PDF text extraction engine: linear-time page joins, page-parallel extraction for
+# large documents, page/size caps, a per-document timeout and a cache by file hash.
+# pypdf is imported on first use so it stays off the app's startup path.
+#
+# A document is either bytes or the path of a stored upload. Paths are memory-mapped, by
+# this process and by each worker, so a parallel extraction hands workers a file name
+# rather than pickling the whole document to every one of them.
+#
+# With a timeout set, all pypdf work happens in the worker processes, small documents
+# included, and opening the document and counting its pages runs under the same deadline
+# as the page text: a malformed PDF can stall the parser before the first page. A call
+# that is already running cannot be cancelled, so when the deadline passes the pool's
+# processes are killed and a fresh pool replaces it.
+
+import hashlib
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PdfExtractionError(Exception):
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+def _open_source(source):
+    # -> (stream, mapping to close or None)
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source), None
+    with open(source, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, mapped
+
+
+def _worker_source(data):
+    # bytes go to the workers as they are; a path must not depend on this process's cwd
+    return data if isinstance(data, (bytes, bytearray)) else os.path.abspath(data)
+
+
+def _extract_range(source, start, stop):
+    # Runs in a worker process; each worker opens its own reader over the same bytes or file
+    import pypdf
+    stream, mapped = _open_source(source)
+    try:
+        reader = pypdf.PdfReader(stream)
+        return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+    finally:
+        if mapped is not None:
+            mapped.close()
+
+
+def _count_and_extract(source, max_pages, max_inline):
+    # Runs in a worker process: counts the pages and, for a document too small to be split
+    # across workers, extracts them in the same call -> (page_count, pages or None)
+    import pypdf
+    stream, mapped = _open_source(source)
+    try:
+        reader = pypdf.PdfReader(stream)
+        page_count = len(reader.pages)
+        if page_count > max_pages or page_count > max_inline:
+            return page_count, None
+        return page_count, [reader.pages[i].extract_text() or '' for i in range(page_count)]
+    finally:
+        if mapped is not None:
+            mapped.close()
+
+
+def _file_hash(data):
+    if isinstance(data, (bytes, bytearray)):
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    with open(data, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PdfTextExtractor:
+    def __init__(self, max_pages=50, max_bytes=10 * 1024 * 1024, timeout=30.0,
+                 parallel_min_pages=8, workers=None, cache_size=128):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.parallel_min_pages = parallel_min_pages
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._stats = {'cache_hits': 0, 'extracted': 0, 'parallel': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn keeps worker processes clear of the web server's threads and sockets
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _discard_pool(self, pool):
+        # Kills the pool's workers, and with them any page still running past its deadline.
+        # Other documents in flight on this pool see BrokenProcessPool and retry on the new one.
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def extract(self, data, file_hash=None, offload=False):
+        # data: bytes, or the path of the file on disk
+        # offload=True sends even small documents to the worker processes, for callers
+        # that parse many files from a thread pool (pypdf holds the GIL); with a timeout
+        # they always go there
+        size = len(data) if isinstance(data, (bytes, bytearray)) else os.path.getsize(data)
+        if size > self.max_bytes:
+            self._count('rejected')
+            raise PdfExtractionError(f"PDF is larger than {self.max_bytes // (1024 * 1024)} MB", 413)
+        if not size:
+            raise PdfExtractionError("PDF is empty")
+
+        key = file_hash or _file_hash(data)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._stats['cache_hits'] += 1
+                return self._cache[key]
+
+        if self.timeout or offload:
+            pages = self._extract_in_workers(data)
+        else:
+            pages = self._extract_here(data)
+        text = ''.join(pages)
+
+        with self._lock:
+            self._cache[key] = text
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._stats['extracted'] += 1
+        return text
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cache_size=len(self._cache))
+
+    def _check_pages(self, page_count):
+        if page_count > self.max_pages:
+            self._count('rejected')
+            raise PdfExtractionError(f"PDF has {page_count} pages; the limit is {self.max_pages}", 413)
+
+    def _extract_here(self, data):
+        # Only without a timeout (timeout=0): parsing and counting run in this process, where
+        # nothing can interrupt them; large documents still fan their pages out to the pool
+        import pypdf
+        stream, mapped = _open_source(data)
+        try:
+            reader = pypdf.PdfReader(stream)
+            page_count = len(reader.pages)
+            self._check_pages(page_count)
+            if page_count < self.parallel_min_pages or self.workers == 1:
+                return [reader.pages[i].extract_text() or '' for i in range(page_count)]
+        finally:
+            if mapped is not None:
+                mapped.close()
+        self._count('parallel')
+        return self._extract_pages(_worker_source(data), page_count, None)
+
+    def _extract_in_workers(self, data):
+        # one deadline for the whole document: the page count, then the pages if it is split
+        self._count('parallel')
+        source = _worker_source(data)
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        max_inline = self.parallel_min_pages - 1 if self.workers > 1 else self.max_pages
+        [(page_count, pages)] = self._run(deadline, [(_count_and_extract, source, self.max_pages, max_inline)])
+        self._check_pages(page_count)
+        if pages is None:
+            pages = self._extract_pages(source, page_count, deadline)
+        return pages
+
+    def _extract_pages(self, source, page_count, deadline):
+        step = max(1, -(-page_count // self.workers))
+        ranges = self._run(deadline, [(_extract_range, source, start, min(start + step, page_count))
+                                      for start in range(0, page_count, step)])
+        return [page for pages in ranges for page in pages]
+
+    def _run(self, deadline, calls):
+        # calls: [(fn, *args)] run on the pool -> their results, in order
+        for attempt in range(2):
+            pool = self._get_pool()
+            futures = [pool.submit(*call) for call in calls]
+            remaining = max(0.0, deadline - time.monotonic()) if deadline else None
+            done, not_done = wait(futures, timeout=remaining, return_when=FIRST_EXCEPTION)
+            errors = [f.exception() for f in done if not f.cancelled() and f.exception() is not None]
+            if any(isinstance(e, BrokenProcessPool) for e in errors):
+                # killed by another document's timeout, or a worker crashed: one retry on a new pool
+                self._discard_pool(pool)
+                if attempt == 0:
+                    continue
+            if errors:
+                for f in not_done:
+                    f.cancel()
+                raise errors[0]
+            if not_done:
+                self._discard_pool(pool)
+                self._count('timeouts')
+                raise PdfExtractionError(f"PDF text extraction timed out after {self.timeout:g}s")
+            break
+        return [f.result() for f in futures]
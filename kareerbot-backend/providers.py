@@ -0,0 +1,147 @@
+# providers.py
+# Lazy provider registry for the heavy clients (Gemini chat model, embeddings, Tavily,
+# the tool-calling agent) and the LangChain classes they come from.
+#
+# Nothing is imported or constructed until first use, so auth-only workers start in
+# the time it takes to import Flask and SQLAlchemy. Each component's import and init
+# cost is recorded and can be printed with report(); warm() builds components up front
+# for workers that would rather pay at boot than on their first request.
+
+import importlib
+import threading
+import time
+
+
+class ProviderRegistry:
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._timings = {}  # component -> {'import_s': float, 'init_s': float}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._building = threading.local()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.RLock()
+
+    def provider(self, name):
+        # Decorator form of register()
+        def decorator(factory):
+            self.register(name, factory)
+            return factory
+        return decorator
+
+    def get(self, name):
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+            stack = self._stack()
+            frame = {'imports': 0.0, 'children': 0.0}
+            stack.append(frame)
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            finally:
+                stack.pop()
+            elapsed = time.perf_counter() - start
+            if stack:
+                # a dependency built inside another factory is reported on its own row
+                stack[-1]['children'] += elapsed
+            with self._lock:
+                self._timings[name] = {
+                    'import_s': frame['imports'],
+                    'init_s': max(0.0, elapsed - frame['imports'] - frame['children']),
+                }
+            self._instances[name] = instance
+            return instance
+
+    def is_ready(self, name):
+        return name in self._instances
+
+    def warm(self, names=None):
+        for name in (names or list(self._factories)):
+            self.get(name)
+
+    def proxy(self, name):
+        return LazyProxy(lambda: self.get(name), name)
+
+    def lazy_import(self, module, attr):
+        # Stand-in for `from module import attr`, imported on first call or attribute access
+        return LazyProxy(lambda: self._import(module, attr), f'{module}.{attr}')
+
+    def _stack(self):
+        if not hasattr(self._building, 'stack'):
+            self._building.stack = []
+        return self._building.stack
+
+    def _import(self, module, attr):
+        start = time.perf_counter()
+        value = getattr(importlib.import_module(module), attr)
+        elapsed = time.perf_counter() - start
+        # charge the import to whichever component triggered it, else to the module itself
+        stack = self._stack()
+        if stack:
+            stack[-1]['imports'] += elapsed
+        else:
+            with self._lock:
+                self._timings.setdefault(module, {'import_s': 0.0, 'init_s': 0.0})['import_s'] += elapsed
+        return value
+
+    def report(self):
+        with self._lock:
+            rows = [{'component': name, 'import_ms': t['import_s'] * 1000, 'init_ms': t['init_s'] * 1000,
+                     'ready': name in self._instances}
+                    for name, t in self._timings.items()]
+        for name in self._factories:
+            if name not in self._timings:
+                rows.append({'component': name, 'import_ms': 0.0, 'init_ms': 0.0, 'ready': False})
+        return rows
+
+
+class LazyProxy:
+    # Resolves its target on first use and forwards calls and attribute access to it
+    __slots__ = ('_resolve', '_name', '_target')
+
+    def __init__(self, resolve, name):
+        object.__setattr__(self, '_resolve', resolve)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_target', None)
+
+    def _get(self):
+        target = object.__getattribute__(self, '_target')
+        if target is None:
+            target = object.__getattribute__(self, '_resolve')()
+            object.__setattr__(self, '_target', target)
+        return target
+
+    def __getattr__(self, item):
+        return getattr(self._get(), item)
+
+    def __call__(self, *args, **kwargs):
+        return self._get()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy {object.__getattribute__(self, '_name')}>"
+
+
+def resolve(value):
+    # The real object behind a proxy, for APIs that type-check their arguments
+    return value._get() if isinstance(value, LazyProxy) else value
+
+
+def format_report(rows):
+    header = f"{'component':<44}{'import ms':>11}{'init ms':>10}{'total ms':>10}"
+    lines = [header, '-' * len(header)]
+    for r in sorted(rows, key=lambda r: -(r['import_ms'] + r['init_ms'])):
+        lines.append(f"{r['component']:<44}{r['import_ms']:>11.1f}{r['init_ms']:>10.1f}"
+                     f"{r['import_ms'] + r['init_ms']:>10.1f}")
+    return '\n'.join(lines)
+
+
+registry = ProviderRegistry()
@@ -0,0 +1,163 @@
+# response_cache.py
+# Response cache for deterministic LLM endpoints.
+#
+# Keys hash the prompt template version, the model name and the normalized inputs, so
+# editing a prompt (and bumping its version) or switching models never serves stale
+# answers. Answers derived from a user's own data (their resume) also hash a scope, the
+# user id, taken verbatim, so they are never served to anyone else; answers that depend
+# only on public inputs (a goal) are shared. Values are JSON-serialisable results, looked
+# up tier by tier: an in-memory LRU first, then an optional SQLite file shared by every
+# process on the host.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_input(value):
+    # Whitespace and case differences should not defeat the cache ("Become a Data Scientist ")
+    if isinstance(value, str):
+        return ' '.join(value.split()).casefold()
+    return value
+
+
+def make_cache_key(template_version, model_name, scope=None, **inputs):
+    payload = {
+        'template': template_version,
+        'model': model_name,
+        'scope': scope,
+        'inputs': {k: normalize_input(v) for k, v in sorted(inputs.items())},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteTier:
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+        return row[1], json.loads(row[0])
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                               (key, json.dumps(value, ensure_ascii=False), expires_at))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, tiers, default_ttl=3600):
+        # tiers: fastest first; any object with get(key) -> (expires_at, value) | None
+        # and set(key, value, expires_at)
+        self.tiers = list(tiers)
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._stats = {}  # namespace -> {'hits': n, 'misses': n, '<tier>_hits': n}
+
+    def _count(self, namespace, field):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counters[field] = counters.get(field, 0) + 1
+
+    def get(self, namespace, key):
+        for i, tier in enumerate(self.tiers):
+            item = tier.get(key)
+            if item is not None:
+                expires_at, value = item
+                self._count(namespace, 'hits')
+                self._count(namespace, f'{tier.name}_hits')
+                # promote into the faster tiers that missed, keeping the original expiry
+                for faster in self.tiers[:i]:
+                    faster.set(key, value, expires_at)
+                return value
+        self._count(namespace, 'misses')
+        return None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl if ttl is not None else self.default_ttl)
+        for tier in self.tiers:
+            tier.set(key, value, expires_at)
+
+    def get_or_compute(self, namespace, key, compute, ttl=None):
+        value = self.get(namespace, key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    async def aget_or_compute(self, namespace, key, compute, ttl=None):
+        # compute is a coroutine function; lookups stay synchronous (memory / local SQLite)
+        value = self.get(namespace, key)
+        if value is None:
+            value = await compute()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            routes = {ns: dict(c) for ns, c in self._stats.items()}
+        for counters in routes.values():
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_rate'] = (counters['hits'] / lookups) if lookups else 0.0
+        return {
+            'tiers': {tier.name: len(tier) for tier in self.tiers},
+            'routes': routes,
+        }
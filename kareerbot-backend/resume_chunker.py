@@ -0,0 +1,202 @@
+# resume_chunker.py
+# Resume-aware chunking for ingestion (RESUME_CHUNKER=sections, the default).
+#
+# The text is split at section headers (Experience, Skills, Education, ...) and, inside a
+# section, into entries: a heading line such as "Senior Engineer, Acme (2019-2022)" with
+# the bullets under it. Entries are packed into chunks of at most max_tokens and never
+# cross a section boundary. An entry too long for one chunk is split between bullets, and
+# each continuation chunk repeats the entry's heading so it still says which job it is
+# about. Only a single bullet or paragraph longer than a whole chunk is cut mid-text, with
+# overlap_tokens of overlap. Every chunk starts with its section title and carries
+# section / section_title metadata, which retrieval can filter on.
+#
+# Tokens are counted as words and punctuation marks, which tracks the embedding model's
+# subword count closely enough for sizing without shipping a tokenizer.
+
+import re
+
+SECTION_ALIASES = {
+    'summary': ('summary', 'professional summary', 'career summary', 'profile', 'professional profile',
+                'about', 'about me', 'objective', 'career objective'),
+    'experience': ('experience', 'work experience', 'professional experience', 'relevant experience',
+                   'employment', 'employment history', 'work history', 'career history', 'internships',
+                   'internship', 'internship experience'),
+    'education': ('education', 'academic background', 'academics', 'qualifications',
+                  'educational qualifications', 'academic qualifications'),
+    'skills': ('skills', 'technical skills', 'key skills', 'core skills', 'skills and tools', 'skill set',
+               'skillset', 'core competencies', 'competencies', 'technologies', 'tools and technologies',
+               'tech stack'),
+    'projects': ('projects', 'personal projects', 'academic projects', 'key projects', 'selected projects',
+                 'side projects'),
+    'certifications': ('certifications', 'certificates', 'certification', 'licenses and certifications',
+                       'courses', 'coursework', 'relevant coursework', 'training'),
+    'awards': ('awards', 'achievements', 'awards and achievements', 'honors', 'honours', 'accomplishments'),
+    'publications': ('publications', 'research', 'research experience', 'papers'),
+    'languages': ('languages', 'spoken languages'),
+    'volunteering': ('volunteering', 'volunteer experience', 'volunteer work', 'leadership',
+                     'extracurricular activities', 'activities', 'positions of responsibility'),
+    'interests': ('interests', 'hobbies', 'hobbies and interests'),
+    'contact': ('contact', 'contact information', 'contact details', 'personal details', 'personal information'),
+}
+SECTIONS = tuple(SECTION_ALIASES) + ('header', 'other')
+
+_HEADERS = {alias: section for section, aliases in SECTION_ALIASES.items() for alias in aliases}
+_DECORATION = re.compile(r"^[\s#=*_\-:|]+|[\s#=*_\-:|]+$")
+_INLINE_HEADER = re.compile(r"^\s*([A-Za-z][A-Za-z &/]{1,40}?)\s*[:|]\s*(\S.*)$")
+_BULLET = re.compile(r"^\s*(?:[-*•·▪◦‣–—●➢>]|o(?=\s)|\(?\d{1,2}[.)])\s+")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    return len(_TOKEN.findall(text))
+
+
+def _header_key(line):
+    return ' '.join(_DECORATION.sub('', line).replace('&', 'and').lower().split())
+
+
+def section_of(line, seen_known=False):
+    # -> (section, title, rest of the line) when the line opens a section, else None
+    stripped = line.strip()
+    if not stripped or len(stripped) > 60:
+        return None
+    key = _header_key(stripped)
+    if key in _HEADERS:
+        return _HEADERS[key], _DECORATION.sub('', stripped), ''
+    inline = _INLINE_HEADER.match(stripped)
+    if inline and _header_key(inline.group(1)) in _HEADERS:
+        # "Skills: Python, SQL, Docker"
+        return _HEADERS[_header_key(inline.group(1))], inline.group(1).strip(), inline.group(2).strip()
+    words = key.split()
+    # an unknown ALL-CAPS heading ("OPEN SOURCE") once the resume has shown real sections;
+    # before that it is more likely the candidate's name
+    letters = [c for c in stripped if c.isalpha()]
+    if seen_known and 1 <= len(words) <= 4 and len(letters) >= 4 and all(c.isupper() for c in letters) \
+            and not _BULLET.match(stripped):
+        return 'other', _DECORATION.sub('', stripped).title(), ''
+    return None
+
+
+def split_sections(text):
+    # -> [(section, title, lines)]; text before the first header is the 'header' section
+    sections = [['header', '', []]]
+    seen_known = False
+    for line in text.splitlines():
+        found = section_of(line, seen_known)
+        if found is None:
+            sections[-1][2].append(line)
+            continue
+        section, title, rest = found
+        seen_known = seen_known or section != 'other'
+        sections.append([section, title, [rest] if rest else []])
+    return [(section, title, lines) for section, title, lines in sections if any(l.strip() for l in lines)]
+
+
+def split_entries(lines):
+    # -> [(heading lines, bullets)]; a blank line or a heading after bullets starts a new entry
+    entries = []
+    heading, bullets = [], []
+
+    def close():
+        if heading or bullets:
+            entries.append((heading, bullets))
+
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            close()
+            heading, bullets = [], []
+        elif _BULLET.match(line):
+            bullets.append(_BULLET.sub('', line, count=1).strip())
+        elif bullets and not line[0].isupper():
+            # a wrapped bullet, as PDF extraction leaves them ("...handling" / "58k requests per second")
+            bullets[-1] += ' ' + line
+        elif bullets:
+            close()
+            heading, bullets = [line], []
+        else:
+            heading.append(line)
+    close()
+    return entries
+
+
+class ResumeChunker:
+    def __init__(self, max_tokens=256, overlap_tokens=16):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 4)
+
+    def _windows(self, text, budget):
+        # a single bullet or paragraph longer than a chunk: word windows with a small overlap
+        words = text.split()
+        sizes = [count_tokens(word) for word in words]
+        pieces, start = [], 0
+        while start < len(words):
+            end, tokens = start, 0
+            while end < len(words) and (end == start or tokens + sizes[end] <= budget):
+                tokens += sizes[end]
+                end += 1
+            pieces.append(' '.join(words[start:end]))
+            if end >= len(words):
+                break
+            # the next window starts overlap_tokens back
+            back, overlap = end, 0
+            while back - 1 > start and overlap + sizes[back - 1] <= self.overlap_tokens:
+                back -= 1
+                overlap += sizes[back]
+            start = back
+        return pieces
+
+    def _section_chunks(self, title, lines):
+        chunks = []
+        current, used = [], 0
+        title_tokens = count_tokens(title)
+
+        def flush():
+            nonlocal current, used
+            if current:
+                chunks.append('\n'.join(([title] if title else []) + current))
+            current, used = [], 0
+
+        for heading, bullets in split_entries(lines):
+            items = heading + [f"- {b}" for b in bullets]
+            text = '\n'.join(items)
+            tokens = count_tokens(text)
+            if used + tokens + title_tokens <= self.max_tokens:
+                current.append(text)
+                used += tokens
+                continue
+            flush()
+            if tokens + title_tokens <= self.max_tokens:
+                current.append(text)
+                used = tokens
+                continue
+            # split the entry between its lines; continuation chunks repeat the heading
+            context = '\n'.join(heading)
+            context_tokens = count_tokens(context) if heading and count_tokens(context) * 2 < self.max_tokens else 0
+            budget = self.max_tokens - title_tokens - context_tokens
+            for item in (items[len(heading):] if context_tokens else items):
+                for piece in (self._windows(item, budget) if count_tokens(item) > budget else [item]):
+                    piece_tokens = count_tokens(piece)
+                    if current and used + piece_tokens > budget:
+                        flush()
+                    if not current and context_tokens:
+                        current.append(context)
+                    current.append(piece)
+                    used += piece_tokens
+            flush()
+        flush()
+        return chunks
+
+    def split_text(self, text):
+        # -> [(chunk text, {'section', 'section_title'})]
+        results = []
+        for section, title, lines in split_sections(text):
+            for chunk in self._section_chunks(title, lines):
+                results.append((chunk, {'section': section, 'section_title': title}))
+        return results
+
+    def chunk(self, text, metadata=None):
+        from langchain_core.documents import Document
+
+        return [Document(page_content=chunk, metadata={**(metadata or {}), **chunk_metadata, 'chunk': i})
+                for i, (chunk, chunk_metadata) in enumerate(self.split_text(text))]
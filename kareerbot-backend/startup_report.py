@@ -0,0 +1,30 @@
+# startup_report.py
+# Prints what a worker pays at startup: the time to import app.py, then the import and
+# init cost of each lazily built component (providers.py) when warmed one by one.
+#
+#   python startup_report.py             # every component
+#   python startup_report.py schema      # just the database setup
+
+import os
+import sys
+import time
+
+
+def main():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    import app
+    import_s = time.perf_counter() - start
+    print(f"import app: {import_s * 1000:.1f} ms")
+
+    from providers import format_report
+    names = sys.argv[1:] or None
+    start = time.perf_counter()
+    app.registry.warm(names)
+    warm_s = time.perf_counter() - start
+    print(format_report(app.registry.report()))
+    print(f"warm: {warm_s * 1000:.1f} ms, cold start total: {(import_s + warm_s) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# streaming.py
+# Helpers for the Server-Sent Events (SSE) variants of the LLM endpoints.
+
+import asyncio
+import contextvars
+import json
+import queue
+import threading
+from functools import lru_cache
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # stop nginx-style proxies from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+_DONE = object()
+
+
+def sse_event(data, event=None):
+    lines = []
+    if event:
+        lines.append(f'event: {event}')
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    for line in payload.split('\n'):
+        lines.append(f'data: {line}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def iterate_in_context(generator):
+    # A streamed body is iterated after the view has returned and the request hooks have
+    # unbound their context variables; replay every step in a copy of the view's context
+    # so the LLM gateway and metrics still see the caller and the route.
+    return _replay(contextvars.copy_context(), generator)
+
+
+def _replay(context, generator):
+    try:
+        while True:
+            try:
+                item = context.run(next, generator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        generator.close()
+
+
+@lru_cache(maxsize=None)
+def _token_queue_handler_class():
+    # langchain_core is imported on the first stream rather than at app startup
+    try:
+        from langchain_core.callbacks import BaseCallbackHandler
+    except Exception:
+        BaseCallbackHandler = object
+
+    class _TokenQueueHandler(BaseCallbackHandler):
+        def __init__(self, q):
+            self._q = q
+
+        def on_llm_new_token(self, token, **kwargs):
+            if token:
+                self._q.put(token)
+
+    return _TokenQueueHandler
+
+
+def stream_callback_tokens(run):
+    # Runs run(callbacks) on a worker thread and yields ('token', str) as the model produces
+    # them, then ('result', value) or ('error', exception). For runnables such as agents
+    # whose .stream() yields whole steps rather than tokens.
+    q = queue.Queue()
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = run([_token_queue_handler_class()(q)])
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            q.put(_DONE)
+
+    # the caller's context (e.g. the LLM gateway's current user) carries over to the thread
+    threading.Thread(target=contextvars.copy_context().run, args=(target,), daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _DONE:
+            break
+        yield 'token', item
+    if 'error' in outcome:
+        yield 'error', outcome['error']
+    else:
+        yield 'result', outcome.get('result')
+
+
+@lru_cache(maxsize=None)
+def _async_token_queue_handler_class():
+    from langchain_core.callbacks import AsyncCallbackHandler
+
+    class _AsyncTokenQueueHandler(AsyncCallbackHandler):
+        def __init__(self, q):
+            self._q = q
+
+        async def on_llm_new_token(self, token, **kwargs):
+            if token:
+                self._q.put_nowait(token)
+
+    return _AsyncTokenQueueHandler
+
+
+async def astream_callback_tokens(arun):
+    # Async counterpart of stream_callback_tokens for the ASGI app: awaits arun(callbacks)
+    # as a task on the running loop instead of a thread.
+    q = asyncio.Queue()
+
+    async def target():
+        try:
+            return await arun([_async_token_queue_handler_class()(q)])
+        finally:
+            q.put_nowait(_DONE)
+
+    task = asyncio.ensure_future(target())
+    try:
+        while True:
+            item = await q.get()
+            if item is _DONE:
+                break
+            yield 'token', item
+    finally:
+        if not task.done():
+            task.cancel()
+    try:
+        yield 'result', task.result()
+    except Exception as e:
+        yield 'error', e
@@ -0,0 +1,381 @@
+# structured_output.py
+# JSON answers from the chat model: one scanner, one repair step, one validator and one
+# retry policy for every route that asks the model for JSON.
+#
+#   scan     - a single pass over the answer (or over a stream of chunks) that tracks
+#              strings, escapes and bracket depth and yields each balanced {...} / [...]
+#              value, so prose, code fences or a second blob around the answer are ignored
+#   repair   - tolerant fixes for what models get wrong: trailing commas, comments,
+#              Python literals, single or curly quotes, unescaped quotes and newlines
+#              inside strings, unquoted keys, and output cut off mid-object
+#   validate - a small JSON-Schema subset (type, properties, required, items, minItems,
+#              minimum, maximum), with numeric strings and lone strings coerced
+#   fix      - only when all of that fails: one short "fix this JSON" call that sends the
+#              broken answer, not the original prompt
+#
+# Outcomes are counted per route (parsed, repaired, fixed, failed) for /api/cache-stats
+# and /metrics.
+
+import json
+import re
+import threading
+
+_CLOSERS = {'{': '}', '[': ']'}
+_TOKENS = re.compile(r'[{}\[\]"\\]')
+
+
+class StructuredOutputError(ValueError):
+    def __init__(self, message, raw=''):
+        super().__init__(message)
+        self.raw = raw
+
+
+class JsonScanner:
+    # Incremental balanced-value scanner: feed() text as it arrives and get back every
+    # top-level value completed by that text. opener limits it to '{' or '[' values.
+    def __init__(self, opener=None):
+        self.openers = opener or '{['
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._parts = []
+
+    def feed(self, text):
+        values = []
+        start = 0 if self._stack else None
+        skip = 0 if self._escaped else -1
+        self._escaped = False
+        for match in _TOKENS.finditer(text):
+            i = match.start()
+            if i == skip:
+                continue
+            ch = match.group()
+            if not self._stack:
+                if ch in self.openers:
+                    self._stack.append(_CLOSERS[ch])
+                    start = i
+                continue
+            if self._in_string:
+                if ch == '\\':
+                    skip = i + 1
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(_CLOSERS[ch])
+            elif ch == self._stack[-1]:
+                self._stack.pop()
+                if not self._stack:
+                    self._parts.append(text[start:i + 1])
+                    values.append(''.join(self._parts))
+                    self._parts = []
+                    start = None
+            # a mismatched closer stays in the text for repair() to deal with
+        if self._stack:
+            self._parts.append(text[start:])
+            self._escaped = skip == len(text)
+        return values
+
+    def pending(self):
+        # the unfinished value so far, e.g. an answer that was cut off
+        return ''.join(self._parts) if self._stack else ''
+
+
+def json_candidates(text, opener=None):
+    scanner = JsonScanner(opener)
+    candidates = scanner.feed(text)
+    if scanner.pending():
+        candidates.append(scanner.pending())
+    # the old greedy first-opener-to-last-closer span, for answers the scanner misreads
+    openers = opener or '{['
+    first = min((i for i in (text.find(o) for o in openers) if i >= 0), default=-1)
+    last = max(text.rfind(_CLOSERS[o]) for o in openers)
+    if 0 <= first < last and text[first:last + 1] not in candidates:
+        candidates.append(text[first:last + 1])
+    return candidates
+
+
+_WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null', 'NaN': 'null', 'undefined': 'null'}
+
+
+def _next_significant(text, i):
+    n = len(text)
+    while i < n and text[i] in ' \t\r\n':
+        i += 1
+    return text[i] if i < n else ''
+
+
+def repair_json(text):
+    if '"' not in text:
+        text = text.replace('“', '"').replace('”', '"')
+    out = []
+    stack = []
+    quote = None  # delimiter of the string being copied, if any
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == '\\' and i + 1 < n:
+                # \' is not a JSON escape
+                out.append("'" if text[i + 1] == "'" else text[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                # a quote only ends the string if JSON can continue after it
+                if _next_significant(text, i + 1) in (',', ':', '}', ']', ''):
+                    out.append('"')
+                    quote = None
+                else:
+                    out.append('\\"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == '\n':
+                out.append('\\n')
+            elif ch == '\r':
+                out.append('\\r')
+            elif ch == '\t':
+                out.append('\\t')
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in '"\'':
+            quote = ch
+            out.append('"')
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+        elif ch in '}]':
+            if ch in stack:
+                # close anything left open inside this value first
+                while stack:
+                    closer = stack.pop()
+                    _drop_trailing_comma(out)
+                    out.append(closer)
+                    if closer == ch:
+                        break
+            # a closer with nothing to close is dropped
+        elif ch == ',':
+            if _next_significant(text, i + 1) not in ('}', ']', ''):
+                out.append(ch)
+        elif _WORD.match(text, i):
+            word = _WORD.match(text, i).group()
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif stack and stack[-1] == '}' and _next_significant(text, i + len(word)) == ':':
+                out.append(f'"{word}"')
+            else:
+                out.append(word)
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # cut-off answer: finish the open string and value, then close every bracket
+    if quote:
+        out.append('"')
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ':':
+        out.append('null')
+    while stack:
+        _drop_trailing_comma(out)
+        out.append(stack.pop())
+    return ''.join(out)
+
+
+def _drop_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+_TYPES = {'object': dict, 'array': list, 'string': str, 'number': (int, float), 'integer': int,
+          'boolean': bool, 'null': type(None)}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def conform(value, schema, path='$'):
+    # -> value, coerced where the intent is unambiguous; raises SchemaError otherwise
+    if not schema:
+        return value
+    expected = schema.get('type')
+    if expected in ('number', 'integer') and isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip('%'))
+            value = int(value) if expected == 'integer' or value.is_integer() else value
+        except ValueError:
+            pass
+    if expected == 'array' and isinstance(value, str) and schema.get('items', {}).get('type') == 'string':
+        value = [value]
+    if expected:
+        ok = isinstance(value, _TYPES[expected])
+        if expected in ('number', 'integer') and isinstance(value, bool):
+            ok = False
+        if not ok:
+            raise SchemaError(f"{path}: expected {expected}, got {type(value).__name__}")
+
+    if isinstance(value, dict):
+        for key in schema.get('required', ()):
+            if key not in value:
+                raise SchemaError(f"{path}: missing required field '{key}'")
+        for key, sub in schema.get('properties', {}).items():
+            if key in value:
+                value[key] = conform(value[key], sub, f"{path}.{key}")
+    elif isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            raise SchemaError(f"{path}: expected at least {schema['minItems']} items, got {len(value)}")
+        if 'items' in schema:
+            value = [conform(item, schema['items'], f"{path}[{i}]") for i, item in enumerate(value)]
+    elif isinstance(value, (int, float)):
+        if 'minimum' in schema and value < schema['minimum']:
+            raise SchemaError(f"{path}: {value} is below the minimum {schema['minimum']}")
+        if 'maximum' in schema and value > schema['maximum']:
+            raise SchemaError(f"{path}: {value} is above the maximum {schema['maximum']}")
+    return value
+
+
+def _opener(schema):
+    return {'object': '{', 'array': '['}.get((schema or {}).get('type'))
+
+
+def parse_json(text, schema=None):
+    # -> (value, 'parsed' | 'repaired'); raises StructuredOutputError
+    text = text or ''
+    candidates = json_candidates(text, _opener(schema))
+    if not candidates:
+        raise StructuredOutputError("Could not find a JSON value in the AI's response.", text)
+    first_error = None
+    for how, fix in (('parsed', None), ('repaired', repair_json)):
+        for candidate in candidates:
+            try:
+                value = json.loads(fix(candidate) if fix else candidate)
+                return conform(value, schema), how
+            except (ValueError, SchemaError) as e:
+                first_error = first_error or e
+    raise StructuredOutputError(f"Invalid JSON in the AI's response: {first_error}", text)
+
+
+class StructuredOutput:
+    def __init__(self, fix_attempts=1, fix_max_chars=8000, timer=None):
+        # timer(stage) -> context manager around each parse, e.g. metrics.stage
+        self.fix_attempts = fix_attempts
+        self.fix_max_chars = fix_max_chars
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def _count(self, route, outcome):
+        with self._lock:
+            counts = self._routes.setdefault(route or '-', {'parsed': 0, 'repaired': 0, 'fixed': 0,
+                                                            'failed': 0, 'fix_calls': 0})
+            counts[outcome] += 1
+
+    def _parse(self, text, schema):
+        if self._timer is None:
+            return parse_json(text, schema)
+        with self._timer('json_extract'):
+            return parse_json(text, schema)
+
+    def is_valid(self, text, schema=None):
+        # parses cleanly as-is; for deciding when a streamed answer is complete
+        try:
+            conform(json.loads(text), schema)
+            return True
+        except (ValueError, SchemaError):
+            return False
+
+    def parse(self, route, text, schema=None):
+        # No model call: parse and repair only
+        try:
+            value, how = self._parse(text, schema)
+        except StructuredOutputError:
+            self._count(route, 'failed')
+            raise
+        self._count(route, how)
+        return value
+
+    def parse_quiet(self, route, text, schema):
+        # parse() that leaves a failure uncounted, for callers that go on to retry
+        value, how = self._parse(text, schema)
+        self._count(route, how)
+        return value
+
+    def fix_prompt(self, text, error, schema=None):
+        shape = f" matching this JSON Schema:\n{json.dumps(schema)}\n" if schema else ".\n"
+        return (
+            f"The text below was meant to be a single JSON value{shape}"
+            f"It could not be used: {error}\n"
+            "Return only the corrected JSON, with no other text. Keep the content; change only what is "
+            "needed to make it valid.\n\n"
+            f"Text:\n{text[:self.fix_max_chars]}"
+        )
+
+    def recover(self, route, text, schema, model):
+        # Parse an answer already in hand; on failure ask `model` to fix it
+        try:
+            return self.parse_quiet(route, text, schema)
+        except StructuredOutputError as e:
+            error = e
+        for _ in range(self.fix_attempts):
+            self._count(route, 'fix_calls')
+            fixed = model.invoke(self.fix_prompt(text, error, schema)).content
+            try:
+                value, _ = self._parse(fixed, schema)
+            except StructuredOutputError as e:
+                error = StructuredOutputError(str(e), text)
+                continue
+            self._count(route, 'fixed')
+            return value
+        self._count(route, 'failed')
+        raise error
+
+    async def arecover(self, route, text, schema, model):
+        try:
+            return self.parse_quiet(route, text, schema)
+        except StructuredOutputError as e:
+            error = e
+        for _ in range(self.fix_attempts):
+            self._count(route, 'fix_calls')
+            fixed = (await model.ainvoke(self.fix_prompt(text, error, schema))).content
+            try:
+                value, _ = self._parse(fixed, schema)
+            except StructuredOutputError as e:
+                error = StructuredOutputError(str(e), text)
+                continue
+            self._count(route, 'fixed')
+            return value
+        self._count(route, 'failed')
+        raise error
+
+    def generate(self, route, model, prompt, schema=None):
+        return self.recover(route, model.invoke(prompt).content, schema, model)
+
+    async def agenerate(self, route, model, prompt, schema=None):
+        return await self.arecover(route, (await model.ainvoke(prompt)).content, schema, model)
+
+    def stats(self):
+        with self._lock:
+            routes = {route: dict(counts) for route, counts in self._routes.items()}
+        for counts in routes.values():
+            total = counts['parsed'] + counts['repaired'] + counts['fixed'] + counts['failed']
+            # answers that were not usable as returned, and answers that never became usable
+            counts['parse_failure_rate'] = (total - counts['parsed']) / total if total else 0.0
+            counts['failure_rate'] = counts['failed'] / total if total else 0.0
+        return {'routes': routes}
@@ -0,0 +1,59 @@
+# conftest.py
+# The app module wires everything up at import time (database, stores, uploads/ under the
+# working directory), so the whole session runs offline in a scratch directory.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.chdir(tempfile.mkdtemp(prefix='kareerbot-tests-'))
+os.environ.setdefault('KAREERBOT_FAKE_LLM', '1')
+os.environ.setdefault('GEMINI_API_KEY', 'fake')
+os.environ.setdefault('TAVILY_API_KEY', 'fake')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath('kareerbot-test.db')
+
+
+def make_pdf(pages):
+    # a minimal PDF with one line of Helvetica text per page
+    objs = ['<< /Type /Catalog /Pages 2 0 R >>',
+            f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(len(pages)))}] /Count {len(pages)} >>"]
+    font_id = 3 + 2 * len(pages)
+    for i, line in enumerate(pages):
+        objs.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R '
+                    f'/Resources << /Font << /F1 {font_id} 0 R >> >> >>')
+        stream = f'BT /F1 12 Tf 72 720 Td ({line}) Tj ET'
+        objs.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    objs.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    out, offsets = b'%PDF-1.4\n', []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += f'{i + 1} 0 obj\n{obj}\nendobj\n'.encode()
+    xref = len(out)
+    out += f'xref\n0 {len(objs) + 1}\n0000000000 65535 f \n'.encode()
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    out += f'trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return out
+
+
+@pytest.fixture(scope='session')
+def kb():
+    import app
+    app.registry.get('schema')
+    return app
+
+
+@pytest.fixture
+def client(kb):
+    return kb.app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    import uuid
+    response = client.post('/api/register', json={'contact': f'{uuid.uuid4().hex}@test', 'password': 'pw'})
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+
+
+def _gateway_users(kb, monkeypatch):
+    from llm_gateway import current_user
+    from metrics import current_route
+    seen = []
+    original = kb.chat_gateway._aacquire
+
+    async def recording():
+        seen.append((current_user.get(), current_route.get()))
+        return await original()
+
+    monkeypatch.setattr(kb.chat_gateway, '_aacquire', recording)
+    return seen
+
+
+def _post(path, json, headers):
+    import asgi_app
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi_app.asgi)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post(path, json=json, headers=headers)
+    return asyncio.run(run())
+
+
+def _user_id(kb, headers):
+    return kb.get_user_id_from_request(type('R', (), {'headers': headers, 'args': {}})())
+
+
+def test_streamed_plan_runs_as_the_caller(kb, auth_headers, monkeypatch):
+    seen = _gateway_users(kb, monkeypatch)
+    response = _post('/api/agent-plan/stream', {'goal': 'asgi stream binding test'}, auth_headers)
+    assert response.status_code == 200
+    assert 'event: done' in response.text
+    assert seen and set(seen) == {(_user_id(kb, auth_headers), '/api/agent-plan/stream')}
+
+
+def test_streamed_agent_query_runs_as_the_caller(kb, auth_headers, monkeypatch):
+    seen = _gateway_users(kb, monkeypatch)
+    response = _post('/api/agent-query/stream', {'query': 'asgi agent binding test'}, auth_headers)
+    assert response.status_code == 200
+    assert seen and all(user == _user_id(kb, auth_headers) for user, _ in seen)
+    assert {route for _, route in seen} == {'/api/agent-query/stream'}
+
+
+def test_token_verification_runs_off_the_event_loop(kb, auth_headers, monkeypatch):
+    import threading
+
+    verify_threads = []
+    original = kb.token_cache._verify
+
+    def recording(token):
+        verify_threads.append(threading.current_thread())
+        return original(token)
+
+    monkeypatch.setattr(kb.token_cache, '_verify', recording)
+    kb.token_cache.clear()
+    # _post runs the event loop on this thread
+    assert _post('/api/agent-plan', {'goal': 'off the loop'}, auth_headers).status_code == 200
+    assert len(verify_threads) == 1 and verify_threads[0] is not threading.current_thread()
+    # the next request is a cache hit and verifies nothing
+    assert _post('/api/agent-plan', {'goal': 'off the loop'}, auth_headers).status_code == 200
+    assert len(verify_threads) == 1
@@ -0,0 +1,149 @@
+import threading
+import time
+
+import jwt
+import pytest
+
+from auth import AuthBusy, PasswordHasher, VerifiedTokenCache
+
+
+def _blocked_hasher(**kwargs):
+    # a hasher whose single worker is stuck until the returned event is set
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1, **kwargs)
+    release = threading.Event()
+    hasher._executor.submit(release.wait)
+    return hasher, release
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+    hashed = hasher.hash('secret')
+    assert hasher.verify(hashed, 'secret') and not hasher.verify(hashed, 'wrong')
+
+
+def test_timeout_is_reported_as_busy():
+    hasher, release = _blocked_hasher(timeout=0.2)
+    try:
+        with pytest.raises(AuthBusy):
+            hasher.hash('secret')
+        assert hasher.stats()['timeouts'] == 1
+    finally:
+        release.set()
+
+
+def test_full_queue_is_rejected_at_once():
+    hasher, release = _blocked_hasher(max_pending=0, timeout=5)
+    try:
+        waiter = threading.Thread(target=lambda: hasher.hash('first'))
+        waiter.start()
+        while hasher._slots._value:
+            time.sleep(0.01)
+        with pytest.raises(AuthBusy):
+            hasher.hash('second')
+        assert hasher.stats()['rejected_busy'] == 1
+    finally:
+        release.set()
+        waiter.join()
+
+
+def test_login_timeout_returns_503_with_retry_after(kb, client, monkeypatch):
+    client.post('/api/register', json={'contact': 'slow@test', 'password': 'pw'})
+
+    def too_slow(*args):
+        raise AuthBusy('authentication is taking too long, try again shortly')
+
+    monkeypatch.setattr(kb.password_hasher, '_submit', too_slow)
+    response = client.post('/api/login', json={'contact': 'slow@test', 'password': 'pw'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'error' in response.get_json()
+
+
+class _Verifier:
+    def __init__(self, result=('alice', float('inf'))):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_token_cache_skips_verification_until_max_age():
+    verify = _Verifier()
+    cache = VerifiedTokenCache(verify, max_age=0.2)
+    assert cache.user_id('t') == 'alice' and cache.user_id('t') == 'alice'
+    assert verify.calls == 1
+    time.sleep(0.25)
+    assert cache.user_id('t') == 'alice'
+    assert verify.calls == 2
+
+
+def test_token_cache_honours_the_token_expiry():
+    verify = _Verifier(('alice', time.time() + 0.1))
+    cache = VerifiedTokenCache(verify, max_age=60)
+    cache.user_id('t')
+    time.sleep(0.15)
+    cache.user_id('t')
+    assert verify.calls == 2
+
+
+def test_token_cache_revoke_applies_at_once():
+    verify = _Verifier()
+    cache = VerifiedTokenCache(verify)
+    cache.user_id('t')
+    cache.revoke('t')
+    verify.result = None  # the revocation is now on record
+    assert cache.user_id('t') is None
+    assert cache.stats()['invalid'] == 1
+
+
+def test_token_cache_invalid_token_is_anonymous():
+    cache = VerifiedTokenCache(_Verifier(jwt.ExpiredSignatureError('expired')))
+    assert cache.user_id('t') is None
+
+
+def test_token_cache_lets_infrastructure_errors_through():
+    verify = _Verifier(RuntimeError('database is locked'))
+    cache = VerifiedTokenCache(verify)
+    with pytest.raises(RuntimeError):
+        cache.user_id('t')
+    verify.result = ('alice', float('inf'))
+    assert cache.user_id('t') == 'alice'
+    assert cache.stats()['invalid'] == 0
+
+
+def _whoami(client, headers):
+    return client.get('/api/plan-history', headers=headers).get_json()['user_id']
+
+
+def test_logout_revokes_the_token(client, auth_headers):
+    user_id = _whoami(client, auth_headers)
+    assert user_id != 'default'
+    assert client.post('/api/logout', headers=auth_headers).status_code == 200
+    assert _whoami(client, auth_headers) == 'default'
+
+
+def test_revocation_by_another_process_is_honoured_after_max_age(kb, client, auth_headers):
+    from datetime import datetime, timedelta
+
+    assert _whoami(client, auth_headers) != 'default'
+    token = auth_headers['Authorization'].split(' ', 1)[1]
+    with kb.SessionLocal() as db:
+        db.add(kb.RevokedToken(token_hash=kb.token_digest(token), user_id='x',
+                               expires_at=datetime.utcnow() + timedelta(days=1)))
+        db.commit()
+    # as if TOKEN_CACHE_SECONDS had passed since this process verified the token
+    kb.token_cache.clear()
+    assert _whoami(client, auth_headers) == 'default'
+
+
+def test_revocation_lookup_failure_is_a_server_error(kb, client, auth_headers, monkeypatch):
+    def unavailable(token):
+        raise RuntimeError('database unavailable')
+
+    kb.token_cache.clear()
+    monkeypatch.setattr(kb, 'token_digest', unavailable)
+    assert client.get('/api/plan-history', headers=auth_headers).status_code == 500
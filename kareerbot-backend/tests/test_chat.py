@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.fixture
+def resume_headers(client, auth_headers):
+    assert client.post('/api/process-resume', json={'text': 'Python developer with SQL and Docker'},
+                       headers=auth_headers).status_code == 200
+    return auth_headers
+
+
+def test_chat_stream_reports_setup_failure_as_an_sse_error(kb, client, resume_headers, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('store unavailable')
+
+    monkeypatch.setattr(kb, '_build_retrieval_chain', broken)
+    response = client.post('/api/chat/stream', json={'message': 'What do I know?'}, headers=resume_headers)
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert 'event: error' in body and 'store unavailable' in body
+
+
+def test_chat_stream_answers(client, resume_headers):
+    body = client.post('/api/chat/stream', json={'message': 'What do I know?'}, headers=resume_headers) \
+        .get_data(as_text=True)
+    assert 'event: done' in body
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from embedding_cache import CachedEmbeddings
+from fake_llm import FakeEmbeddings
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__(size=8)
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def test_misses_are_batched_and_cached(tmp_path):
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, path=str(tmp_path / 'cache.db'))
+    first = cache.embed_documents(['a', 'b', 'a'])
+    assert inner.calls == [['a', 'b']]
+    second = cache.embed_documents(['b', 'a'])
+    assert second[0] == pytest.approx(first[1]) and second[1] == pytest.approx(first[0])
+    assert len(inner.calls) == 1
+    assert cache.stats() == {'entries': 2, 'hits': 3, 'misses': 2, 'hit_rate': 0.6}
+
+
+def test_size_is_tracked_without_scanning_and_survives_reopen(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = CachedEmbeddings(CountingEmbeddings(), path=path)
+    cache.embed_documents(['x', 'y'])
+    cache.embed_query('x')
+    cache._store([(cache._key('doc', 'x'), [0.0] * 8)])  # an existing key adds nothing
+    assert cache.stats()['entries'] == 3
+    assert CachedEmbeddings(CountingEmbeddings(), path=path).stats()['entries'] == 3
+
+
+def test_counters_are_exact_under_concurrency(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), path=str(tmp_path / 'cache.db'))
+    cache.embed_documents(['warm'])
+
+    def worker():
+        for _ in range(200):
+            cache.embed_query('warm query')
+            cache.embed_documents(['warm'])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 1 + 8 * 200 * 2
@@ -0,0 +1,157 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, Text, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from job_queue import JobQueue
+
+Base = declarative_base()
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False)
+    stage = Column(String, nullable=True)
+    text = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def make_queue(sessions, handler=None, **kwargs):
+    handler = handler or (lambda job, set_stage: {'echo': job['text']})
+    return JobQueue(sessions, Job, handler, max_workers=0, stages=('parse', 'embed'), **kwargs)
+
+
+def expire(sessions, job_id, seconds=3600):
+    with sessions() as db:
+        db.query(Job).filter(Job.id == job_id).update({'updated_at': datetime.utcnow() - timedelta(seconds=seconds)})
+        db.commit()
+
+
+def test_a_job_is_claimed_once(sessions):
+    queue = make_queue(sessions)
+    job_id = queue.enqueue(text='a')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(queue._claim(job_id))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert queue.get(job_id)['attempts'] == 1
+
+
+def test_claimed_job_runs_to_done(sessions):
+    queue = make_queue(sessions)
+    job_id = queue.enqueue(text='hello')
+    queue._run(job_id)
+    job = queue.get(job_id)
+    assert job['status'] == 'done'
+    assert job['result'] == {'echo': 'hello'}
+    assert job['progress'] == 1.0
+
+
+def test_handler_error_marks_the_job_failed(sessions):
+    def boom(job, set_stage):
+        set_stage('embed')
+        raise RuntimeError('no text')
+    queue = make_queue(sessions, boom)
+    job_id = queue.enqueue(text='x')
+    queue._run(job_id)
+    job = queue.get(job_id)
+    assert (job['status'], job['stage'], job['error']) == ('failed', 'embed', 'no text')
+
+
+def test_abandoned_job_is_requeued_and_finished(sessions):
+    queue = make_queue(sessions, lease_seconds=60)
+    job_id = queue.enqueue(text='again')
+    assert queue._claim(job_id)  # the worker holding this claim dies
+    assert queue.reclaim_expired() == []  # lease still fresh
+
+    expire(sessions, job_id)
+    assert queue.reclaim_expired() == [job_id]
+    assert queue.get(job_id)['status'] == 'queued'
+    assert queue.pending_ids() == [job_id]
+
+    queue._run(job_id)
+    job = queue.get(job_id)
+    assert (job['status'], job['attempts']) == ('done', 2)
+
+
+def test_job_fails_after_max_attempts(sessions):
+    queue = make_queue(sessions, lease_seconds=60, max_attempts=2)
+    job_id = queue.enqueue(text='crashy')
+    for _ in range(2):
+        assert queue._claim(job_id)
+        expire(sessions, job_id)
+        queue.reclaim_expired()
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert 'attempts' in job['error']
+    assert queue.pending_ids() == []
+
+
+def test_stale_worker_cannot_overwrite_a_reclaimed_job(sessions):
+    queue = make_queue(sessions, lease_seconds=60)
+    job_id = queue.enqueue(text='slow')
+    queue._claim(job_id)
+    expire(sessions, job_id)
+    queue.reclaim_expired()
+    queue._claim(job_id)
+    assert not queue._update(job_id, attempt=1, status='done')
+    assert queue._update(job_id, attempt=2, stage='parse')
+    assert queue.get(job_id)['status'] == 'running'
+
+
+def test_heartbeat_keeps_a_long_job_leased(sessions):
+    reclaimed = []
+
+    def slow(job, set_stage):
+        for _ in range(6):
+            time.sleep(0.1)
+            reclaimed.extend(queue.reclaim_expired())
+        return 'ok'
+
+    queue = make_queue(sessions, slow, lease_seconds=0.3)
+    job_id = queue.enqueue(text='long')
+    queue._run(job_id)
+    assert reclaimed == []
+    assert queue.get(job_id)['status'] == 'done'
+
+
+def test_run_forever_survives_database_errors(sessions):
+    from sqlalchemy.exc import OperationalError
+
+    failures = {'left': 3}
+
+    def flaky_sessions():
+        if failures['left']:
+            failures['left'] -= 1
+            raise OperationalError('SELECT 1', {}, Exception('database is restarting'))
+        return sessions()
+
+    reader = make_queue(sessions)
+    job_id = reader.enqueue(text='after the outage')
+    queue = make_queue(flaky_sessions)
+    worker = threading.Thread(target=queue.run_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    worker.start()
+    deadline = time.time() + 5
+    while reader.get(job_id)['status'] != 'done' and time.time() < deadline:
+        time.sleep(0.02)
+    assert worker.is_alive()
+    assert failures['left'] == 0
+    assert reader.get(job_id)['result'] == {'echo': 'after the outage'}
@@ -0,0 +1,116 @@
+from fake_llm import FakeEmbeddings
+from lexical_retrieval import (BM25Index, HybridRetriever, VersionedIndexes, index_from_store, reciprocal_rank_fusion,
+                               tokenize)
+from numpy_vectors import NumpyVectorStore
+from vector_pool import VectorStorePool
+
+CHUNKS = [
+    ('skills', 'Skills: Python, C++, node.js, CI/CD pipelines', {'section': 'skills'}),
+    ('django', 'Built a Django REST API in Python for billing', {'section': 'experience'}),
+    ('react', 'Led the React frontend rewrite and design system', {'section': 'experience'}),
+    ('degree', 'BSc Computer Science, University of Leeds', {'section': 'education'}),
+    ('k8s', 'Ran Kubernetes clusters and Docker builds', {'section': 'experience'}),
+]
+
+
+def _index():
+    index = BM25Index()
+    index.add([c[0] for c in CHUNKS], [c[1] for c in CHUNKS], [c[2] for c in CHUNKS])
+    return index
+
+
+def test_tokenize_keeps_skill_names_whole():
+    assert tokenize('What do you know about C++, Node.js and CI/CD?') == ['c++', 'node.js', 'ci/cd']
+
+
+def test_bm25_ranks_and_filters():
+    index = _index()
+    assert [hit[1] for hit in index.search('python django', k=2)] == ['django', 'skills']
+    assert [hit[1] for hit in index.search('python', where={'section': 'skills'})] == ['skills']
+    assert index.search('haskell') == []
+
+
+def test_bm25_ignores_repeated_ids():
+    index = _index()
+    index.add(['django'], ['something else entirely'])
+    assert len(index) == len(CHUNKS)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    assert reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'c', 'a']]) == ['b', 'a', 'c']
+    assert reciprocal_rank_fusion([['a'], []]) == ['a']
+
+
+def _store(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), FakeEmbeddings(size=32))
+    store.add_texts([c[1] for c in CHUNKS], metadatas=[c[2] for c in CHUNKS], ids=[c[0] for c in CHUNKS])
+    return store
+
+
+class _CountingStore:
+    def __init__(self, store):
+        self.store = store
+        self.searches = 0
+
+    def similarity_search(self, query, k=4, filter=None):
+        self.searches += 1
+        return self.store.similarity_search(query, k=k, filter=filter)
+
+
+def test_index_from_store_reads_stored_text(tmp_path):
+    index = index_from_store(_store(tmp_path), version=(5, 5))
+    assert len(index) == len(CHUNKS) and index.version == (5, 5)
+    assert index.search('kubernetes')[0][1] == 'k8s'
+
+
+def test_retriever_modes(tmp_path):
+    store = _CountingStore(_store(tmp_path))
+    pool = VectorStorePool(lambda user_id: index_from_store(store.store))
+    retriever = HybridRetriever(pool, k=2)
+
+    assert [d.page_content for d in retriever.retrieve('alice', store, 'python django')] == [CHUNKS[1][1], CHUNKS[0][1]]
+    assert store.searches == 0
+    # no query term in any chunk: lexical falls back to vector search
+    assert len(retriever.retrieve('alice', store, 'haskell')) == 2
+    assert store.searches == 1
+    hybrid = retriever.retrieve('alice', store, 'python django', mode='hybrid')
+    assert len(hybrid) == 2 and CHUNKS[1][1] in [d.page_content for d in hybrid]
+    # a filter that leaves no more chunks than k returns them without searching
+    assert [d.page_content for d in retriever.retrieve('alice', store, 'x', where={'section': 'education'})] == \
+        [CHUNKS[3][1]]
+    stats = retriever.stats()
+    assert (stats['lexical'], stats['hybrid'], stats['lexical_fallbacks'], stats['small_store']) == (3, 1, 1, 1)
+
+
+def test_versioned_indexes_rebuild_when_the_data_moves(tmp_path):
+    store = _store(tmp_path)
+    versions = {'alice': (1, 1)}
+    indexes = VersionedIndexes(VectorStorePool(lambda user_id: index_from_store(store, versions[user_id])),
+                               lambda user_id: versions[user_id])
+    first = indexes.get('alice')
+    assert indexes.get('alice') is first
+
+    # another process (another handle on the directory) ingests a chunk and records it
+    NumpyVectorStore(str(tmp_path), FakeEmbeddings(size=32)).add_texts(['Rust systems programming'], ids=['rust'])
+    assert indexes.get('alice') is first
+    versions['alice'] = (2, 2)
+    assert indexes.get('alice').search('rust')[0][1] == 'rust'
+    assert indexes.stats()['rebuilds'] == 1
+
+
+def test_app_index_picks_up_another_process_ingest(kb):
+    import uuid
+
+    from langchain_core.documents import Document
+
+    user_id = uuid.uuid4().hex
+    kb._persist_chunks(user_id, [Document(page_content='Python developer', metadata={'section': 'skills'})])
+    kb.add_ingested_doc(user_id, 'resume.pdf', 'Python developer')
+    store = kb.vector_pool.get(user_id)
+    assert kb._retrieve(user_id, store, 'python')[0].page_content == 'Python developer'
+
+    # what an ingest in another process leaves behind: chunks in the store and a row, but no
+    # update to this process's index
+    store.add_documents([Document(page_content='Rust engineer', metadata={'section': 'skills'})])
+    kb.add_ingested_doc(user_id, 'resume2.pdf', 'Rust engineer')
+    assert 'Rust engineer' in [d.page_content for d in kb._retrieve(user_id, store, 'rust')]
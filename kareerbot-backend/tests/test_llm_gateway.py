@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_gateway import LLMGateway, TokenBucket, current_user
+
+
+class Transient(Exception):
+    code = 503
+
+
+def _run_concurrently(gateway, users, hold=0.05):
+    # -> highest number of calls seen running at once, overall and per user
+    lock = threading.Lock()
+    running = {'all': 0}
+    peaks = {'all': 0}
+
+    def work(user):
+        with lock:
+            running['all'] += 1
+            running[user] = running.get(user, 0) + 1
+            peaks['all'] = max(peaks['all'], running['all'])
+            peaks[user] = max(peaks.get(user, 0), running[user])
+        time.sleep(hold)
+        with lock:
+            running['all'] -= 1
+            running[user] -= 1
+
+    def caller(user):
+        current_user.set(user)
+        gateway.call(lambda: work(user))
+
+    threads = [threading.Thread(target=caller, args=(user,)) for user in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return peaks
+
+
+def test_per_user_cap():
+    gateway = LLMGateway('test', max_concurrency=16, per_user_concurrency=2)
+    peaks = _run_concurrently(gateway, ['alice'] * 6 + ['bob'] * 2)
+    assert peaks['alice'] == 2
+    assert peaks['bob'] == 2
+    assert gateway.stats()['active_users'] == 0
+
+
+def test_global_cap():
+    gateway = LLMGateway('test', max_concurrency=3, per_user_concurrency=0)
+    peaks = _run_concurrently(gateway, [f'user-{i}' for i in range(8)])
+    assert peaks['all'] == 3
+    stats = gateway.stats()
+    assert stats['calls'] == 8
+    assert stats['in_flight'] == 0
+
+
+def test_async_callers_share_the_cap():
+    gateway = LLMGateway('test', max_concurrency=2, per_user_concurrency=0)
+    running = peak = 0
+
+    async def work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    async def main():
+        await asyncio.gather(*(gateway.acall(work) for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+
+
+def test_identical_calls_coalesce():
+    gateway = LLMGateway('test')
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'answer'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(gateway.call(slow, key='k')))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(gateway.call(slow, key='k'))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while gateway.stats()['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join()
+    assert results == ['answer'] * 4
+    assert len(calls) == 1
+
+
+def test_async_calls_coalesce_and_share_errors():
+    gateway = LLMGateway('test', max_retries=0)
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        raise ValueError('bad prompt')
+
+    async def main():
+        return await asyncio.gather(*(gateway.acall(fail, key='k') for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(calls) == 1
+    # a finished call is not coalesced with the next one
+    with pytest.raises(ValueError):
+        asyncio.run(gateway.acall(fail, key='k'))
+    assert len(calls) == 2
+
+
+def test_retries_transient_errors_only():
+    gateway = LLMGateway('test', max_retries=3, backoff_base=0.001)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Transient()
+        return 'ok'
+
+    assert gateway.call(flaky) == 'ok'
+    assert gateway.stats()['retries'] == 2
+
+    def broken():
+        raise ValueError('not retryable')
+
+    with pytest.raises(ValueError):
+        gateway.call(broken)
+    assert gateway.stats()['retries'] == 2
+    assert gateway.stats()['failures'] == 1
+
+
+def test_gives_up_after_max_retries():
+    gateway = LLMGateway('test', max_retries=2, backoff_base=0.001)
+    attempts = []
+
+    def down():
+        attempts.append(1)
+        raise Transient()
+
+    with pytest.raises(Transient):
+        gateway.call(down)
+    assert len(attempts) == 3
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10.0, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # the third call waits for a token to refill at 10/s
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert TokenBucket(rate=0.0, burst=1).reserve() == 0.0
+
+
+def test_cancelled_follower_leaves_the_shared_call_alone():
+    gateway = LLMGateway('test')
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return 'answer'
+
+    async def main():
+        leader = asyncio.ensure_future(gateway.acall(slow, key='k'))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(gateway.acall(slow, key='k')) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        followers[0].cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+    leader, cancelled, *others = asyncio.run(main())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert [leader] + others == ['answer'] * 3
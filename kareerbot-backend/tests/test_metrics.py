@@ -0,0 +1,79 @@
+import asyncio
+
+from fake_llm import FakeStreamingChatModel
+from metrics import Metrics, current_route, percentile
+
+
+def _counters(metrics, name):
+    return {dict(labels).get('route'): value for (n, labels), value in metrics._counters.items() if n == name}
+
+
+def _model(metrics):
+    return FakeStreamingChatModel(callbacks=metrics.llm_callbacks())
+
+
+def test_stream_stopped_early_is_not_an_llm_error():
+    metrics = Metrics()
+    token = current_route.set('/api/agent-plan/stream')
+    try:
+        for _ in _model(metrics).stream('Make a plan'):
+            break
+    finally:
+        current_route.reset(token)
+    assert _counters(metrics, 'llm_errors_total') == {}
+    assert _counters(metrics, 'llm_streams_stopped_total') == {'/api/agent-plan/stream': 1}
+    assert any(name == 'llm_call_seconds' for name, _ in metrics._histograms)
+
+
+def test_async_stream_stopped_early_is_not_an_llm_error():
+    metrics = Metrics()
+
+    async def run():
+        current_route.set('/api/agent-plan/stream')
+        stream = _model(metrics).astream('Make a plan')
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert _counters(metrics, 'llm_errors_total') == {}
+    assert _counters(metrics, 'llm_streams_stopped_total') == {'/api/agent-plan/stream': 1}
+
+
+def test_finished_stream_records_usage():
+    metrics = Metrics()
+    list(_model(metrics).stream('Make a plan'))
+    assert _counters(metrics, 'llm_errors_total') == {}
+    assert {dict(labels)['kind'] for (name, labels) in metrics._counters if name == 'llm_tokens_total'} == \
+        {'input', 'output'}
+
+
+def test_model_failure_is_counted():
+    class Broken(FakeStreamingChatModel):
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            raise RuntimeError('quota')
+            yield
+
+    metrics = Metrics()
+    try:
+        list(Broken(callbacks=metrics.llm_callbacks()).stream('x'))
+    except RuntimeError:
+        pass
+    assert sum(_counters(metrics, 'llm_errors_total').values()) == 1
+
+
+def test_registered_counter_fields_are_exported_as_counters():
+    metrics = Metrics()
+    metrics.register_stats('cache', lambda: {'hits': 3, 'size': 7, 'routes': {'/api/x': {'disk_hits': 2, 'hit_rate': 0.5}}},
+                           counters=('hits', '*_hits'))
+    text = metrics.render()
+    assert '# TYPE kareerbot_cache_hits_total counter\nkareerbot_cache_hits_total 3' in text
+    assert '# TYPE kareerbot_cache_routes__api_x_disk_hits_total counter' in text
+    assert '# TYPE kareerbot_cache_size gauge\nkareerbot_cache_size 7' in text
+    assert '# TYPE kareerbot_cache_routes__api_x_hit_rate gauge' in text
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, pct) for pct in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7], 99) == 7 and percentile([], 50) == 0.0
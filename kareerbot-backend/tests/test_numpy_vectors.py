@@ -0,0 +1,109 @@
+import json
+import os
+
+import numpy as np
+
+from fake_llm import FakeEmbeddings
+from numpy_vectors import NumpyVectorStore, store_exists
+
+
+def _store(path):
+    return NumpyVectorStore(str(path), FakeEmbeddings(size=32))
+
+
+def test_writes_never_replace_a_mapped_file(tmp_path):
+    store = _store(tmp_path)
+    store.add_texts(['alpha', 'beta'])
+    snapshot = store._vectors
+    mapped = snapshot.filename
+    store.add_texts(['gamma'])
+    # the old mapping still reads the old generation; the new one is a different file
+    assert snapshot.shape[0] == 2 and np.all(np.isfinite(snapshot))
+    assert store._vectors.filename != mapped
+    assert len(_store(tmp_path)) == 3
+
+
+def test_old_generations_are_removed(tmp_path):
+    store = _store(tmp_path)
+    for text in ('one', 'two', 'three'):
+        store.add_texts([text])
+    assert sorted(os.listdir(tmp_path)) == ['CURRENT', 'LOCK', 'chunks.3.jsonl', 'vectors.3.npy']
+
+
+def test_search_and_delete(tmp_path):
+    store = _store(tmp_path)
+    ids = store.add_texts(['python developer', 'react developer'], metadatas=[{'section': 'skills'}, {}])
+    assert store.similarity_search('python developer', k=1)[0].page_content == 'python developer'
+    assert [d.page_content for d in store.similarity_search('x', k=5, filter={'section': 'skills'})] == \
+        ['python developer']
+    store.delete([ids[0]])
+    assert _store(tmp_path).get()['documents'] == ['react developer']
+    store.delete()
+    assert not store_exists(str(tmp_path))
+    assert os.listdir(tmp_path) == ['LOCK']
+
+
+def test_reads_stores_written_before_generations(tmp_path):
+    vectors = np.eye(2, 32, dtype=np.float32)
+    np.save(tmp_path / 'vectors.npy', vectors)
+    with open(tmp_path / 'chunks.jsonl', 'w', encoding='utf-8') as f:
+        for i in range(2):
+            f.write(json.dumps({'id': str(i), 'text': f'legacy {i}', 'metadata': {}}) + '\n')
+    assert store_exists(str(tmp_path))
+    store = _store(tmp_path)
+    assert len(store) == 2
+    store.add_texts(['new'])
+    assert 'vectors.npy' not in os.listdir(tmp_path)
+    assert len(_store(tmp_path)) == 3
+
+
+def test_writers_sharing_a_directory_keep_each_others_rows(tmp_path):
+    first, second = _store(tmp_path), _store(tmp_path)
+    first.add_texts(['first resume chunk'])
+    second.add_texts(['second resume chunk'])
+    first.add_texts(['third resume chunk'])
+    expected = ['first resume chunk', 'second resume chunk', 'third resume chunk']
+    assert _store(tmp_path).get()['documents'] == expected
+    # a handle that did not write sees the others' rows on its next read
+    assert second.get()['documents'] == expected
+    assert second.similarity_search('third resume chunk', k=1)[0].page_content == 'third resume chunk'
+
+
+def test_writers_in_other_processes_keep_each_others_rows(tmp_path):
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_add_many, args=(str(tmp_path), name)) for name in ('a', 'b')]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert sorted(_store(tmp_path).get()['documents']) == sorted(f'{name} {i}' for name in 'ab' for i in range(10))
+
+
+def _add_many(directory, name):
+    store = _store(directory)
+    for i in range(10):
+        store.add_texts([f'{name} {i}'])
+
+
+def test_opening_a_handle_while_another_writes(tmp_path):
+    import threading
+
+    writer = _store(tmp_path)
+    writer.add_texts(['seed'])
+    done = threading.Event()
+
+    def write():
+        for i in range(100):
+            writer.add_texts([f'row {i}'])
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        # each open may race a write that removes the generation it just read from CURRENT
+        while not done.is_set():
+            assert len(_store(tmp_path)) >= 1
+    finally:
+        thread.join()
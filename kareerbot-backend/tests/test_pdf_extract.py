@@ -0,0 +1,87 @@
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from conftest import make_pdf
+from pdf_extract import PdfExtractionError, PdfTextExtractor
+
+
+@pytest.fixture
+def extractor():
+    extractor = PdfTextExtractor(timeout=5, workers=1, cache_size=0)
+    yield extractor
+    if extractor._pool is not None:
+        extractor._discard_pool(extractor._pool)
+
+
+def test_small_document_is_extracted_in_a_worker(extractor, tmp_path):
+    path = tmp_path / 'cv.pdf'
+    path.write_bytes(make_pdf(['Resume of Ana', 'Skills Kotlin']))
+    assert extractor.extract(str(path)) == 'Resume of AnaSkills Kotlin'
+    assert extractor.stats()['parallel'] == 1
+
+
+def test_the_calling_process_never_parses_under_a_timeout(extractor, monkeypatch):
+    import pypdf
+
+    def stalled(*args, **kwargs):
+        raise AssertionError('pypdf ran in the calling process')
+
+    # a parser that would hang here, outside the deadline, fails the test instead
+    monkeypatch.setattr(pypdf, 'PdfReader', stalled)
+    extractor.max_pages = 1
+    with pytest.raises(PdfExtractionError) as e:
+        extractor.extract(make_pdf(['one', 'two']))
+    assert e.value.status == 413
+    assert extractor.extract(make_pdf(['counted in a worker'])) == 'counted in a worker'
+
+
+def test_large_documents_are_split_after_the_count():
+    extractor = PdfTextExtractor(timeout=10, workers=2, parallel_min_pages=3, cache_size=0)
+    try:
+        assert extractor.extract(make_pdf([f'p{i}' for i in range(5)])) == 'p0p1p2p3p4'
+        assert extractor.extract(make_pdf(['a', 'b'])) == 'ab'
+    finally:
+        extractor._discard_pool(extractor._pool)
+
+
+def test_timeout_kills_the_running_worker(extractor):
+    # a page stuck in its worker: occupy the only worker with a task that outlives the deadline
+    extractor.timeout = 0.5
+    pool = extractor._get_pool()
+    stuck = pool.submit(time.sleep, 60)
+    workers = list(pool._processes.values())
+    start = time.monotonic()
+    with pytest.raises(PdfExtractionError, match='timed out'):
+        extractor.extract(make_pdf(['slow']))
+    assert time.monotonic() - start < 5
+    assert extractor.stats()['timeouts'] == 1
+    assert extractor._pool is not pool
+    for process in workers:
+        process.join(5)
+        assert not process.is_alive()
+    # the executor's manager thread marks the killed task broken shortly after the kill
+    wait([stuck], timeout=5)
+    assert stuck.done()
+
+    # the next document gets a fresh pool
+    extractor.timeout = 30
+    assert extractor.extract(make_pdf(['after'])) == 'after'
+
+
+def test_document_on_a_killed_pool_retries_on_a_new_one(extractor):
+    pool = extractor._get_pool()
+    pool.submit(time.sleep, 0).result()
+    for process in list(pool._processes.values()):
+        process.kill()
+    assert extractor.extract(make_pdf(['survivor'])) == 'survivor'
+
+
+def test_page_and_size_limits(extractor):
+    extractor.max_pages = 2
+    with pytest.raises(PdfExtractionError) as e:
+        extractor.extract(make_pdf(['a', 'b', 'c']))
+    assert e.value.status == 413
+    with pytest.raises(PdfExtractionError, match='empty'):
+        extractor.extract(b'')
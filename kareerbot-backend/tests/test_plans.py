@@ -0,0 +1,66 @@
+PLAN = {'goal': 'Backend developer', 'plan': [{'step': 'Step 1', 'description': 'Learn SQL'}]}
+
+
+def _save(client, headers, plan=PLAN, if_match=None):
+    if if_match is not None:
+        headers = dict(headers, **{'If-Match': if_match})
+    return client.post('/api/save-plan', json={'plan': plan}, headers=headers)
+
+
+def test_save_and_load_carry_the_etag(client, auth_headers):
+    saved = _save(client, auth_headers)
+    assert saved.status_code == 200
+    etag = saved.get_json()['etag']
+    assert saved.headers['ETag'] == f'"{etag}"'
+
+    loaded = client.get('/api/load-plan', headers=auth_headers)
+    assert loaded.get_json()['plan'] == PLAN
+    assert loaded.headers['ETag'] == f'"{etag}"'
+
+
+def test_if_match_with_current_etag_saves(client, auth_headers):
+    first = _save(client, auth_headers).get_json()
+    second = _save(client, auth_headers, dict(PLAN, goal='Data engineer'), if_match=f'"{first["etag"]}"')
+    assert second.status_code == 200
+    assert second.get_json()['version'] == first['version'] + 1
+
+
+def test_stale_if_match_gets_412_with_the_current_version(client, auth_headers):
+    first = _save(client, auth_headers).get_json()
+    second = _save(client, auth_headers, dict(PLAN, goal='Data engineer'), if_match=f'"{first["etag"]}"').get_json()
+
+    stale = _save(client, auth_headers, dict(PLAN, goal='Lost update'), if_match=f'"{first["etag"]}"')
+    assert stale.status_code == 412
+    body = stale.get_json()
+    assert (body['version'], body['etag']) == (second['version'], second['etag'])
+    assert client.get('/api/load-plan', headers=auth_headers).get_json()['plan']['goal'] == 'Data engineer'
+
+
+def test_if_match_without_a_saved_plan_gets_412(client, auth_headers):
+    response = _save(client, auth_headers, if_match='"1-deadbeef"')
+    assert response.status_code == 412
+    assert response.get_json()['version'] is None
+
+
+def test_if_match_star_requires_an_existing_plan(client, auth_headers):
+    assert _save(client, auth_headers, if_match='*').status_code == 412
+    _save(client, auth_headers)
+    assert _save(client, auth_headers, if_match='*').status_code == 200
+
+
+def test_if_none_match_gets_304(client, auth_headers):
+    etag = _save(client, auth_headers).get_json()['etag']
+    headers = dict(auth_headers, **{'If-None-Match': f'"{etag}"'})
+    assert client.get('/api/load-plan', headers=headers).status_code == 304
+
+    _save(client, auth_headers, dict(PLAN, goal='Data engineer'))
+    assert client.get('/api/load-plan', headers=headers).status_code == 200
+
+
+def test_older_versions_stay_loadable(client, auth_headers):
+    first = _save(client, auth_headers).get_json()
+    _save(client, auth_headers, dict(PLAN, goal='Data engineer'))
+    old = client.get(f'/api/load-plan?version={first["version"]}', headers=auth_headers).get_json()
+    assert old['plan'] == PLAN
+    history = client.get('/api/plan-history', headers=auth_headers).get_json()['versions']
+    assert [v['version'] for v in history] == [first['version'] + 1, first['version']]
@@ -0,0 +1,93 @@
+def test_compare_profile_error_counts_docs_without_loading_them(kb, client, auth_headers, monkeypatch):
+    for text in ('Python developer', 'Go developer'):
+        client.post('/api/process-resume', json={'text': text}, headers=auth_headers)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('digest unavailable')
+
+    def must_not_load(*args, **kwargs):
+        raise AssertionError('loaded the whole history')
+
+    monkeypatch.setattr(kb, 'update_profile_digest', fail)
+    monkeypatch.setattr(kb, 'load_ingested_docs', must_not_load)
+    body = client.get('/api/compare-profile', headers=auth_headers).get_json()
+    assert body == {'analysis': {'error': 'digest unavailable'}, 'ingested_count': 2}
+
+
+def _user_with_docs(kb, *texts):
+    import uuid
+
+    user_id = uuid.uuid4().hex
+    for text in texts:
+        kb.add_ingested_doc(user_id, 'resume.pdf', text)
+    return user_id
+
+
+def test_digest_fold_holds_no_connection(kb, monkeypatch):
+    user_id = _user_with_docs(kb, 'Python developer')
+    checked_out = []
+    original = kb._fold_into_digest
+
+    def fold(summary, texts):
+        checked_out.append(kb.engine.pool.checkedout())
+        return original(summary, texts)
+
+    monkeypatch.setattr(kb, '_fold_into_digest', fold)
+    assert kb.update_profile_digest(user_id)['doc_count'] == 1
+    assert checked_out == [0]
+
+
+def test_first_digests_racing_insert_one_row(kb, monkeypatch):
+    import threading
+
+    user_id = _user_with_docs(kb, 'Python developer', 'Go developer')
+    both_read = threading.Barrier(2)
+    first_done = threading.Event()
+    original = kb._fold_into_digest
+
+    def fold(summary, texts):
+        # both callers found no digest; the second writes only after the first inserted it
+        if both_read.wait(5) == 1:
+            first_done.wait(5)
+        return original(summary, texts)
+
+    monkeypatch.setattr(kb, '_fold_into_digest', fold)
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(kb.update_profile_digest(user_id))
+        except Exception as e:
+            errors.append(e)
+        first_done.set()
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert [r['doc_count'] for r in results] == [2, 2]
+    with kb.SessionLocal() as db:
+        assert db.query(kb.ProfileDigest).filter(kb.ProfileDigest.user_id == user_id).count() == 1
+
+
+def test_digest_advanced_meanwhile_is_not_overwritten(kb, monkeypatch):
+    user_id = _user_with_docs(kb, 'Python developer')
+    kb.update_profile_digest(user_id)
+    kb.add_ingested_doc(user_id, 'resume2.pdf', 'Go developer')
+    original = kb._fold_into_digest
+    calls = []
+
+    def fold(summary, texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            # another request folds this doc and a newer one first
+            kb.add_ingested_doc(user_id, 'resume3.pdf', 'Rust developer')
+            monkeypatch.setattr(kb, '_fold_into_digest', original)
+            kb.update_profile_digest(user_id)
+            monkeypatch.setattr(kb, '_fold_into_digest', fold)
+        return original(summary, texts)
+
+    monkeypatch.setattr(kb, '_fold_into_digest', fold)
+    assert kb.update_profile_digest(user_id)['doc_count'] == 3
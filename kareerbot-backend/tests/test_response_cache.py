@@ -0,0 +1,83 @@
+import time
+
+from response_cache import MemoryTier, ResponseCache, SQLiteTier, make_cache_key
+
+
+def test_keys_ignore_whitespace_and_case_but_not_template_or_model():
+    key = make_cache_key('plan-v1', 'gemini', goal='Become a Data Scientist ')
+    assert key == make_cache_key('plan-v1', 'gemini', goal='  become a   data scientist')
+    assert key != make_cache_key('plan-v2', 'gemini', goal='become a data scientist')
+    assert key != make_cache_key('plan-v1', 'other-model', goal='become a data scientist')
+    assert make_cache_key('v1', 'm', a='x', b='y') == make_cache_key('v1', 'm', b='y', a='x')
+
+
+def test_scope_separates_users_and_is_not_normalised():
+    alice = make_cache_key('feedback-v1', 'gemini', scope='alice', resume_text='Python developer')
+    assert alice != make_cache_key('feedback-v1', 'gemini', scope='bob', resume_text='Python developer')
+    assert alice != make_cache_key('feedback-v1', 'gemini', scope='Alice', resume_text='Python developer')
+    assert alice != make_cache_key('feedback-v1', 'gemini', resume_text='Python developer')
+
+
+def test_entries_expire_in_every_tier(tmp_path):
+    cache = ResponseCache([MemoryTier(), SQLiteTier(str(tmp_path / 'cache.db'))])
+    cache.set('k', {'plan': 1}, ttl=0.1)
+    assert cache.get('plan', 'k') == {'plan': 1}
+    time.sleep(0.15)
+    assert cache.get('plan', 'k') is None
+    assert cache.stats()['tiers'] == {'memory': 0, 'sqlite': 0}
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    tier = MemoryTier(max_entries=2)
+    forever = time.time() + 60
+    tier.set('a', 1, forever)
+    tier.set('b', 2, forever)
+    tier.get('a')
+    tier.set('c', 3, forever)
+    assert tier.get('b') is None and tier.get('a') == (forever, 1) and len(tier) == 2
+
+
+def test_sqlite_hits_are_promoted_and_counted(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache([SQLiteTier(path)]).set('k', 'shared')
+    # another process on the host: empty memory, same SQLite file
+    memory = MemoryTier()
+    cache = ResponseCache([memory, SQLiteTier(path)])
+    assert cache.get('plan', 'k') == 'shared' and len(memory) == 1
+    assert cache.get('plan', 'k') == 'shared'
+    assert cache.stats()['routes']['plan'] == {'hits': 2, 'misses': 0, 'sqlite_hits': 1, 'memory_hits': 1,
+                                               'hit_rate': 1.0}
+
+
+def test_resume_feedback_is_never_served_to_another_user(kb, monkeypatch):
+    calls = []
+
+    def generate(resume_text):
+        calls.append(resume_text)
+        return {'strengths': [f'answer {len(calls)}'], 'improvements': []}
+
+    monkeypatch.setattr(kb, '_generate_resume_feedback', generate)
+    text = 'Identical resume text for the cache isolation test'
+    alice = kb.get_resume_feedback('alice', text)
+    assert kb.get_resume_feedback('alice', text) == alice and len(calls) == 1
+    assert kb.get_resume_feedback('bob', text) != alice and len(calls) == 2
+
+
+def test_predictions_are_scoped_to_the_caller(kb, client, monkeypatch):
+    import uuid
+
+    calls = []
+
+    def generate(resume_text, goal):
+        calls.append(goal)
+        return {'probability': len(calls)}
+
+    monkeypatch.setattr(kb, '_generate_prediction', generate)
+    body = {'resumeText': 'Shared resume for prediction isolation', 'goal': 'data scientist'}
+    alice, bob = ({'Authorization': 'Bearer ' + client.post('/api/register', json={
+        'contact': f'{uuid.uuid4().hex}@test', 'password': 'pw'}).get_json()['token']} for _ in range(2))
+    first = client.post('/api/predict-success', json=body, headers=alice)
+    again = client.post('/api/predict-success', json=body, headers=alice)
+    other = client.post('/api/predict-success', json=body, headers=bob)
+    assert first.get_json() == again.get_json() != other.get_json()
+    assert len(calls) == 2
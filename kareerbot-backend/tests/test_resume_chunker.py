@@ -0,0 +1,93 @@
+from resume_chunker import ResumeChunker, count_tokens, section_of, split_entries, split_sections
+
+RESUME = """Jane Doe
+jane@example.com | +44 7700 900000
+
+PROFESSIONAL SUMMARY
+Backend engineer with six years of Python and distributed systems.
+
+Work Experience
+Senior Engineer, Acme (2019-2022)
+- Cut p99 latency of the billing service by 40% with Redis
+- Led the migration of the ledger pipeline to Kafka
+Engineer, Globex (2016-2019)
+• Built the search API used by 12 internal teams
+
+Skills: Python, SQL, Docker, Kubernetes
+
+EDUCATION
+BSc Computer Science, University of Leeds (2012-2016)
+
+OPEN SOURCE
+Maintainer of a small Flask extension
+"""
+
+
+def test_section_headers():
+    assert section_of('WORK EXPERIENCE')[:2] == ('experience', 'WORK EXPERIENCE')
+    assert section_of('## Skills & Tools:')[0] == 'skills'
+    assert section_of('Skills: Python, SQL') == ('skills', 'Skills', 'Python, SQL')
+    assert section_of('Led the migration of the ledger pipeline') is None
+    # an unknown ALL-CAPS line is a heading only after a real section
+    assert section_of('JANE DOE') is None
+    assert section_of('OPEN SOURCE', seen_known=True)[0] == 'other'
+
+
+def test_split_sections():
+    sections = split_sections(RESUME)
+    assert [s[0] for s in sections] == ['header', 'summary', 'experience', 'skills', 'education', 'other']
+    assert sections[3][2] == ['Python, SQL, Docker, Kubernetes', '']
+
+
+def test_split_entries_groups_bullets_under_their_heading():
+    lines = ['Senior Engineer, Acme', '- Cut latency by 40%', 'with Redis', 'Engineer, Globex', '- Built search']
+    assert split_entries(lines) == [(['Senior Engineer, Acme'], ['Cut latency by 40% with Redis']),
+                                    (['Engineer, Globex'], ['Built search'])]
+
+
+def test_chunks_keep_sections_apart_and_carry_metadata():
+    chunks = ResumeChunker(max_tokens=256).split_text(RESUME)
+    assert [meta['section'] for _, meta in chunks] == ['header', 'summary', 'experience', 'skills', 'education',
+                                                       'other']
+    text, meta = chunks[2]
+    assert meta['section_title'] == 'Work Experience' and text.startswith('Work Experience\n')
+    assert '- Led the migration of the ledger pipeline to Kafka' in text and 'Globex' in text
+
+
+def test_long_entries_split_between_bullets_and_repeat_the_heading():
+    bullets = '\n'.join(f'- Shipped feature number {i} of the billing platform on time' for i in range(12))
+    text = f'Experience\nSenior Engineer, Acme (2019-2022)\n{bullets}\n'
+    chunker = ResumeChunker(max_tokens=40)
+    chunks = [chunk for chunk, _ in chunker.split_text(text)]
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert count_tokens(chunk) <= chunker.max_tokens
+        assert chunk.startswith('Experience\nSenior Engineer, Acme (2019-2022)\n')
+    # every bullet lands whole in exactly one chunk
+    for i in range(12):
+        bullet = f'- Shipped feature number {i} of the billing platform on time'
+        assert sum(bullet in chunk for chunk in chunks) == 1
+
+
+def test_an_oversized_bullet_is_windowed_with_overlap():
+    words = [f'w{i}' for i in range(100)]
+    chunker = ResumeChunker(max_tokens=30, overlap_tokens=5)
+    chunks = [chunk for chunk, _ in chunker.split_text('Summary\n' + ' '.join(words))]
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= chunker.max_tokens for chunk in chunks)
+    pieces = [chunk.split('\n', 1)[1].split() for chunk in chunks]
+    assert pieces[0][0] == 'w0' and pieces[-1][-1] == 'w99'
+    for previous, following in zip(pieces, pieces[1:]):
+        start = previous.index(following[0])
+        assert 1 <= len(previous) - start <= chunker.overlap_tokens
+    assert {w for piece in pieces for w in piece} == set(words)
+
+
+def test_overlap_is_capped_at_a_quarter_of_the_chunk():
+    assert ResumeChunker(max_tokens=40, overlap_tokens=100).overlap_tokens == 10
+
+
+def test_chunk_documents_number_the_chunks():
+    docs = ResumeChunker().chunk(RESUME, metadata={'source': 'resume.pdf'})
+    assert [d.metadata['chunk'] for d in docs] == list(range(len(docs)))
+    assert all(d.metadata['source'] == 'resume.pdf' for d in docs)
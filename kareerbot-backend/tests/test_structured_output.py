@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from structured_output import (SchemaError, StructuredOutput, StructuredOutputError, conform, json_candidates,
+                               parse_json, repair_json)
+
+PLAN_SCHEMA = {
+    'type': 'object',
+    'required': ['goal', 'plan'],
+    'properties': {
+        'goal': {'type': 'string'},
+        'plan': {'type': 'array', 'minItems': 1, 'items': {'type': 'object', 'required': ['step']}},
+    },
+}
+
+
+@pytest.mark.parametrize('broken, expected', [
+    ('{"a": 1, "b": [1, 2,],}', {'a': 1, 'b': [1, 2]}),
+    ("{'a': 'x', 'b': True, 'c': None}", {'a': 'x', 'b': True, 'c': None}),
+    ('{a: 1, // note\n b: /* x */ 2}', {'a': 1, 'b': 2}),
+    ('{“a”: “x”}', {'a': 'x'}),
+    ('{"quote": "she said "hi" to me"}', {'quote': 'she said "hi" to me'}),
+    ('{"text": "line one\nline two"}', {'text': 'line one\nline two'}),
+    ('{"plan": [{"step": "one"}, {"step": "tw', {'plan': [{'step': 'one'}, {'step': 'tw'}]}),
+    ('{"a": {"b": 1,', {'a': {'b': 1}}),
+    ('{"a":', {'a': None}),
+    ('{"a": 1}]', {'a': 1}),
+])
+def test_repair_json(broken, expected):
+    assert json.loads(repair_json(broken)) == expected
+
+
+def test_repair_leaves_valid_json_alone():
+    text = '{"a": [1, 2.5, "x, y"], "b": {"c": null}}'
+    assert json.loads(repair_json(text)) == json.loads(text)
+
+
+def test_candidates_skip_prose_and_fences():
+    text = 'Here you go:\n```json\n{"a": "}"}\n```\nand also {"b": 2}'
+    assert json_candidates(text, '{')[:2] == ['{"a": "}"}', '{"b": 2}']
+
+
+def test_conform_coerces_unambiguous_values():
+    schema = {'type': 'object', 'properties': {
+        'score': {'type': 'integer', 'minimum': 0, 'maximum': 100},
+        'skills': {'type': 'array', 'items': {'type': 'string'}},
+    }}
+    assert conform({'score': '85%', 'skills': 'Python'}, schema) == {'score': 85, 'skills': ['Python']}
+
+
+@pytest.mark.parametrize('value, message', [
+    ({'goal': 'x'}, "missing required field 'plan'"),
+    ({'goal': 'x', 'plan': []}, 'expected at least 1 items'),
+    ({'goal': 1, 'plan': [{'step': 'a'}]}, '$.goal: expected string'),
+    ({'goal': 'x', 'plan': [{}]}, "$.plan[0]: missing required field 'step'"),
+])
+def test_conform_rejects(value, message):
+    with pytest.raises(SchemaError, match=message.replace('$', r'\$').replace('[', r'\[').replace(']', r'\]')):
+        conform(value, PLAN_SCHEMA)
+
+
+def test_conform_bounds_and_booleans():
+    with pytest.raises(SchemaError):
+        conform(101, {'type': 'integer', 'maximum': 100})
+    with pytest.raises(SchemaError):
+        conform(True, {'type': 'number'})
+
+
+def test_parse_json_reports_how():
+    assert parse_json('{"goal": "x", "plan": [{"step": "a"}]}', PLAN_SCHEMA)[1] == 'parsed'
+    value, how = parse_json("Sure! {'goal': 'x', 'plan': [{'step': 'a'},]}", PLAN_SCHEMA)
+    assert how == 'repaired'
+    assert value == {'goal': 'x', 'plan': [{'step': 'a'}]}
+    with pytest.raises(StructuredOutputError):
+        parse_json('no json here', PLAN_SCHEMA)
+
+
+class _Answer:
+    def __init__(self, content):
+        self.content = content
+
+
+class _FixModel:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return _Answer(self.answer)
+
+
+def test_recover_asks_for_a_fix_once():
+    structured = StructuredOutput(fix_attempts=1)
+    model = _FixModel('{"goal": "x", "plan": [{"step": "a"}]}')
+    assert structured.recover('/api/plan', '{"goal": "x"}', PLAN_SCHEMA, model)['plan'] == [{'step': 'a'}]
+    assert len(model.prompts) == 1
+    assert "missing required field 'plan'" in model.prompts[0]
+
+    with pytest.raises(StructuredOutputError):
+        structured.recover('/api/plan', '{"goal": "x"}', PLAN_SCHEMA, _FixModel('still not a plan'))
+    counts = structured.stats()['routes']['/api/plan']
+    assert (counts['fixed'], counts['failed'], counts['fix_calls']) == (1, 1, 2)
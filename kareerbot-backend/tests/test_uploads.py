@@ -0,0 +1,132 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from conftest import make_pdf
+from uploads import DOCX_MIMETYPE, PDF_MIMETYPE, UploadError, UploadStore
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _docx():
+    return _zip({'[Content_Types].xml': '<Types/>', 'word/document.xml': '<w:document/>'})
+
+
+def test_type_comes_from_the_bytes(tmp_path):
+    store = UploadStore(str(tmp_path))
+    assert store.save(io.BytesIO(make_pdf(['cv'])), 'cv.txt').mimetype == PDF_MIMETYPE
+    assert store.save(io.BytesIO(_docx()), 'cv.pdf').mimetype == DOCX_MIMETYPE
+    assert store.save(io.BytesIO(b'not a pdf'), 'cv.pdf').mimetype is None
+
+
+def test_uploads_are_content_addressed(tmp_path):
+    store = UploadStore(str(tmp_path))
+    first = store.save(io.BytesIO(make_pdf(['same'])), 'a.pdf')
+    second = store.save(io.BytesIO(make_pdf(['same'])), 'b.pdf')
+    assert first.path == second.path == str(tmp_path / first.sha256)
+    assert (first.is_new, second.is_new) == (True, False)
+    assert os.listdir(tmp_path) == [first.sha256]
+    assert store.stats()['deduplicated'] == 1
+
+
+def test_oversized_upload_is_cut_off(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=1024)
+    with pytest.raises(UploadError) as e:
+        store.save(io.BytesIO(b'%PDF-' + b'x' * 4096), 'big.pdf')
+    assert e.value.status == 413
+    assert os.listdir(tmp_path) == []  # no .part file left behind
+
+
+def _post_bulk(client, headers, files):
+    return client.post('/api/process-resumes', data={'files': files}, headers=headers,
+                       content_type='multipart/form-data')
+
+
+def test_bulk_rejects_too_many_zip_members_before_extracting(kb, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(kb, 'BULK_MAX_FILES', 3)
+    existing = kb.upload_store.save(io.BytesIO(make_pdf(['already stored'])), 'old.pdf')
+    before = set(os.listdir(kb.UPLOAD_DIR))
+    archive = _zip({f'cv{i}.pdf': make_pdf([f'candidate {i}']) for i in range(2)} |
+                   {'old.pdf': make_pdf(['already stored']), 'cv9.pdf': make_pdf(['one too many'])})
+    response = _post_bulk(client, auth_headers, [(io.BytesIO(archive), 'batch.zip', 'application/zip')])
+    assert response.status_code == 413
+    assert set(os.listdir(kb.UPLOAD_DIR)) == before
+    assert os.path.exists(existing.path)
+
+
+def test_bulk_discards_what_it_stored_when_a_later_archive_overflows(kb, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(kb, 'BULK_MAX_FILES', 3)
+    before = set(os.listdir(kb.UPLOAD_DIR)) if os.path.isdir(kb.UPLOAD_DIR) else set()
+    files = [(io.BytesIO(make_pdf(['first upload'])), 'a.pdf', 'application/pdf'),
+             (io.BytesIO(_zip({f'z{i}.pdf': make_pdf([f'zipped {i}']) for i in range(3)})), 'z.zip', 'application/zip')]
+    response = _post_bulk(client, auth_headers, files)
+    assert response.status_code == 413
+    assert set(os.listdir(kb.UPLOAD_DIR)) == before
+
+
+def test_bulk_sniffs_types_and_rejects_oversized_members(kb, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(kb.upload_store, 'max_bytes', 64 * 1024)
+    archive = _zip({'ok.pdf': make_pdf(['Resume of Ann']), 'notes.txt': 'hi',
+                    'bomb.pdf': b'%PDF-' + b'\0' * (1024 * 1024)})
+    response = _post_bulk(client, auth_headers, [(io.BytesIO(archive), 'b.zip', 'application/octet-stream')])
+    import json
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    by_source = {line.get('source'): line for line in lines}
+    assert by_source['ok.pdf']['status'] == 'ok'
+    assert by_source['notes.txt']['error'] == 'Unsupported file type'
+    assert by_source['bomb.pdf']['error'] == 'File is too large'
+
+
+def _counting(kb, monkeypatch):
+    calls = {'parse': 0, 'feedback': 0}
+    parse, feedback = kb.parse_resume_file, kb._generate_resume_feedback
+
+    def counted_parse(*args, **kwargs):
+        calls['parse'] += 1
+        return parse(*args, **kwargs)
+
+    def counted_feedback(resume_text):
+        calls['feedback'] += 1
+        return feedback(resume_text)
+
+    monkeypatch.setattr(kb, 'parse_resume_file', counted_parse)
+    monkeypatch.setattr(kb, '_generate_resume_feedback', counted_feedback)
+    return calls
+
+
+def test_identical_reupload_skips_ingest(kb, monkeypatch):
+    import uuid
+
+    calls = _counting(kb, monkeypatch)
+    user_id = uuid.uuid4().hex
+    pdf = make_pdf([f'Resume {user_id} Python developer'])
+    first = kb.ingest_resume(user_id, 'cv.pdf', upload=kb.upload_store.save(io.BytesIO(pdf), 'cv.pdf'))
+    version = kb.ingested_docs_version(user_id)
+    again = kb.ingest_resume(user_id, 'cv-copy.pdf', upload=kb.upload_store.save(io.BytesIO(pdf), 'cv-copy.pdf'))
+    assert calls == {'parse': 1, 'feedback': 1}
+    assert again['note'] == 'duplicate' and again['feedback'] == first['feedback']
+    assert kb.ingested_docs_version(user_id) == version
+
+
+def test_identical_files_from_different_users_stay_separate(kb, monkeypatch):
+    import uuid
+
+    calls = _counting(kb, monkeypatch)
+    alice, bob = uuid.uuid4().hex, uuid.uuid4().hex
+    pdf = make_pdf([f'Shared resume {alice} React developer'])
+    kb.ingest_resume(alice, 'cv.pdf', upload=kb.upload_store.save(io.BytesIO(pdf), 'cv.pdf'))
+    result = kb.ingest_resume(bob, 'cv.pdf', upload=kb.upload_store.save(io.BytesIO(pdf), 'cv.pdf'))
+    # bob's copy is ingested for bob, not answered from alice's row
+    assert 'note' not in result
+    assert calls == {'parse': 2, 'feedback': 2}
+    assert kb.ingested_docs_version(alice)[0] == kb.ingested_docs_version(bob)[0] == 1
+    for user_id in (alice, bob):
+        assert kb.vector_pool.get(user_id).get()['documents']
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from vector_backends import PerUserChromaBackend, SharedChromaBackend, _has_user_dirs, vector_backend_from_env
+
+REPO_CHROMA_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'chroma_db')
+SEGMENT = '5f731062-a08b-4c5e-bd1d-f97625d75945'
+
+
+def _legacy_global_store(root):
+    # a Chroma store persisted at the root: chroma.sqlite3 plus a UUID segment directory
+    os.makedirs(os.path.join(root, SEGMENT))
+    open(os.path.join(root, 'chroma.sqlite3'), 'wb').close()
+    open(os.path.join(root, SEGMENT, 'header.bin'), 'wb').close()
+
+
+def _user_store(root, user_id):
+    os.makedirs(os.path.join(root, user_id))
+    open(os.path.join(root, user_id, 'chroma.sqlite3'), 'wb').close()
+
+
+def test_segment_directories_are_not_users(tmp_path):
+    root = str(tmp_path)
+    _legacy_global_store(root)
+    assert not _has_user_dirs(root)
+    assert PerUserChromaBackend(root, None).users() == []
+    assert not PerUserChromaBackend(root, None).exists(SEGMENT)
+    assert isinstance(vector_backend_from_env({}, root, None), SharedChromaBackend)
+
+
+def test_repo_chroma_db_is_not_a_per_user_layout():
+    assert not _has_user_dirs(REPO_CHROMA_DB)
+
+
+def test_user_directories_select_per_user(tmp_path):
+    root = str(tmp_path)
+    _legacy_global_store(root)
+    _user_store(root, '7')
+    os.makedirs(os.path.join(root, 'empty-dir'))
+    backend = vector_backend_from_env({}, root, None)
+    assert isinstance(backend, PerUserChromaBackend)
+    assert backend.users() == ['7']
+    assert backend.exists('7') and not backend.exists('empty-dir')
+
+
+def test_auto_avoids_local_shards_when_several_processes_share_them(tmp_path, capsys):
+    from vector_backends import NumpyVectorBackend
+
+    root = str(tmp_path)
+    for env in ({'INGEST_WORKERS': '0'}, {'WEB_CONCURRENCY': '4'}):
+        assert isinstance(vector_backend_from_env(env, root, None), NumpyVectorBackend)
+    server = vector_backend_from_env({'INGEST_WORKERS': '0', 'CHROMA_HOST': 'chroma'}, root, None)
+    assert isinstance(server, SharedChromaBackend) and server.stats()['server']
+
+    os.makedirs(os.path.join(root, '_shared'))
+    with pytest.raises(RuntimeError, match='CHROMA_HOST'):
+        vector_backend_from_env({'INGEST_WORKERS': '0'}, root, None)
+    vector_backend_from_env({'INGEST_WORKERS': '0', 'VECTOR_BACKEND': 'shared'}, root, None)
+    assert 'only sees the chunks it wrote itself' in capsys.readouterr().out
+
+
+def test_server_shards_share_one_layout(tmp_path):
+    import chromadb
+
+    from fake_llm import FakeEmbeddings
+
+    client = chromadb.EphemeralClient()
+    embeddings = lambda: FakeEmbeddings(size=32)
+    first = SharedChromaBackend(str(tmp_path), embeddings, shards=4, client_factory=lambda: client)
+    first.open('alice').add_texts(['first resume chunk'])
+    # a process started with another VECTOR_SHARDS still finds alice's shard
+    second = SharedChromaBackend(str(tmp_path), embeddings, shards=8, client_factory=lambda: client)
+    second.open('alice').add_texts(['second resume chunk'])
+    assert second.shards == 4
+    found = first.open('alice').similarity_search('resume', k=5)
+    assert sorted(doc.page_content for doc in found) == ['first resume chunk', 'second resume chunk']
+    assert not os.path.exists(os.path.join(str(tmp_path), '_shared'))
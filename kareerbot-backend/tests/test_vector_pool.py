@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from vector_pool import VectorStorePool
+
+
+class _Factory:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.opened = []
+
+    def __call__(self, user_id):
+        time.sleep(self.delay)
+        self.opened.append(user_id)
+        if self.fail:
+            raise RuntimeError('store is corrupt')
+        return object()
+
+
+def test_concurrent_misses_open_once():
+    factory = _Factory(delay=0.1)
+    pool = VectorStorePool(factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get('alice'))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert factory.opened == ['alice'] and len(set(map(id, results))) == 1
+    assert (pool.stats()['misses'], pool.stats()['hits']) == (1, 7)
+
+
+def test_open_locks_do_not_outlive_the_open():
+    pool = VectorStorePool(_Factory(), max_size=1000)
+    for i in range(100):
+        pool.get(f'user-{i}')
+    assert pool._open_locks == {}
+    failing = VectorStorePool(_Factory(fail=True))
+    with pytest.raises(RuntimeError):
+        failing.get('alice')
+    assert failing._open_locks == {} and failing.stats()['size'] == 0
+
+
+def test_lru_eviction_and_idle_expiry():
+    pool = VectorStorePool(_Factory(), max_size=2, idle_timeout=0.1)
+    first = pool.get('a')
+    pool.get('b')
+    assert pool.get('a') is first
+    pool.get('c')
+    assert pool.stats()['evictions'] == 1 and pool.get('a') is first
+    time.sleep(0.15)
+    assert pool.get('a') is not first
+    assert pool.stats()['expirations'] == 2
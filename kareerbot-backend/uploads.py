@@ -0,0 +1,151 @@
+# uploads.py
+# Upload intake for resume files.
+#
+# An upload is copied from the request stream to a temp file inside the uploads directory
+# in fixed-size blocks, hashed on the way and cut off with a 413 as soon as it passes
+# max_bytes, so neither a large nor a lying upload is ever held in memory. The type comes
+# from the file's leading bytes (and, for zip containers, the member names), never from the
+# client's Content-Type or file name. The finished file is renamed to uploads/<sha256>:
+# identical uploads share one copy, and a document can be parsed again from its stored
+# original (ingested_docs.file_hash) without asking the user to upload it again.
+
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+
+PDF_MIMETYPE = 'application/pdf'
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+ZIP_MIMETYPE = 'application/zip'
+
+BLOCK_SIZE = 64 * 1024
+SNIFF_BYTES = 1024  # PDF readers accept the %PDF- header anywhere in the first 1 KB
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class StoredUpload:
+    __slots__ = ('path', 'sha256', 'size', 'mimetype', 'filename', 'is_new')
+
+    def __init__(self, path, sha256, size, mimetype, filename=None, is_new=False):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.mimetype = mimetype  # sniffed; None when the type is not recognised
+        self.filename = filename
+        self.is_new = is_new      # written by this save, not an existing copy it matched
+
+
+def sniff_mimetype(head, path=None):
+    if b'%PDF-' in head[:SNIFF_BYTES]:
+        return PDF_MIMETYPE
+    if head.startswith((b'PK\x03\x04', b'PK\x05\x06')) and path is not None:
+        # only the central directory is read, not the members
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return None
+        return DOCX_MIMETYPE if 'word/document.xml' in names else ZIP_MIMETYPE
+    return None
+
+
+def copy_capped(source, target, max_bytes, digest=None):
+    # -> (bytes copied, first SNIFF_BYTES); UploadError 413 once more than max_bytes arrive
+    size = 0
+    head = b''
+    while True:
+        block = source.read(BLOCK_SIZE)
+        if not block:
+            return size, head
+        size += len(block)
+        if size > max_bytes:
+            raise UploadError(f"File is larger than {max_bytes / (1024 * 1024):.3g} MB", 413)
+        if len(head) < SNIFF_BYTES:
+            head += block[:SNIFF_BYTES - len(head)]
+        if digest is not None:
+            digest.update(block)
+        target.write(block)
+
+
+class UploadStore:
+    def __init__(self, directory, max_bytes=10 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'stored': 0, 'deduplicated': 0, 'rejected': 0, 'discarded': 0, 'bytes': 0}
+
+    def path_for(self, sha256):
+        return os.path.join(self.directory, sha256)
+
+    def save(self, stream, filename=None, max_bytes=None):
+        # stream: any object with read(n), e.g. a Werkzeug FileStorage or a zip member
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                size, head = copy_capped(stream, out, max_bytes or self.max_bytes, digest)
+            if not size:
+                raise UploadError("Uploaded file is empty", 400)
+            mimetype = sniff_mimetype(head, tmp_path)
+            path = self.path_for(digest.hexdigest())
+            is_new = not os.path.exists(path)
+            if is_new:
+                os.replace(tmp_path, path)
+                self._count('stored', size)
+            else:
+                os.remove(tmp_path)
+                self._count('deduplicated')
+        except BaseException as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if isinstance(e, UploadError):
+                self._count('rejected')
+            raise
+        return StoredUpload(path, digest.hexdigest(), size, mimetype, filename, is_new)
+
+    def get(self, sha256, filename=None):
+        # a stored original by its hash, e.g. to parse it again; None once it is gone
+        path = self.path_for(sha256)
+        if not os.path.exists(path):
+            return None
+        return self.load(path, filename)
+
+    def load(self, path, filename=None, sha256=None):
+        with open(path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+        return StoredUpload(path, sha256 or os.path.basename(path), os.path.getsize(path),
+                            sniff_mimetype(head, path), filename)
+
+    def discard(self, upload):
+        # for uploads that turn out unusable; identical bytes would be unusable too
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+            self._count('discarded')
+
+    def spool(self, stream, max_bytes=None):
+        # A capped anonymous temp file for inputs that are not stored themselves (zip archives)
+        spooled = tempfile.TemporaryFile(dir=self.directory if os.path.isdir(self.directory) else None)
+        try:
+            copy_capped(stream, spooled, max_bytes or self.max_bytes)
+        except BaseException:
+            spooled.close()
+            self._count('rejected')
+            raise
+        spooled.seek(0)
+        return spooled
+
+    def _count(self, field, size=0):
+        with self._lock:
+            self._stats[field] += 1
+            self._stats['bytes'] += size
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,365 @@
+# vector_backends.py
+# Where users' resume chunks live. The app only talks to a backend: exists(user_id),
+# open(user_id) -> store, rebuild(user_id, documents) -> store, users().
+#
+#   per-user  - the original layout: one Chroma persist directory per user under
+#               chroma_db/<user_id>. Kept for existing deployments.
+#   shared    - a fixed number of Chroma collections under chroma_db/_shared/shard-NN;
+#               a user always lands in the same shard (hash of the user id) and every
+#               chunk carries a user_id metadata field that all reads filter on. Tens of
+#               thousands of users cost a handful of SQLite files and HNSW indexes, and
+#               the shards stay open for the life of the process. With CHROMA_HOST set
+#               the shards are collections <name>-NN on a Chroma server instead.
+#   numpy     - one memory-mapped float32 array per user under chroma_db/_numpy/<user_id>,
+#               searched exactly with a single matmul (numpy_vectors.py). No SQLite and no
+#               HNSW, for deployments whose users hold tens of chunks, not thousands.
+#
+# VECTOR_BACKEND=auto (the default) picks shared, unless chroma_db already holds per-user
+# directories and no shared shards: those deployments stay on per-user until
+# migrate_vectors.py has merged them. A process keeps its open local shards' indexes in
+# memory and never sees what another process wrote to them, and Chroma does not support
+# two processes writing one store; so when ingestion or serving is spread over processes
+# (INGEST_WORKERS=0 with ingest_worker.py, or WEB_CONCURRENCY > 1) auto only picks shared
+# with a Chroma server, and otherwise numpy, whose writes are safe across processes.
+#
+# A per-user directory is one holding its own chroma.sqlite3; the UUID-named segment
+# directories of a Chroma store persisted at the root itself (the old global store) are
+# not users.
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+BACKENDS = ('auto', 'per-user', 'shared', 'numpy')
+SHARED_DIR = '_shared'
+NUMPY_DIR = '_numpy'
+USER_FIELD = 'user_id'
+CHROMA_DB_FILE = 'chroma.sqlite3'
+_SEGMENT_DIR = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def _is_user_store(root, name):
+    return not name.startswith('_') and not _SEGMENT_DIR.match(name) and \
+        os.path.isfile(os.path.join(root, name, CHROMA_DB_FILE))
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _no_timer(stage):
+    return _NoTimer()
+
+
+class PerUserChromaBackend:
+    name = 'per-user'
+
+    def __init__(self, root, embedding_function, timer=None):
+        # embedding_function() -> embeddings, called when a store is opened
+        self.root = root
+        self.embedding_function = embedding_function
+        self.timer = timer or _no_timer
+
+    def _dir(self, user_id):
+        return os.path.join(self.root, user_id)
+
+    def exists(self, user_id):
+        return _is_user_store(self.root, user_id)
+
+    def open(self, user_id):
+        from langchain_community.vectorstores import Chroma
+
+        user_dir = self._dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        with self.timer('chroma_open'):
+            return Chroma(persist_directory=user_dir, embedding_function=self.embedding_function())
+
+    def rebuild(self, user_id, documents):
+        # last resort when appending to an open store failed: reopen the directory from scratch
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma.from_documents(documents=documents, embedding=self.embedding_function(),
+                                     persist_directory=self._dir(user_id))
+
+    def users(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if _is_user_store(self.root, name))
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class UserScopedStore:
+    # One user's slice of a shared collection. Implements the part of the Chroma store API
+    # the app uses; every write stamps user_id and every read filters on it.
+
+    def __init__(self, store, user_id, on_add=None):
+        self._store = store
+        self.user_id = user_id
+        self._on_add = on_add
+
+    def _where(self, where=None):
+        scope = {USER_FIELD: self.user_id}
+        return {'$and': [scope, where]} if where else scope
+
+    def add_documents(self, documents, **kwargs):
+        from langchain_core.documents import Document
+
+        scoped = [Document(page_content=doc.page_content, metadata={**(doc.metadata or {}), USER_FIELD: self.user_id})
+                  for doc in documents]
+        ids = self._store.add_documents(scoped, **kwargs)
+        if self._on_add is not None:
+            self._on_add(self.user_id)
+        return ids
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        texts = list(texts)
+        metadatas = [{**(m or {}), USER_FIELD: self.user_id} for m in (metadatas or [None] * len(texts))]
+        ids = self._store.add_texts(texts, metadatas=metadatas, **kwargs)
+        if self._on_add is not None:
+            self._on_add(self.user_id)
+        return ids
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self._store.similarity_search(query, k=k, filter=self._where(filter), **kwargs)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self._store.similarity_search_with_score(query, k=k, filter=self._where(filter), **kwargs)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None, **kwargs):
+        return self._store.get(ids=ids, where=self._where(where), limit=limit, offset=offset, include=include, **kwargs)
+
+    def delete(self, ids=None):
+        # only ever this user's chunks; no ids deletes all of them
+        self._store._collection.delete(ids=ids, where=self._where())
+
+    def as_retriever(self, **kwargs):
+        search_kwargs = dict(kwargs.pop('search_kwargs', {}))
+        search_kwargs['filter'] = self._where(search_kwargs.get('filter'))
+        return self._store.as_retriever(search_kwargs=search_kwargs, **kwargs)
+
+    def persist(self):
+        # Chroma >= 0.4 writes through; kept so callers can treat both backends alike
+        pass
+
+
+class SharedChromaBackend:
+    name = 'shared'
+
+    def __init__(self, root, embedding_function, shards=16, collection='resume_chunks', timer=None,
+                 client_factory=None):
+        # client_factory() -> chromadb client for a Chroma server, connected on first use
+        self.root = os.path.join(root, SHARED_DIR)
+        self.embedding_function = embedding_function
+        self.collection = collection
+        self.timer = timer or _no_timer
+        self._client_factory = client_factory
+        self._client = None
+        self.shards = (None if client_factory else self._read_layout()) or shards
+        self._stores = {}  # shard -> open Chroma store
+        self._known = set()  # users seen with at least one chunk
+        self._lock = threading.Lock()
+        self._open_locks = [threading.Lock() for _ in range(self.shards)]
+
+    def _read_layout(self):
+        # The shard count is fixed by whoever created the shards; changing it later would
+        # send users to shards that do not hold their chunks.
+        layout = os.path.join(self.root, 'layout.json')
+        if not os.path.exists(layout):
+            return None
+        with open(layout, 'r', encoding='utf-8') as f:
+            return json.load(f)['shards']
+
+    def _write_layout(self):
+        layout = os.path.join(self.root, 'layout.json')
+        if not os.path.exists(layout):
+            os.makedirs(self.root, exist_ok=True)
+            with open(layout, 'w', encoding='utf-8') as f:
+                json.dump({'shards': self.shards, 'collection': self.collection}, f)
+
+    def _remote(self):
+        # Connects, and adopts the shard count recorded on the server's first collection;
+        # whoever creates that collection records theirs
+        with self._lock:
+            if self._client is None:
+                client = self._client_factory()
+                first = client.get_or_create_collection(self._remote_name(0), metadata={'shards': self.shards},
+                                                        embedding_function=None)
+                shards = (first.metadata or {}).get('shards')
+                if shards and shards != self.shards:
+                    print(f"Warning: VECTOR_SHARDS={self.shards} ignored, the Chroma server's "
+                          f"collections were created with {shards} shards")
+                    self.shards = shards
+                    self._open_locks = [threading.Lock() for _ in range(shards)]
+                self._client = client
+            return self._client
+
+    def _remote_name(self, shard):
+        return f'{self.collection}-{shard:02d}'
+
+    def shard_for(self, user_id):
+        if self._client_factory is not None:
+            self._remote()
+        # stable across processes, unlike hash()
+        digest = hashlib.blake2b(user_id.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.shards
+
+    def shard_store(self, shard):
+        store = self._stores.get(shard)
+        if store is not None:
+            return store
+        with self._open_locks[shard]:
+            store = self._stores.get(shard)
+            if store is None:
+                from langchain_community.vectorstores import Chroma
+
+                embedding = self.embedding_function() if self.embedding_function else None
+                if self._client_factory is not None:
+                    client = self._remote()
+                    with self.timer('chroma_open'):
+                        store = Chroma(client=client, collection_name=self._remote_name(shard),
+                                       collection_metadata={'shards': self.shards}, embedding_function=embedding)
+                else:
+                    self._write_layout()
+                    shard_dir = os.path.join(self.root, f'shard-{shard:02d}')
+                    os.makedirs(shard_dir, exist_ok=True)
+                    with self.timer('chroma_open'):
+                        store = Chroma(collection_name=self.collection, persist_directory=shard_dir,
+                                       embedding_function=embedding)
+                self._stores[shard] = store
+        return store
+
+    def _mark(self, user_id):
+        with self._lock:
+            self._known.add(user_id)
+
+    def exists(self, user_id):
+        if user_id in self._known:
+            return True
+        found = self.shard_store(self.shard_for(user_id)).get(where={USER_FIELD: user_id}, limit=1, include=[])
+        if found['ids']:
+            self._mark(user_id)
+            return True
+        return False
+
+    def open(self, user_id):
+        # a cheap view; the shard itself stays open
+        return UserScopedStore(self.shard_store(self.shard_for(user_id)), user_id, on_add=self._mark)
+
+    def rebuild(self, user_id, documents):
+        store = self.open(user_id)
+        store.add_documents(documents)
+        return store
+
+    def users(self):
+        users = set()
+        for shard in range(self.shards):
+            data = self.shard_store(shard).get(include=['metadatas'])
+            users.update(m[USER_FIELD] for m in data['metadatas'] if m and USER_FIELD in m)
+        return sorted(users)
+
+    def stats(self):
+        with self._lock:
+            known = len(self._known)
+        return {'backend': self.name, 'shards': self.shards, 'open_shards': len(self._stores), 'known_users': known,
+                'server': self._client_factory is not None}
+
+
+class NumpyVectorBackend:
+    name = 'numpy'
+
+    def __init__(self, root, embedding_function, timer=None):
+        self.root = os.path.join(root, NUMPY_DIR)
+        self.embedding_function = embedding_function
+        self.timer = timer or _no_timer
+
+    def _dir(self, user_id):
+        return os.path.join(self.root, user_id)
+
+    def exists(self, user_id):
+        from numpy_vectors import store_exists
+
+        return store_exists(self._dir(user_id))
+
+    def open(self, user_id):
+        from numpy_vectors import NumpyVectorStore
+
+        with self.timer('vector_open'):
+            return NumpyVectorStore(self._dir(user_id), self.embedding_function())
+
+    def rebuild(self, user_id, documents):
+        store = self.open(user_id)
+        store.add_documents(documents)
+        return store
+
+    def users(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if self.exists(name))
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+def vector_backend_from_env(environ, root, embedding_function, timer=None):
+    name = environ.get('VECTOR_BACKEND', 'auto')
+    if name not in BACKENDS:
+        print(f"Warning: unknown VECTOR_BACKEND {name!r}, using 'auto'")
+        name = 'auto'
+    server = environ.get('CHROMA_HOST')
+    local_shards = os.path.isdir(os.path.join(root, SHARED_DIR))
+    if name == 'auto':
+        if _has_user_dirs(root) and not local_shards:
+            print(f"Vector backend: per-user directories found in {root}; "
+                  f"run migrate_vectors.py to move them to the shared backend")
+            name = 'per-user'
+        elif server or not _multi_process(environ):
+            name = 'shared'
+        elif local_shards:
+            raise RuntimeError(f"{os.path.join(root, SHARED_DIR)} is a local Chroma store, which only one process "
+                               f"can use, but ingestion or serving runs in several; set CHROMA_HOST to a Chroma "
+                               f"server holding these shards, or set VECTOR_BACKEND explicitly")
+        else:
+            print("Vector backend: several processes share the store and CHROMA_HOST is not set; using numpy")
+            name = 'numpy'
+    if name == 'per-user':
+        return PerUserChromaBackend(root, embedding_function, timer=timer)
+    if name == 'numpy':
+        return NumpyVectorBackend(root, embedding_function, timer=timer)
+    client_factory = None
+    if server:
+        def client_factory():
+            import chromadb
+
+            return chromadb.HttpClient(host=server, port=int(environ.get('CHROMA_PORT', '8000')),
+                                       ssl=environ.get('CHROMA_SSL') == '1')
+    elif _multi_process(environ):
+        print("Warning: VECTOR_BACKEND=shared without CHROMA_HOST in a multi-process setup; each process "
+              "only sees the chunks it wrote itself")
+    backend = SharedChromaBackend(root, embedding_function, shards=int(environ.get('VECTOR_SHARDS', '16')),
+                                  timer=timer, client_factory=client_factory)
+    if not server and environ.get('VECTOR_SHARDS') and int(environ['VECTOR_SHARDS']) != backend.shards:
+        print(f"Warning: VECTOR_SHARDS={environ['VECTOR_SHARDS']} ignored, "
+              f"{backend.root} was created with {backend.shards} shards")
+    return backend
+
+
+def _multi_process(environ):
+    # jobs left to ingest_worker.py (which runs with INGEST_WORKERS=0 itself), or several
+    # web workers (uvicorn and gunicorn take their worker count from WEB_CONCURRENCY)
+    return environ.get('INGEST_WORKERS') == '0' or int(environ.get('WEB_CONCURRENCY') or 1) > 1
+
+
+def _has_user_dirs(root):
+    # stops at the first one; a legacy root can hold tens of thousands
+    if not os.path.isdir(root):
+        return False
+    with os.scandir(root) as entries:
+        return any(entry.is_dir() and _is_user_store(root, entry.name) for entry in entries)
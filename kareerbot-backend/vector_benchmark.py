@@ -0,0 +1,113 @@
+# vector_benchmark.py
+# Per-user vector store benchmark: Chroma (one persist directory per user, as the per-user
+# backend stores it) against the memory-mapped NumPy store (numpy_vectors.py).
+#
+# For each corpus size it builds one store of that many chunks with the deterministic
+# fake embeddings, then measures the cold open of a fresh handle, top-k search latency
+# (queries are embedded up front, so only the index is timed), files on disk and, taking
+# the exact NumPy result as ground truth, how much of it Chroma's HNSW search recalls.
+#
+#   python vector_benchmark.py
+#   python vector_benchmark.py --sizes 1,10,100,1000,5000 --queries 500 --k 4
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+from metrics import percentile
+
+
+def disk_usage(path):
+    files = size = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(directory, name))
+    return files, size
+
+
+def open_chroma(directory, embeddings):
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=directory, embedding_function=embeddings)
+
+
+def open_numpy(directory, embeddings):
+    from numpy_vectors import NumpyVectorStore
+    return NumpyVectorStore(directory, embeddings)
+
+
+STORES = {'chroma': open_chroma, 'numpy': open_numpy}
+
+
+def bench_store(kind, directory, documents, query_vectors, embeddings, k):
+    start = time.perf_counter()
+    store = STORES[kind](directory, embeddings)
+    store.add_documents(documents)
+    build = time.perf_counter() - start
+    del store
+
+    start = time.perf_counter()
+    store = STORES[kind](directory, embeddings)
+    store.similarity_search_by_vector(query_vectors[0], k=k)  # first query pays for loading the index
+    cold = time.perf_counter() - start
+
+    latencies = []
+    results = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(vector, k=k)
+        latencies.append(time.perf_counter() - start)
+        results.append({doc.page_content for doc in docs})
+    latencies.sort()
+    files, size = disk_usage(directory)
+    return {
+        'build_ms': build * 1000, 'cold_ms': cold * 1000,
+        'p50_us': percentile(latencies, 50) * 1e6, 'p95_us': percentile(latencies, 95) * 1e6,
+        'qps': len(latencies) / sum(latencies), 'files': files, 'kb': size / 1024, 'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Chroma vs NumPy per-user vector store benchmark')
+    parser.add_argument('--sizes', default='1,10,100,1000', help='comma-separated chunk counts')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--dim', type=int, default=768, help='embedding size (Gemini embedding-001 is 768)')
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from langchain_core.documents import Document
+    from fake_llm import FakeEmbeddings
+
+    embeddings = FakeEmbeddings(size=args.dim)
+    query_vectors = embeddings.embed_documents([f"query {i}" for i in range(args.queries)])
+    workdir = tempfile.mkdtemp(prefix='kareerbot-vectors-')
+
+    print(f"{'chunks':>7}  {'store':<7}{'build ms':>10}{'cold ms':>10}{'p50 us':>10}{'p95 us':>10}"
+          f"{'qps':>10}{'files':>7}{'disk KB':>10}{'recall':>8}")
+    print('-' * 89)
+    try:
+        for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+            documents = [Document(page_content=f"chunk {i} of a {size}-chunk resume", metadata={'source': 'bench'})
+                         for i in range(size)]
+            rows = {kind: bench_store(kind, os.path.join(workdir, f"{kind}-{size}"), documents, query_vectors,
+                                      embeddings, args.k)
+                    for kind in STORES}
+            exact = rows['numpy']['results']
+            for kind, row in rows.items():
+                hits = sum(len(found & truth) for found, truth in zip(row['results'], exact))
+                recall = hits / max(1, sum(len(truth) for truth in exact))
+                print(f"{size:>7}  {kind:<7}{row['build_ms']:>10.1f}{row['cold_ms']:>10.1f}{row['p50_us']:>10.0f}"
+                      f"{row['p95_us']:>10.0f}{row['qps']:>10.0f}{row['files']:>7}{row['kb']:>10.0f}{recall:>8.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
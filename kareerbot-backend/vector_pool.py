@@ -0,0 +1,98 @@
+# vector_pool.py
+# Process-wide pool of open per-user vector store handles.
+#
+# Opening a Chroma store re-reads its SQLite file and HNSW segment, so routes
+# borrow an already-open handle from here instead of constructing one per request.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class VectorStorePool:
+    def __init__(self, factory, max_size=64, idle_timeout=600):
+        # factory(user_id) -> open vector store for that user
+        self._factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()  # user_id -> (store, last_used), least recently used first
+        self._open_locks = {}  # user_id -> lock, only while that user's store is being opened
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            self._expire_idle(now)
+            entry = self._handles.get(user_id)
+            if entry is not None:
+                self._handles[user_id] = (entry[0], now)
+                self._handles.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            open_lock = self._open_locks.setdefault(user_id, threading.Lock())
+
+        # Open outside the pool lock so a slow open does not block other users,
+        # but only once per user even if several requests miss at the same time.
+        with open_lock:
+            try:
+                with self._lock:
+                    entry = self._handles.get(user_id)
+                    if entry is not None:
+                        self._handles[user_id] = (entry[0], time.monotonic())
+                        self._handles.move_to_end(user_id)
+                        self.hits += 1
+                        return entry[0]
+                    self.misses += 1
+                store = self._factory(user_id)
+                self.put(user_id, store)
+                return store
+            finally:
+                # Requests already waiting on this lock find the handle when they get it;
+                # later ones see it in _handles. A failed open leaves nothing behind either.
+                with self._lock:
+                    if self._open_locks.get(user_id) is open_lock:
+                        del self._open_locks[user_id]
+
+    def put(self, user_id, store):
+        with self._lock:
+            self._handles[user_id] = (store, time.monotonic())
+            self._handles.move_to_end(user_id)
+            while len(self._handles) > self.max_size:
+                self._handles.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._handles.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+    def _expire_idle(self, now):
+        # Entries are kept in last-used order, so idle ones are always at the front.
+        if not self.idle_timeout:
+            return
+        while self._handles:
+            _, (_, last_used) = next(iter(self._handles.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._handles.popitem(last=False)
+            self.expirations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._handles),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }